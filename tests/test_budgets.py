@@ -0,0 +1,278 @@
+"""Бюджеты запросов и времени ответа для всех именованных адресов.
+
+Набор данных засевается один раз на модуль через mixer/Faker. Размер
+задается YATUBE_BENCH_SCALE (1 — тысячи пользователей и записей; по
+умолчанию 0.1, чтобы обычный прогон оставался быстрым). Каждый адрес
+открывается с холодным кешем: потолок числа SQL-запросов не должен
+зависеть от объема данных, а p50/p95 сверяются с бюджетом, умноженным
+на YATUBE_BENCH_LATENCY_FACTOR. Итоги пишутся в JSON
+(YATUBE_BENCH_REPORT, по умолчанию budget-report.json) для графиков.
+"""
+import json
+import os
+import random
+import statistics
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from about import urls as about_urls
+from api import urls as api_urls
+from posts import suggestions, trending
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post
+from users import urls as users_urls
+
+SCALE = float(os.environ.get('YATUBE_BENCH_SCALE', '0.1'))
+LATENCY_FACTOR = float(os.environ.get('YATUBE_BENCH_LATENCY_FACTOR', '1'))
+ITERATIONS = int(os.environ.get('YATUBE_BENCH_ITERATIONS', '10'))
+REPORT_PATH = os.environ.get('YATUBE_BENCH_REPORT', 'budget-report.json')
+
+SIZES = {
+    'users': 2000,
+    'groups': 20,
+    'posts': 5000,
+    'comments': 10000,
+    'follows': 5000,
+}
+# Комментарии к одной записи: на них видно N+1 в post_detail.
+HOT_POST_COMMENTS = 50
+READER_FOLLOWS = 30
+
+
+def route(name, queries, p95_ms, auth=False, kwargs=None):
+    return {
+        'name': name,
+        'queries': queries,
+        'p95_ms': p95_ms,
+        'auth': auth,
+        'kwargs': kwargs or (lambda data: {}),
+    }
+
+
+ROUTES = [
+    route('posts:index', 4, 300),
+    route('posts:popular', 3, 300),
+    route('posts:group_list', 5, 300,
+          kwargs=lambda data: {'slug': data['group'].slug}),
+    route('posts:profile', 5, 300,
+          kwargs=lambda data: {'username': data['reader'].username}),
+    route('posts:post_detail', 5, 300,
+          kwargs=lambda data: {'post_id': data['hot_post'].pk}),
+    route('posts:post_comments', 3, 200,
+          kwargs=lambda data: {'post_id': data['hot_post'].pk}),
+    route('posts:post_react', 3, 200, auth=True,
+          kwargs=lambda data: {'post_id': data['hot_post'].pk}),
+    route('posts:comment_react', 3, 200, auth=True,
+          kwargs=lambda data: {'comment_id': data['hot_comment'].pk}),
+    route('posts:post_create', 3, 200, auth=True),
+    route('posts:post_edit', 5, 200, auth=True,
+          kwargs=lambda data: {'post_id': data['own_post'].pk}),
+    route('posts:add_comment', 3, 200, auth=True,
+          kwargs=lambda data: {'post_id': data['hot_post'].pk}),
+    route('posts:follow_index', 10, 300, auth=True),
+    route('posts:search', 4, 300),
+    route('posts:profile_follow', 6, 200, auth=True,
+          kwargs=lambda data: {'username': data['author'].username}),
+    route('posts:profile_unfollow', 8, 200, auth=True,
+          kwargs=lambda data: {'username': data['author'].username}),
+    route('posts:index_rss', 2, 300),
+    route('posts:index_atom', 2, 300),
+    route('posts:group_rss', 3, 300,
+          kwargs=lambda data: {'slug': data['group'].slug}),
+    route('posts:group_atom', 3, 300,
+          kwargs=lambda data: {'slug': data['group'].slug}),
+    route('posts:profile_rss', 3, 300,
+          kwargs=lambda data: {'username': data['reader'].username}),
+    route('posts:profile_atom', 3, 300,
+          kwargs=lambda data: {'username': data['reader'].username}),
+    route('users:signup', 0, 200),
+    route('users:logout', 4, 200, auth=True),
+    route('users:login', 0, 200),
+    route('users:password_reset', 0, 200),
+    route('users:password_reset_done', 0, 200),
+    route('users:password_reset_confirm', 1, 200,
+          kwargs=lambda data: {'uidb64': 'MQ', 'token': 'bad-token'}),
+    route('users:password_reset_complete', 0, 200),
+    route('users:password_change_form', 2, 200, auth=True),
+    route('users:password_change_done', 2, 200, auth=True),
+    route('about:author', 0, 200),
+    route('about:tech', 0, 200),
+    route('api:index', 2, 300),
+    route('api:post_detail', 4, 300,
+          kwargs=lambda data: {'post_id': data['hot_post'].pk}),
+    route('api:group_list', 3, 300,
+          kwargs=lambda data: {'slug': data['group'].slug}),
+    route('api:profile', 3, 300,
+          kwargs=lambda data: {'username': data['reader'].username}),
+    route('api:follow_index', 6, 300, auth=True),
+]
+QUERY_STRINGS = {'posts:search': {'q': 'a*'}}
+
+RESULTS = {}
+
+
+def size(name):
+    return max(1, int(SIZES[name] * SCALE))
+
+
+def seed():
+    users = mixer.cycle(size('users')).blend(User)
+    groups = mixer.cycle(size('groups')).blend(Group)
+    posts = mixer.cycle(size('posts')).blend(
+        Post,
+        author=lambda: random.choice(users),
+        group=lambda: random.choice(groups + [None]),
+        image='',
+    )
+    mixer.cycle(size('comments')).blend(
+        Comment,
+        post=lambda: random.choice(posts),
+        author=lambda: random.choice(users),
+    )
+    pairs = {
+        tuple(random.sample(users, 2)) for _ in range(size('follows'))
+    }
+    for user, author in pairs:
+        Follow.objects.get_or_create(user=user, author=author)
+
+    reader = mixer.blend(User, username='reader')
+    author = mixer.blend(User, username='author')
+    group = groups[0]
+    for followed in random.sample(users, min(READER_FOLLOWS, len(users))):
+        Follow.objects.get_or_create(user=reader, author=followed)
+    own_post = mixer.blend(Post, author=reader, group=group, image='')
+    hot_post = mixer.blend(Post, author=author, group=group, image='')
+    mixer.cycle(HOT_POST_COMMENTS).blend(
+        Comment, post=hot_post, author=lambda: random.choice(users)
+    )
+    trending.update()
+    suggestions.rebuild()
+    return {
+        'reader': reader,
+        'author': author,
+        'group': group,
+        'own_post': own_post,
+        'hot_post': hot_post,
+        'hot_comment': hot_post.comments.first(),
+    }
+
+
+@pytest.fixture(scope='module')
+def dataset(django_db_setup, django_db_blocker):
+    random.seed(2022)
+    with django_db_blocker.unblock():
+        with transaction.atomic():
+            data = seed()
+            yield data
+            transaction.set_rollback(True)
+    cache.clear()
+    write_report()
+
+
+def write_report():
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'scale': SCALE,
+        'iterations': ITERATIONS,
+        'sizes': {name: size(name) for name in SIZES},
+        'routes': RESULTS,
+    }
+    with open(REPORT_PATH, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, ensure_ascii=False, indent=2)
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(share * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def named_routes():
+    names = set()
+    for module in (posts_urls, users_urls, about_urls, api_urls):
+        names.update(
+            f'{module.app_name}:{pattern.name}'
+            for pattern in module.urlpatterns
+            if pattern.name
+        )
+    return names
+
+
+def test_every_named_route_has_budget():
+    missing = named_routes() - {spec['name'] for spec in ROUTES}
+    assert not missing, (
+        f'Добавьте бюджет запросов и времени для адресов: {sorted(missing)}'
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('spec', ROUTES, ids=[spec['name'] for spec in ROUTES])
+def test_route_budget(spec, dataset):
+    client = Client()
+    if spec['auth']:
+        client.force_login(dataset['reader'])
+    url = reverse(spec['name'], kwargs=spec['kwargs'](dataset))
+    params = QUERY_STRINGS.get(spec['name'], {})
+
+    def prepare():
+        # Выход разлогинивает клиента: перед каждым замером входим снова.
+        if spec['name'] == 'users:logout':
+            client.force_login(dataset['reader'])
+        cache.clear()
+
+    def fetch():
+        response = client.get(url, params)
+        # Потоковые ответы API читают базу, пока отдается тело.
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    # Первый запрос прогревает шаблоны и ленивые импорты.
+    prepare()
+    fetch()
+    prepare()
+    # Журнал запросов ограничен 9000 записями и уже заполнен засевом.
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response = fetch()
+    # captured_queries читается из журнала лениво, а следующие запросы
+    # клиента его очищают — забираем SQL сразу.
+    captured = [query['sql'] for query in queries.captured_queries]
+    timings = []
+    for _ in range(ITERATIONS):
+        prepare()
+        start = time.perf_counter()
+        fetch()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        'url': url,
+        'status': response.status_code,
+        'queries': len(captured),
+        'queries_ceiling': spec['queries'],
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p95_budget_ms': spec['p95_ms'] * LATENCY_FACTOR,
+    }
+    RESULTS[spec['name']] = result
+
+    assert response.status_code < 500, (
+        f'Адрес `{url}` отвечает ошибкой {response.status_code}'
+    )
+    assert result['queries'] <= spec['queries'], (
+        f'Адрес `{url}` делает {result["queries"]} SQL-запросов при потолке '
+        f'{spec["queries"]}:\n'
+        + '\n'.join(captured)
+    )
+    assert result['p95_ms'] <= result['p95_budget_ms'], (
+        f'Адрес `{url}`: p95 {result["p95_ms"]} мс при бюджете '
+        f'{result["p95_budget_ms"]} мс'
+    )
@@ -0,0 +1,44 @@
+"""Перевод записей и комментариев в словари для JSON.
+
+Записи лент приходят как PostRow (as_rows), запись страницы — как
+модель; обе формы дают одинаковый словарь.
+"""
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+
+def image_url(image):
+    name = getattr(image, 'name', image)
+    return default_storage.url(name) if name else None
+
+
+def post_data(post):
+    group = None
+    if post.group:
+        group = {'slug': post.group.slug, 'title': post.group.title}
+    return {
+        'type': 'post',
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': {
+            'username': post.author.username,
+            'full_name': post.author.get_full_name(),
+        },
+        'group': group,
+        'image': image_url(post.image),
+        'comments_count': post.comments_count,
+        'url': reverse('posts:post_detail', args=[post.pk]),
+    }
+
+
+def comment_data(comment):
+    return {
+        'type': 'comment',
+        'id': comment.pk,
+        'post': comment.post_id,
+        'parent': comment.parent_id,
+        'text': comment.text,
+        'pub_date': comment.pub_date,
+        'author': {'username': comment.author.username},
+    }
@@ -0,0 +1,139 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def read(response):
+    return b''.join(response.streaming_content).decode()
+
+
+def read_lines(response):
+    return [json.loads(line) for line in read(response).splitlines()]
+
+
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test_slug',
+            description='test description',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Запись {number}', group=cls.group
+            )
+            for number in range(5)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_stream_ndjson(self):
+        """Ленты отдаются построчным NDJSON от новых к старым"""
+        urls = [
+            reverse('api:index'),
+            reverse('api:group_list', args=[self.group.slug]),
+            reverse('api:profile', args=[self.author.username]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Content-Type'],
+                                 'application/x-ndjson')
+                records = read_lines(response)
+                self.assertEqual(
+                    [record['id'] for record in records],
+                    [post.pk for post in reversed(self.posts)],
+                )
+                first = records[0]
+                self.assertEqual(first['author']['full_name'], 'Лев Толстой')
+                self.assertEqual(first['group']['slug'], self.group.slug)
+                self.assertEqual(first['comments_count'], 1)
+
+    def test_cursor_pages_and_json_format(self):
+        """limit и курсор листают ленту, ?format=json дает документ"""
+        url = reverse('api:index')
+        first = self.client.get(url, {'limit': 3, 'format': 'json'})
+        data = json.loads(read(first))
+        self.assertEqual(len(data['results']), 3)
+        self.assertIsNone(data['previous'])
+        self.assertIn('rel="next"', first['Link'])
+        second = json.loads(read(self.client.get(data['next'])))
+        self.assertEqual(
+            [post['id'] for post in data['results'] + second['results']],
+            [post.pk for post in reversed(self.posts)],
+        )
+        self.assertIsNone(second['next'])
+
+    def test_post_detail_with_comments(self):
+        """Страница записи отдает запись и её комментарии"""
+        url = reverse('api:post_detail', args=[self.post.pk])
+        records = read_lines(self.client.get(url))
+        self.assertEqual([record['type'] for record in records],
+                         ['post', 'comment'])
+        data = json.loads(read(self.client.get(url, {'format': 'json'})))
+        self.assertEqual(data['post']['id'], self.post.pk)
+        self.assertEqual(data['comments'][0]['text'], 'Комментарий')
+
+    def test_follow_requires_login(self):
+        """Лента подписок доступна только авторизованному"""
+        url = reverse('api:follow_index')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        records = read_lines(self.client.get(url))
+        self.assertEqual(len(records), len(self.posts))
+
+    def test_missing_objects_are_json_404(self):
+        """Несуществующие группа, автор и запись — JSON 404"""
+        urls = [
+            reverse('api:group_list', args=['missing']),
+            reverse('api:profile', args=['missing']),
+            reverse('api:post_detail', args=[0]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+
+    def test_conditional_get(self):
+        """ETag дает 304, пока лента не изменилась"""
+        url = reverse('api:index')
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Правка без новой даты'
+        post.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+    def test_new_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы записи"""
+        url = reverse('api:post_detail', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ответ'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
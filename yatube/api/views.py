@@ -0,0 +1,168 @@
+"""Потоковое API лент только для чтения.
+
+Ответ по умолчанию — NDJSON: одна запись на строку, у каждой есть
+поле type ('post' или 'comment'). С ?format=json отдается тот же поток
+в виде одного JSON-документа. Ленты листаются курсором (?cursor=,
+?limit=), ссылки на соседние страницы — в заголовке Link и, для JSON,
+в полях next/previous.
+
+ETag и Last-Modified считает posts.conditional: повторный запрос с
+If-None-Match получает 304 без выборки записей.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from posts.conditional import (
+    feed_condition, follow_state, group_state, index_state, post_state,
+    profile_state,
+)
+from posts.models import Group, Post
+from posts.paginators import CursorPaginator, FeedCursorPaginator
+from posts.timeline import follow_feed, page_posts
+
+from .serializers import comment_data, post_data
+
+User = get_user_model()
+
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+NDJSON = 'application/x-ndjson'
+COMMENT_FIELDS = (
+    'post', 'parent', 'text', 'pub_date', 'author__username',
+)
+
+
+def dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def stream_ndjson(records):
+    for record in records:
+        yield dumps(record) + '\n'
+
+
+def stream_json(head, key, records, tail=None):
+    """Отдает {**head, key: [records...], **tail} по кускам."""
+    opening = dumps(head)[:-1]
+    yield (opening + ', ' if head else '{') + f'"{key}": ['
+    for number, record in enumerate(records):
+        yield (', ' if number else '') + dumps(record)
+    closing = dumps(tail or {})[1:]
+    yield '], ' + closing if tail else ']}'
+
+
+def page_links(request, page_obj):
+    links = {'next': None, 'previous': None}
+    for name, cursor in (('next', page_obj.next_cursor),
+                         ('previous', page_obj.previous_cursor)):
+        if cursor:
+            query = request.GET.copy()
+            query['cursor'] = cursor
+            links[name] = request.build_absolute_uri(
+                f'{request.path}?{query.urlencode()}'
+            )
+    return links
+
+
+def feed_response(request, page_obj):
+    links = page_links(request, page_obj)
+    records = (post_data(post) for post in page_obj)
+    if request.GET.get('format') == 'json':
+        response = StreamingHttpResponse(
+            stream_json({}, 'results', records, links),
+            content_type='application/json',
+        )
+    else:
+        response = StreamingHttpResponse(
+            stream_ndjson(records), content_type=NDJSON
+        )
+    link = ', '.join(
+        f'<{url}>; rel="{name}"' for name, url in links.items() if url
+    )
+    if link:
+        response['Link'] = link
+    return response
+
+
+def error(status, detail):
+    return JsonResponse(
+        {'detail': detail},
+        status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', PER_PAGE))
+    except ValueError:
+        return PER_PAGE
+    return min(max(limit, 1), MAX_PER_PAGE)
+
+
+def get_page(request, queryset, paginator_class=CursorPaginator):
+    paginator = paginator_class(queryset, get_limit(request))
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@require_safe
+@feed_condition(index_state)
+def index(request):
+    page_obj = get_page(request, Post.objects.as_rows())
+    return feed_response(request, page_obj)
+
+
+@require_safe
+@feed_condition(group_state)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error(404, 'Группа не найдена.')
+    page_obj = get_page(request, group.posts.as_rows())
+    return feed_response(request, page_obj)
+
+
+@require_safe
+@feed_condition(profile_state)
+def profile(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return error(404, 'Пользователь не найден.')
+    page_obj = get_page(request, Post.objects.filter(author=author).as_rows())
+    return feed_response(request, page_obj)
+
+
+@require_safe
+@feed_condition(follow_state)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error(401, 'Нужна авторизация.')
+    feed = follow_feed(request)
+    page_obj = get_page(request, feed, FeedCursorPaginator)
+    page_obj.object_list = page_posts(page_obj, rows=True)
+    return feed_response(request, page_obj)
+
+
+@require_safe
+@feed_condition(post_state)
+def post_detail(request, post_id):
+    post = Post.objects.with_feed_relations().filter(pk=post_id).first()
+    if post is None:
+        return error(404, 'Запись не найдена.')
+    comments = (
+        comment_data(comment)
+        for comment in post.comments.select_related('author')
+        .only(*COMMENT_FIELDS).iterator()
+    )
+    if request.GET.get('format') == 'json':
+        return StreamingHttpResponse(
+            stream_json({'post': post_data(post)}, 'comments', comments),
+            content_type='application/json',
+        )
+    records = (record for part in ([post_data(post)], comments)
+               for record in part)
+    return StreamingHttpResponse(stream_ndjson(records), content_type=NDJSON)
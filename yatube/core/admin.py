@@ -0,0 +1,57 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import OutboxMessage, Task
+from .tasks import flush_outbox
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'status',
+        'priority',
+        'attempts',
+        'run_after',
+        'created',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('key',)
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        queryset.exclude(status=Task.RUNNING).update(
+            status=Task.PENDING,
+            attempts=0,
+            run_after=timezone.now(),
+            locked_until=None,
+        )
+    retry.short_description = 'Повторить выбранные задачи'
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'subject',
+        'recipients',
+        'status',
+        'attempts',
+        'created',
+        'sent',
+    )
+    list_filter = ('status',)
+    search_fields = ('recipients', 'subject')
+    # Текст письма со ссылками сброса пароля персоналу не показываем.
+    exclude = ('payload',)
+    actions = ('resend',)
+
+    def resend(self, request, queryset):
+        queryset.filter(status=OutboxMessage.FAILED).update(
+            status=OutboxMessage.PENDING,
+            attempts=0,
+            send_after=timezone.now(),
+        )
+        flush_outbox.delay()
+    resend.short_description = 'Отправить выбранные письма повторно'
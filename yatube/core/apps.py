@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Регистрируем задачи всех приложений для воркеров очереди.
+        autodiscover_modules('tasks')
+        from . import queue
+        request_started.connect(queue.start_poller, dispatch_uid='tasks')
@@ -0,0 +1,138 @@
+"""Двухуровневый кеш: L1 в памяти процесса поверх общего L2.
+
+L2 — любой кеш из settings.CACHES, общий для всех воркеров (файлы,
+таблица в базе, Redis). L1 держит горячие ключи в процессе не дольше
+L1_TIMEOUT секунд и не больше L1_MAX_ENTRIES штук, поэтому частые
+чтения не ходят в L2, а запись другого воркера видна не позже чем
+через L1_TIMEOUT. incr/decr и удаление идут сразу в L2 и сбрасывают
+ключ в L1 текущего процесса.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+        return pickle.loads(value)
+
+    def _l1_set(self, key, value, timeout):
+        ttl = self._l1_timeout
+        if timeout is not None and timeout != DEFAULT_TIMEOUT:
+            ttl = min(ttl, timeout)
+        if ttl <= 0:
+            return
+        entry = (time.monotonic() + ttl, pickle.dumps(value))
+        with self._lock:
+            self._l1[key] = entry
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_key(key, version)
+        value = self._l1_get(l1_key)
+        if value is not None:
+            return value
+        value = self.l2.get(key, version=version)
+        if value is None:
+            return default
+        self._l1_set(l1_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._l1_get(self.make_key(key, version))
+            if value is None:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            fetched = self.l2.get_many(remote, version=version)
+            for key, value in fetched.items():
+                self._l1_set(self.make_key(key, version), value,
+                             DEFAULT_TIMEOUT)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(self.make_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self.make_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(self.make_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1_delete(self.make_key(key, version))
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._l1_get(self.make_key(key, version)) is not None:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._l1_delete(self.make_key(key, version))
+        return self.l2.decr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
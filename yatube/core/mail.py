@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from . import outbox
+from .tasks import flush_outbox
+
+
+class OutboxEmailBackend(BaseEmailBackend):
+    """Бэкенд почты, который кладет письма в исходящую очередь.
+
+    Запрос (сброс пароля, регистрация) не ждет почтовый сервер: письма
+    пачками отправит задача flush_outbox бэкендом OUTBOX_EMAIL_BACKEND.
+    Вложения в JSON не сохраняются, поэтому письма с ними уходят сразу.
+    """
+
+    def send_messages(self, email_messages):
+        direct = [message for message in email_messages if message.attachments]
+        queued = [
+            message for message in email_messages if not message.attachments
+        ]
+        if queued:
+            outbox.add(queued)
+            flush_outbox.delay()
+        if direct:
+            get_connection(
+                settings.OUTBOX_EMAIL_BACKEND, fail_silently=self.fail_silently
+            ).send_messages(direct)
+        return len(email_messages)
@@ -0,0 +1,92 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди core.Task в пуле потоков или '
+        'процессов. С --once выходит, когда готовые задачи кончатся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Число воркеров.',
+        )
+        parser.add_argument(
+            '--pool',
+            choices=('thread', 'process'),
+            default='thread',
+            help='Потоки делят процесс, процессы не упираются в GIL.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и выйти.',
+        )
+        parser.add_argument(
+            '--poll',
+            type=float,
+            default=1.0,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            default=[],
+            help='Выполнять только задачи с этим именем (можно повторять).',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        work_args = (
+            options['only'] or None, options['poll'], None, options['once']
+        )
+        if workers == 1 and options['pool'] == 'thread':
+            # Один воркер работает в текущем потоке, без пула.
+            try:
+                results = [queue.work(*work_args)]
+            except KeyboardInterrupt:
+                results = []
+        else:
+            results = self.run_pool(options['pool'], workers, work_args)
+        done = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено: {done}, с ошибкой: {failed}'
+        ))
+
+    def run_pool(self, pool, workers, work_args):
+        names, poll, stop, once = work_args
+        if pool == 'process':
+            # Дочерние процессы не должны делить соединения родителя.
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork'),
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            # Процессы останавливает сигнал, потоки — общее событие.
+            stop = threading.Event()
+        with executor:
+            futures = [
+                executor.submit(queue.work, names, poll, stop, once)
+                for _ in range(workers)
+            ]
+            try:
+                return [future.result() for future in futures]
+            except KeyboardInterrupt:
+                if stop is None:
+                    executor.shutdown(wait=False)
+                    return []
+                stop.set()
+                return [future.result() for future in futures]
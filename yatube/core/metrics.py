@@ -0,0 +1,78 @@
+"""Глубина и задержка очередей задач и исходящей почты для мониторинга."""
+from datetime import timedelta
+
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import OutboxMessage, Task
+
+# Задержку доставки считаем по письмам за последний час.
+LATENCY_WINDOW = timedelta(hours=1)
+LATENCY_SAMPLE = 1000
+
+
+def _age(moment, now):
+    if moment is None:
+        return 0
+    return round((now - moment).total_seconds(), 3)
+
+
+def _seconds(value):
+    return None if value is None else round(value, 3)
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(share * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def _by_status(queryset):
+    counts = dict(
+        queryset.order_by().values('status')
+        .annotate(total=Count('pk')).values_list('status', 'total')
+    )
+    return {
+        status: counts.get(status, 0)
+        for status, _ in queryset.model.STATUSES
+    }
+
+
+def task_metrics(now):
+    ready = Task.objects.filter(status=Task.PENDING, run_after__lte=now)
+    oldest = ready.order_by().aggregate(oldest=Min('run_after'))['oldest']
+    return {
+        'depth': _by_status(Task.objects.all()),
+        'ready': ready.count(),
+        'oldest_ready_age_s': _age(oldest, now),
+    }
+
+
+def outbox_metrics(now):
+    waiting = OutboxMessage.objects.filter(status__in=[
+        OutboxMessage.PENDING, OutboxMessage.SENDING])
+    oldest = waiting.order_by().aggregate(oldest=Min('created'))['oldest']
+    recent = OutboxMessage.objects.filter(
+        status=OutboxMessage.SENT, sent__gte=now - LATENCY_WINDOW
+    )
+    sample = recent.order_by('-sent').values_list(
+        'created', 'sent'
+    )[:LATENCY_SAMPLE]
+    latencies = [(sent - created).total_seconds() for created, sent in sample]
+    return {
+        'depth': _by_status(OutboxMessage.objects.all()),
+        'oldest_waiting_age_s': _age(oldest, now),
+        'sent_last_hour': recent.count(),
+        'latency_p50_s': _seconds(percentile(latencies, 0.5)),
+        'latency_p95_s': _seconds(percentile(latencies, 0.95)),
+    }
+
+
+def collect():
+    now = timezone.now()
+    return {
+        'tasks': task_metrics(now),
+        'outbox': outbox_metrics(now),
+    }
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('recipients', models.CharField(max_length=255, verbose_name='Получатели')),
+                ('payload', models.TextField(help_text='Заголовки, текст и альтернативы в JSON', verbose_name='Письмо')),
+                ('status', models.CharField(choices=[('pending', 'Ждет отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше')),
+                ('batch', models.CharField(blank=True, help_text='Отправка, которая забрала письмо', max_length=32, verbose_name='Пачка')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Занято до')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено')),
+            ],
+            options={
+                'verbose_name': 'Исходящее письмо',
+                'verbose_name_plural': 'Исходящие письма',
+                'ordering': ['created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['status', 'send_after'], name='outbox_ready_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['batch'], name='outbox_batch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(fields=['sent'], name='outbox_sent_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+def drop_duplicates(apps, schema_editor):
+    # Из дублей остается задача с самым ранним сроком.
+    Task = apps.get_model('core', 'Task')
+    pending = Task.objects.filter(status='pending').exclude(key='')
+    seen = set()
+    duplicates = []
+    for pk, name, key in pending.order_by('run_after', 'id').values_list(
+        'pk', 'name', 'key'
+    ):
+        if (name, key) in seen:
+            duplicates.append(pk)
+        seen.add((name, key))
+    Task.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending'), models.Q(_negated=True, key='')), fields=('name', 'key'), name='task_pending_key_uniq'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -11,3 +13,163 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди core.queue."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=100,
+        verbose_name='Задача',
+        help_text='Имя зарегистрированной функции',
+    )
+    payload = models.TextField(
+        default='{}',
+        verbose_name='Аргументы',
+        help_text='Аргументы вызова в JSON',
+    )
+    key = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Ключ',
+        help_text='Одинаковые незавершенные задачи не дублируются',
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name='Приоритет',
+        help_text='Задачи с большим приоритетом выполняются раньше',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3,
+        verbose_name='Предел попыток',
+    )
+    run_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Не раньше',
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занята до',
+        help_text='После этого времени задачу заберет другой воркер',
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Завершена',
+    )
+
+    class Meta:
+        ordering = ['-priority', 'run_after', 'id']
+        indexes = [
+            models.Index(
+                fields=['status', 'priority', 'run_after'],
+                name='task_ready_idx',
+            ),
+            models.Index(fields=['name', 'key'], name='task_key_idx'),
+        ]
+        constraints = [
+            # Ожидающая задача с ключом одна: дубль не вставится даже
+            # при одновременной постановке из двух процессов.
+            models.UniqueConstraint(
+                fields=['name', 'key'],
+                condition=Q(status='pending') & ~Q(key=''),
+                name='task_pending_key_uniq',
+            ),
+        ]
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+
+    def __str__(self):
+        return f'{self.name}#{self.pk} ({self.status})'
+
+
+class OutboxMessage(models.Model):
+    """Письмо в исходящей очереди core.outbox."""
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ждет отправки'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    recipients = models.CharField(max_length=255, verbose_name='Получатели')
+    payload = models.TextField(
+        verbose_name='Письмо',
+        help_text='Заголовки, текст и альтернативы в JSON',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    send_after = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Не раньше',
+    )
+    batch = models.CharField(
+        max_length=32,
+        blank=True,
+        verbose_name='Пачка',
+        help_text='Отправка, которая забрала письмо',
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занято до',
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    sent = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Отправлено',
+    )
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['status', 'send_after'],
+                name='outbox_ready_idx',
+            ),
+            models.Index(fields=['batch'], name='outbox_batch_idx'),
+            models.Index(fields=['sent'], name='outbox_sent_idx'),
+        ]
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+
+    def __str__(self):
+        return f'{self.subject} → {self.recipients}'
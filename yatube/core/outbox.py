@@ -0,0 +1,214 @@
+"""Исходящая почта через таблицу core.OutboxMessage.
+
+Бэкенд core.mail.OutboxEmailBackend только сохраняет письма и ставит
+задачу flush_outbox, поэтому сброс пароля и регистрация не ждут почтовый
+сервер. Задача забирает письма пачками по OUTBOX_BATCH_SIZE и отправляет
+каждую пачку через одно соединение OUTBOX_EMAIL_BACKEND (один вход на
+SMTP вместо входа на каждое письмо). Письмо с ошибкой повторяется через
+OUTBOX_RETRY_DELAY * 2 ** (попытка - 1) секунд, пока не кончатся
+OUTBOX_MAX_ATTEMPTS попыток; если не открылось само соединение, пачка
+возвращается в очередь целиком. Доставленное письмо отмечается сразу,
+поэтому сбой посреди пачки не отправит его повторно, а текст письма
+(в нем бывают ссылки сброса пароля) при этом стирается из очереди.
+Письмо, которое не разобрать из JSON, сразу помечается ошибкой.
+"""
+import json
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def message_to_dict(message):
+    """Письмо в JSON-совместимый словарь."""
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'alternatives': [
+            list(alternative)
+            for alternative in getattr(message, 'alternatives', [])
+        ],
+    }
+
+
+def message_from_dict(data):
+    data = dict(data)
+    alternatives = [tuple(item) for item in data.pop('alternatives')]
+    return EmailMultiAlternatives(alternatives=alternatives, **data)
+
+
+def redact(data):
+    """Словарь письма без текста: адреса и заголовки остаются."""
+    return dict(data, body='', alternatives=[])
+
+
+def add(messages):
+    """Сохраняет письма в очередь одним INSERT."""
+    rows = [
+        OutboxMessage(
+            subject=message.subject[:255],
+            recipients=', '.join(message.recipients())[:255],
+            payload=json.dumps(message_to_dict(message)),
+        )
+        for message in messages
+    ]
+    return OutboxMessage.objects.bulk_create(rows)
+
+
+def _expired(now):
+    # Пачка, чья отправка не уложилась в срок.
+    return Q(status=OutboxMessage.SENDING, locked_until__lt=now)
+
+
+def _ready(now):
+    # Ждущее письмо или зависшее, у которого еще остались попытки.
+    return (
+        Q(status=OutboxMessage.PENDING, send_after__lte=now)
+        | _expired(now) & Q(attempts__lt=settings.OUTBOX_MAX_ATTEMPTS)
+    )
+
+
+def claim(limit):
+    """Забирает до limit готовых писем под новой меткой пачки.
+
+    Зависшие письма, истратившие все попытки, помечаются ошибкой.
+    """
+    now = timezone.now()
+    OutboxMessage.objects.filter(
+        _expired(now), attempts__gte=settings.OUTBOX_MAX_ATTEMPTS
+    ).update(
+        status=OutboxMessage.FAILED,
+        locked_until=None,
+        error='Истек срок отправки',
+    )
+    ids = list(
+        OutboxMessage.objects.filter(_ready(now))
+        .order_by('created')
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    batch = uuid.uuid4().hex
+    OutboxMessage.objects.filter(_ready(now), pk__in=ids).update(
+        status=OutboxMessage.SENDING,
+        batch=batch,
+        attempts=F('attempts') + 1,
+        locked_until=now + timedelta(seconds=settings.OUTBOX_LOCK_TIMEOUT),
+    )
+    return list(OutboxMessage.objects.filter(batch=batch))
+
+
+def _release(rows, error):
+    OutboxMessage.objects.filter(pk__in=[row.pk for row in rows]).update(
+        status=OutboxMessage.PENDING,
+        attempts=F('attempts') - 1,
+        locked_until=None,
+        error=error,
+    )
+
+
+def _mark_sent(row, data):
+    OutboxMessage.objects.filter(pk=row.pk).update(
+        status=OutboxMessage.SENT,
+        payload=json.dumps(redact(data)),
+        sent=timezone.now(),
+        locked_until=None,
+        error='',
+    )
+
+
+def _retry_or_fail(row, error, retry=True):
+    if not retry or row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        fields = {'status': OutboxMessage.FAILED}
+    else:
+        delay = settings.OUTBOX_RETRY_DELAY * 2 ** (row.attempts - 1)
+        fields = {
+            'status': OutboxMessage.PENDING,
+            'send_after': timezone.now() + timedelta(seconds=delay),
+        }
+    OutboxMessage.objects.filter(pk=row.pk).update(
+        locked_until=None, error=error, **fields
+    )
+
+
+def send_batch(rows):
+    """Отправляет пачку через одно соединение; возвращает (успех, ошибки)."""
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    try:
+        connection.open()
+    except Exception as error:
+        # Почтовый сервер недоступен: письма не виноваты, попытку вернем.
+        _release(rows, str(error))
+        raise
+    sent = failed = 0
+    try:
+        for row in rows:
+            try:
+                data = json.loads(row.payload)
+                message = message_from_dict(data)
+            except Exception as error:
+                # Испорченное письмо повтор не починит.
+                logger.exception('Письмо %s', row.pk)
+                _retry_or_fail(row, str(error), retry=False)
+                failed += 1
+                continue
+            try:
+                connection.send_messages([message])
+            except Exception as error:
+                logger.exception('Письмо %s', row.pk)
+                _retry_or_fail(row, str(error))
+                failed += 1
+            else:
+                _mark_sent(row, data)
+                sent += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            # Письма уже отмечены: ошибка закрытия их не касается.
+            logger.exception('Закрытие почтового соединения')
+    return sent, failed
+
+
+def flush():
+    """Отправляет все готовые письма пачками; возвращает (успех, ошибки)."""
+    sent = failed = 0
+    while True:
+        rows = claim(settings.OUTBOX_BATCH_SIZE)
+        if not rows:
+            return sent, failed
+        batch_sent, batch_failed = send_batch(rows)
+        sent += batch_sent
+        failed += batch_failed
+
+
+def next_retry():
+    """Секунды до ближайшего отложенного повтора или None."""
+    send_after = OutboxMessage.objects.filter(
+        status=OutboxMessage.PENDING, send_after__gt=timezone.now()
+    ).order_by('send_after').values_list('send_after', flat=True).first()
+    if send_after is None:
+        return None
+    return max(0, (send_after - timezone.now()).total_seconds())
+
+
+def purge():
+    """Удаляет отправленные письма старше OUTBOX_KEEP_DAYS."""
+    border = timezone.now() - timedelta(days=settings.OUTBOX_KEEP_DAYS)
+    OutboxMessage.objects.filter(
+        status=OutboxMessage.SENT, sent__lt=border
+    ).delete()
@@ -0,0 +1,351 @@
+"""Очередь фоновых задач на таблице core.Task.
+
+Брокер — обычная таблица в базе проекта, поэтому очередь работает без
+внешних сервисов. Функция регистрируется декоратором @task и ставится в
+очередь вызовом .delay(); аргументы хранятся в JSON, поэтому в задачу
+передаются id, а не объекты. Задачу выполняет команда run_tasks (пул
+потоков или процессов) или, после коммита, TASK_WORKERS потоков самого
+веб-процесса: их будит коммит новой задачи, а отложенные задачи и
+повторы подхватывает поток-будильник, раз в TASK_POLL_INTERVAL секунд
+проверяющий, не подошел ли срок. Поток веб-процесса выполняет задачи,
+пока готовые не кончатся. Ожидающая задача с ключом одна — это держит
+уникальный индекс таблицы. Воркер забирает готовую задачу с наибольшим
+приоритетом условным UPDATE и держит её не дольше
+TASK_VISIBILITY_TIMEOUT секунд: задачу упавшего воркера потом заберет
+другой, поэтому задачи должны переживать повторный запуск. Ошибка
+повторяется с растущей задержкой, пока не кончатся попытки.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+    IntegrityError, close_old_connections, connection, transaction,
+)
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = {}
+# Сколько кандидатов перебирать, если соседний воркер забрал первого.
+CLAIM_BATCH = 10
+
+_executor = None
+_poller = None
+_running = set()
+_lock = threading.Lock()
+
+
+class TaskFunction:
+    """Зарегистрированная задача: вызывается сразу или через .delay()."""
+
+    def __init__(self, func, name, priority, max_attempts, key, atomic):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.key = key
+        self.atomic = atomic
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def make_task(self, args, kwargs, priority=None, countdown=0):
+        return Task(
+            name=self.name,
+            payload=json.dumps({'args': list(args), 'kwargs': kwargs}),
+            key=self.key(*args, **kwargs) if self.key else '',
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_after=timezone.now() + timedelta(seconds=countdown),
+        )
+
+    def delay(self, *args, **kwargs):
+        """Ставит вызов в очередь с настройками задачи по умолчанию."""
+        return self.apply_async(args, kwargs)
+
+    def apply_async(self, args=(), kwargs=None, priority=None, countdown=0):
+        """Ставит вызов в очередь; countdown — задержка в секундах.
+
+        Если такая же задача (по ключу) уже ждет очереди, новая не
+        создается — возвращается ожидающая, а её срок при необходимости
+        переносится на более ранний.
+        """
+        task = self.make_task(args, kwargs or {}, priority, countdown)
+        if not task.key:
+            task.save()
+            dispatch()
+            return task
+        while True:
+            pending = Task.objects.filter(
+                name=self.name, key=task.key, status=Task.PENDING
+            ).first()
+            if pending is not None:
+                if pending.run_after > task.run_after:
+                    Task.objects.filter(
+                        pk=pending.pk, status=Task.PENDING
+                    ).update(run_after=task.run_after)
+                    pending.run_after = task.run_after
+                    dispatch()
+                return pending
+            try:
+                with transaction.atomic():
+                    task.save()
+            except IntegrityError:
+                # Такую же задачу поставили между проверкой и вставкой.
+                continue
+            dispatch()
+            return task
+
+    def delay_many(self, calls):
+        """Ставит пачку вызовов одним INSERT; calls — кортежи аргументов."""
+        tasks = [self.make_task(args, {}) for args in calls]
+        keys = {task.key for task in tasks if task.key}
+        if keys:
+            pending = Task.objects.filter(
+                name=self.name, key__in=keys, status=Task.PENDING
+            )
+            pending.filter(run_after__gt=timezone.now()).update(
+                run_after=timezone.now()
+            )
+            seen = set(pending.values_list('key', flat=True))
+            unique = []
+            for task in tasks:
+                if not task.key or task.key not in seen:
+                    unique.append(task)
+                    seen.add(task.key)
+            tasks = unique
+        # Дубль, вставленный соседним процессом, отсеет уникальный индекс.
+        Task.objects.bulk_create(tasks, batch_size=500, ignore_conflicts=True)
+        if tasks:
+            dispatch(len(tasks))
+        return tasks
+
+
+def task(name=None, priority=0, max_attempts=3, key=None, atomic=True):
+    """Регистрирует функцию как фоновую задачу.
+
+    key — функция от аргументов вызова, дающая ключ для защиты от
+    дублей в очереди. atomic=False — задача сама фиксирует свои шаги
+    (например, отмечает отправленные письма), и ошибка в конце не
+    должна откатывать сделанное.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        wrapped = TaskFunction(
+            func, task_name, priority, max_attempts, key, atomic
+        )
+        REGISTRY[task_name] = wrapped
+        return wrapped
+    return decorator
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TASK_WORKERS,
+            thread_name_prefix='tasks',
+        )
+    return _executor
+
+
+def _drain():
+    # Поток выполняет задачи, пока готовые не кончатся.
+    close_old_connections()
+    try:
+        while run_one() is not None:
+            pass
+    finally:
+        close_old_connections()
+
+
+def _wake(count):
+    # Запускает недостающие потоки: работающий сам заберет новую задачу.
+    with _lock:
+        _running.difference_update(
+            [future for future in _running if future.done()]
+        )
+        free = settings.TASK_WORKERS - len(_running)
+        for _ in range(min(count, free)):
+            _running.add(_get_executor().submit(_drain))
+
+
+def poll():
+    """Будит потоки процесса, если подошел срок отложенных задач."""
+    close_old_connections()
+    try:
+        ready = Task.objects.filter(_ready(timezone.now())).exists()
+    finally:
+        close_old_connections()
+    if ready:
+        _wake(settings.TASK_WORKERS)
+    return ready
+
+
+def _poll_forever():
+    while True:
+        time.sleep(settings.TASK_POLL_INTERVAL)
+        try:
+            poll()
+        except Exception:
+            logger.exception('Проверка отложенных задач')
+
+
+def _enabled():
+    # Общую базу SQLite в памяти (тесты) потоки делят без ожидания
+    # блокировок, поэтому там задачи выполняются только явно.
+    return settings.TASK_WORKERS and not connection.is_in_memory_db()
+
+
+def start_poller(**kwargs):
+    """Запускает поток-будильник процесса; повторный вызов ничего не делает.
+
+    Подключен к request_started, поэтому веб-процесс подхватывает
+    задачи, оставшиеся от прошлого запуска, с первым же запросом.
+    """
+    global _poller
+    if _poller is not None or not _enabled():
+        return
+    with _lock:
+        if _poller is None:
+            _poller = threading.Thread(
+                target=_poll_forever, name='tasks-poller', daemon=True
+            )
+            _poller.start()
+
+
+def dispatch(count=1):
+    """Будит потоки процесса после коммита, если они включены."""
+    if not _enabled():
+        return
+    start_poller()
+    transaction.on_commit(lambda: _wake(count))
+
+
+def _ready(now):
+    # Готова ждущая задача или занятая, чей воркер не уложился в срок.
+    return (
+        Q(status=Task.PENDING, run_after__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim(names=None):
+    """Забирает готовую задачу с наибольшим приоритетом или None."""
+    now = timezone.now()
+    candidates = Task.objects.filter(_ready(now))
+    if names:
+        candidates = candidates.filter(name__in=names)
+    candidates = candidates.order_by(
+        '-priority', 'run_after', 'id'
+    ).values_list('pk', flat=True)[:CLAIM_BATCH]
+    locked_until = now + timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT)
+    for pk in candidates:
+        claimed = Task.objects.filter(_ready(now), pk=pk).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=locked_until,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def _finish(task, status, error=''):
+    Task.objects.filter(pk=task.pk).update(
+        status=status,
+        error=error,
+        locked_until=None,
+        finished=timezone.now(),
+    )
+
+
+def _retry_or_fail(task, error):
+    if task.attempts >= task.max_attempts:
+        _finish(task, Task.FAILED, error)
+        return
+    delay = settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.PENDING,
+                error=error,
+                locked_until=None,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        # Пока задача шла, такую же поставили заново: повтор за ней.
+        _finish(task, Task.FAILED, error)
+
+
+def execute(task):
+    """Выполняет забранную задачу; True — успешно."""
+    func = REGISTRY.get(task.name)
+    if func is None:
+        _finish(task, Task.FAILED, f'Неизвестная задача {task.name}')
+        return False
+    if task.attempts > task.max_attempts:
+        # Воркеры падали на задаче, не успевая записать ошибку.
+        _finish(task, Task.FAILED, 'Истек срок выполнения')
+        return False
+    payload = json.loads(task.payload)
+    try:
+        if func.atomic:
+            with transaction.atomic():
+                func(*payload['args'], **payload['kwargs'])
+        else:
+            func(*payload['args'], **payload['kwargs'])
+    except Exception as error:
+        logger.exception('Задача %s', task)
+        _retry_or_fail(task, str(error))
+        return False
+    _finish(task, Task.DONE)
+    return True
+
+
+def run_one(names=None):
+    """Забирает и выполняет одну задачу; None — готовых задач нет."""
+    task = claim(names)
+    if task is None:
+        return None
+    return execute(task)
+
+
+def work(names=None, poll=1.0, stop=None, once=False):
+    """Цикл воркера; once — выйти, когда готовые задачи кончатся.
+
+    Возвращает число успешных и упавших задач.
+    """
+    done = failed = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        result = run_one(names)
+        if result is None:
+            if once:
+                break
+            if stop is None:
+                time.sleep(poll)
+            else:
+                stop.wait(poll)
+            continue
+        if result:
+            done += 1
+        else:
+            failed += 1
+    close_old_connections()
+    return done, failed
+
+
+def run_pending(names=None):
+    """Выполняет в текущем потоке все готовые задачи (тесты, команды)."""
+    return work(names, once=True)
@@ -0,0 +1,13 @@
+"""Фоновые задачи ядра: отправка исходящей почты."""
+from . import outbox
+from .queue import task
+
+
+@task(priority=10, max_attempts=5, key=lambda: 'outbox', atomic=False)
+def flush_outbox():
+    """Отправляет накопившиеся письма и планирует отложенные повторы."""
+    outbox.flush()
+    outbox.purge()
+    delay = outbox.next_retry()
+    if delay is not None:
+        flush_outbox.apply_async(countdown=delay)
@@ -0,0 +1,361 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import TwoTierCache
+from .models import OutboxMessage, Task
+from . import queue
+from .outbox import flush
+from .queue import claim, run_pending, task
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
+}
+
+CALLS = []
+
+
+@task(name='core.tests.record', key=lambda value: str(value))
+def record(value):
+    CALLS.append(value)
+
+
+@task(name='core.tests.explode', max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+class FlakyBackend(EmailBackend):
+    """locmem-бэкенд, который не может доставить письма на bad@."""
+    opened = 0
+    close_error = None
+
+    def open(self):
+        FlakyBackend.opened += 1
+
+    def close(self):
+        if FlakyBackend.close_error is not None:
+            raise FlakyBackend.close_error
+
+    def send_messages(self, messages):
+        if any('bad@yatube.ru' in message.to for message in messages):
+            raise ConnectionError('550 mailbox unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(CACHES=CACHES)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.shared = caches['shared']
+        self.shared.clear()
+        self.worker = TwoTierCache('shared', {
+            'OPTIONS': {'L1_MAX_ENTRIES': 2, 'L1_TIMEOUT': 60},
+        })
+        self.other_worker = TwoTierCache('shared', {})
+
+    def test_workers_share_entries(self):
+        """Запись одного воркера видна другому через L2"""
+        self.worker.set('key', 'value')
+        self.assertEqual(self.other_worker.get('key'), 'value')
+        self.assertEqual(self.shared.get('key'), 'value')
+
+    def test_hot_key_served_from_l1(self):
+        """Повторное чтение не обращается к L2"""
+        self.worker.set('key', 'value')
+        with mock.patch.object(self.shared, 'get') as l2_get:
+            self.assertEqual(self.worker.get('key'), 'value')
+        l2_get.assert_not_called()
+
+    def test_l1_is_bounded(self):
+        """L1 вытесняет самые старые ключи"""
+        for key in ('a', 'b', 'c'):
+            self.worker.set(key, key)
+        self.assertEqual(list(self.worker._l1), [
+            self.worker.make_key('b'), self.worker.make_key('c')])
+
+    def test_incr_goes_to_l2(self):
+        """incr меняет общее значение и сбрасывает L1"""
+        self.worker.set('gen', 1)
+        self.other_worker.incr('gen')
+        self.assertEqual(self.other_worker.get('gen'), 2)
+        self.worker.incr('gen')
+        self.assertEqual(self.worker.get('gen'), 3)
+
+    def test_get_many_mixes_tiers(self):
+        """get_many добирает из L2 только отсутствующие в L1 ключи"""
+        self.worker.set('a', 1)
+        self.shared.set('b', 2)
+        self.assertEqual(self.worker.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+
+    def test_l1_expires(self):
+        """Значение в L1 живет не дольше L1_TIMEOUT"""
+        self.worker.set('key', 'old')
+        self.shared.set('key', 'new')
+        with mock.patch('core.cache.time.monotonic', return_value=1e12):
+            self.assertEqual(self.worker.get('key'), 'new')
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_delay_runs_later(self):
+        """delay только ставит задачу, выполняет её воркер"""
+        queued = record.delay(1)
+        self.assertEqual(CALLS, [])
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(CALLS, [1])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.DONE)
+
+    def test_pending_duplicates_are_merged(self):
+        """Ожидающая задача с тем же ключом не дублируется"""
+        first = record.delay(1)
+        self.assertEqual(record.delay(1).pk, first.pk)
+        self.assertEqual(len(record.delay_many([(1,), (2,)])), 1)
+        run_pending()
+        self.assertEqual(sorted(CALLS), [1, 2])
+
+    def test_pending_key_is_unique(self):
+        """Дубль ожидающей задачи не вставить даже в обход проверки"""
+        first = record.delay(1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Task.objects.create(name=first.name, key=first.key)
+        # Ключ проверили раньше, чем соседний процесс вставил задачу.
+        with mock.patch.object(QuerySet, 'first', side_effect=[None, first]):
+            self.assertEqual(record.delay(1).pk, first.pk)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_earlier_call_moves_pending_task(self):
+        """Вызов без задержки переносит отложенную задачу на сейчас"""
+        later = record.apply_async((1,), countdown=60)
+        self.assertEqual(record.delay(1).pk, later.pk)
+        self.assertEqual(run_pending(), (1, 0))
+
+    def test_poll_wakes_workers_for_due_tasks(self):
+        """Будильник будит потоки, когда подходит срок отложенной задачи"""
+        queued = record.apply_async((1,), countdown=60)
+        with mock.patch('core.queue._wake') as wake:
+            self.assertFalse(queue.poll())
+            Task.objects.filter(pk=queued.pk).update(
+                run_after=timezone.now() - timedelta(seconds=1)
+            )
+            self.assertTrue(queue.poll())
+        wake.assert_called_once()
+
+    def test_worker_thread_drains_ready_tasks(self):
+        """Поток процесса выполняет все готовые задачи, а не одну"""
+        record.delay(1)
+        record.delay(2)
+        queue._drain()
+        self.assertEqual(sorted(CALLS), [1, 2])
+
+    def test_priority_and_countdown(self):
+        """Сначала выполняются важные задачи, отложенные ждут срока"""
+        record.delay(1)
+        record.apply_async((2,), priority=5)
+        record.apply_async((3,), countdown=60)
+        run_pending()
+        self.assertEqual(CALLS, [2, 1])
+
+    @override_settings(TASK_RETRY_DELAY=0)
+    def test_failures_are_retried_then_failed(self):
+        """Ошибка повторяется, пока не кончатся попытки"""
+        queued = explode.delay()
+        self.assertEqual(run_pending(), (0, 2))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertIn('boom', queued.error)
+
+    def test_retry_waits_for_backoff(self):
+        """Повтор откладывается на TASK_RETRY_DELAY"""
+        queued = explode.delay()
+        self.assertEqual(run_pending(), (0, 1))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertGreater(queued.run_after, timezone.now())
+
+    @override_settings(TASK_RETRY_DELAY=0)
+    def test_retry_yields_to_queued_duplicate(self):
+        """Повтор не дублирует задачу, поставленную заново во время работы"""
+        running = record.delay(1)
+        claim()
+        again = record.delay(1)
+        queue._retry_or_fail(Task.objects.get(pk=running.pk), 'boom')
+        running.refresh_from_db()
+        self.assertEqual(running.status, Task.FAILED)
+        self.assertEqual(
+            Task.objects.get(status=Task.PENDING).pk, again.pk
+        )
+
+    def test_expired_lock_is_reclaimed(self):
+        """Задачу упавшего воркера забирают после visibility timeout"""
+        queued = record.delay(1)
+        self.assertEqual(claim().pk, queued.pk)
+        self.assertIsNone(claim())
+        Task.objects.filter(pk=queued.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(run_pending(), (1, 0))
+        queued.refresh_from_db()
+        self.assertEqual(queued.attempts, 2)
+
+    def test_run_tasks_command(self):
+        """run_tasks --once выполняет только выбранные задачи"""
+        record.delay(1)
+        explode.delay()
+        call_command('run_tasks', once=True, workers=1,
+                     only=['core.tests.record'], stdout=mock.MagicMock())
+        self.assertEqual(CALLS, [1])
+        self.assertTrue(Task.objects.filter(
+            name='core.tests.explode', status=Task.PENDING).exists())
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.OutboxEmailBackend',
+    OUTBOX_EMAIL_BACKEND='core.tests.FlakyBackend',
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        FlakyBackend.opened = 0
+        FlakyBackend.close_error = None
+
+    def send(self, *recipients):
+        for recipient in recipients:
+            mail.send_mail('Тема', 'Текст', 'from@yatube.ru', [recipient])
+
+    def test_mail_waits_in_outbox(self):
+        """Отправка в запросе только сохраняет письмо и ставит задачу"""
+        self.send('to@yatube.ru')
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxMessage.objects.get().status,
+                         OutboxMessage.PENDING)
+        self.assertTrue(Task.objects.filter(
+            name='core.tasks.flush_outbox').exists())
+        run_pending()
+        self.assertEqual(mail.outbox[0].to, ['to@yatube.ru'])
+        self.assertEqual(OutboxMessage.objects.get().status,
+                         OutboxMessage.SENT)
+
+    @override_settings(OUTBOX_BATCH_SIZE=2)
+    def test_batch_reuses_connection(self):
+        """Пачка писем уходит через одно соединение"""
+        self.send('a@yatube.ru', 'b@yatube.ru', 'c@yatube.ru')
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(flush(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(FlakyBackend.opened, 2)
+
+    def test_failed_message_is_retried_later(self):
+        """Недоставленное письмо не мешает пачке и ждет повтора"""
+        self.send('bad@yatube.ru', 'good@yatube.ru')
+        self.assertEqual(flush(), (1, 1))
+        bad = OutboxMessage.objects.get(recipients='bad@yatube.ru')
+        self.assertEqual(bad.status, OutboxMessage.PENDING)
+        self.assertGreater(bad.send_after, timezone.now())
+        self.assertIn('550', bad.error)
+        self.assertEqual(flush(), (0, 0))
+
+    @override_settings(OUTBOX_RETRY_DELAY=0, OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_message_gives_up(self):
+        """После OUTBOX_MAX_ATTEMPTS попыток письмо помечается ошибкой"""
+        self.send('bad@yatube.ru')
+        self.assertEqual(flush(), (0, 2))
+        self.assertEqual(OutboxMessage.objects.get().status,
+                         OutboxMessage.FAILED)
+
+    def test_broken_payload_does_not_stop_batch(self):
+        """Испорченное письмо помечается ошибкой, остальные уходят"""
+        self.send('broken@yatube.ru', 'good@yatube.ru')
+        OutboxMessage.objects.filter(recipients='broken@yatube.ru').update(
+            payload='{'
+        )
+        self.assertEqual(flush(), (1, 1))
+        broken = OutboxMessage.objects.get(recipients='broken@yatube.ru')
+        self.assertEqual(broken.status, OutboxMessage.FAILED)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_close_error_keeps_sent_marks(self):
+        """Ошибка закрытия соединения не возвращает письма в очередь"""
+        FlakyBackend.close_error = ConnectionError('421 closing')
+        self.send('to@yatube.ru')
+        self.assertEqual(flush(), (1, 0))
+        self.assertEqual(OutboxMessage.objects.get().status,
+                         OutboxMessage.SENT)
+        self.assertEqual(flush(), (0, 0))
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_stuck_message_gives_up(self):
+        """Зависшее письмо без попыток не забирается, а помечается ошибкой"""
+        self.send('to@yatube.ru')
+        OutboxMessage.objects.update(
+            status=OutboxMessage.SENDING,
+            attempts=1,
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(flush(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxMessage.objects.get().status,
+                         OutboxMessage.FAILED)
+
+    def test_sent_message_body_is_erased(self):
+        """После отправки в очереди остаются адреса, но не текст"""
+        mail.send_mail('Сброс пароля', 'https://yatube.ru/reset/secret/',
+                       'from@yatube.ru', ['to@yatube.ru'])
+        self.assertIn('secret', OutboxMessage.objects.get().payload)
+        self.assertEqual(flush(), (1, 0))
+        self.assertIn('secret', mail.outbox[0].body)
+        payload = json.loads(OutboxMessage.objects.get().payload)
+        self.assertEqual(payload['body'], '')
+        self.assertEqual(payload['alternatives'], [])
+        self.assertEqual(payload['to'], ['to@yatube.ru'])
+
+    def test_admin_hides_payload(self):
+        """Персонал не видит в админке текст письма"""
+        mail.send_mail('Сброс пароля', 'https://yatube.ru/reset/secret/',
+                       'from@yatube.ru', ['to@yatube.ru'])
+        admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@yatube.ru', 'password')
+        self.client.force_login(admin)
+        url = reverse('admin:core_outboxmessage_change',
+                      args=[OutboxMessage.objects.get().pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'to@yatube.ru')
+        self.assertNotContains(response, 'secret')
+
+    def test_metrics(self):
+        """Метрики очередей видны персоналу и скрыты от остальных"""
+        self.send('to@yatube.ru', 'bad@yatube.ru')
+        run_pending()
+        url = reverse('queue_metrics')
+        self.assertEqual(
+            self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 404)
+        user = get_user_model().objects.create_user('user')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        user.is_staff = True
+        user.save()
+        data = self.client.get(url).json()
+        self.assertEqual(data['outbox']['depth']['sent'], 1)
+        self.assertEqual(data['outbox']['depth']['pending'], 1)
+        self.assertEqual(data['outbox']['sent_last_hour'], 1)
+        self.assertIsNotNone(data['outbox']['latency_p95_s'])
+        self.assertEqual(data['tasks']['depth']['done'], 1)
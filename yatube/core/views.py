@@ -1,4 +1,8 @@
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+
+from . import metrics
 
 
 def page_not_found(request, exception):
@@ -19,3 +23,14 @@ def http_forbidden(request, reason=''):
 def internal_server_error(request, reason=''):
     return render(request, 'core/404.html',
                   {'path': request.path}, status=500)
+
+
+@never_cache
+def queue_metrics(request):
+    """Глубина и задержка очередей: только для персонала.
+
+    Адрес клиента не проверяется: за прокси REMOTE_ADDR у всех свой.
+    """
+    if not request.user.is_staff:
+        raise Http404
+    return JsonResponse(metrics.collect())
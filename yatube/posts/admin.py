@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Post, Group, Comment, Follow
+from .models import (
+    Comment, CommentReaction, Follow, Group, Post, PostReaction,
+)
+from .search import build_query, matching
 
 
 @admin.register(Post)
@@ -16,7 +19,17 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице — полнотекстовый индекс.
+        if not search_term.strip():
+            return queryset, False
+        if not build_query(search_term):
+            return queryset.none(), False
+        return matching(queryset, search_term), False
+
 
 admin.site.register(Group)
 admin.site.register(Comment)
 admin.site.register(Follow)
+admin.site.register(PostReaction)
+admin.site.register(CommentReaction)
@@ -0,0 +1,77 @@
+"""Кеш отрендеренных карточек записей (includes/article.html).
+
+Карточка зависит только от записи, её автора и группы, поэтому
+рендерится один раз и дальше собирается в ленты пачкой get_many.
+Ключ — id записи, вариант карточки и версия шаблона; при изменении
+записи, автора или группы ключи удаляются сигналами.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import ImageVariant
+from .rows import PostRow
+
+CARD_TEMPLATE = 'includes/article.html'
+# Поднять при изменении разметки карточки, чтобы не отдавать старую.
+CARD_VERSION = 2
+# Варианты: на странице группы не нужна ссылка на группу,
+# в профиле — строка с автором.
+VARIANTS = ('feed', 'group', 'profile')
+
+
+def card_key(post_id, variant):
+    return f'posts:card:{CARD_VERSION}:{variant}:{post_id}'
+
+
+def render_card(post, variant):
+    return render_to_string(CARD_TEMPLATE, {
+        'post': post,
+        'variant': variant,
+    })
+
+
+def load_variants(posts):
+    """Подгружает копии картинок одним запросом для моделей и PostRow.
+
+    Записи без картинки пропускаются: копии им не нужны.
+    """
+    posts = [post for post in posts if post.image]
+    models = [post for post in posts if not isinstance(post, PostRow)]
+    if models:
+        prefetch_related_objects(models, 'variants')
+    rows = {post.pk: post for post in posts if isinstance(post, PostRow)}
+    if not rows:
+        return
+    for variant in ImageVariant.objects.filter(post_id__in=rows):
+        rows[variant.post_id].variants.append(variant)
+
+
+def attach_cards(page_obj, variant='feed'):
+    """Кладет в post.card готовую разметку для каждой записи страницы."""
+    posts = list(page_obj.object_list)
+    page_obj.object_list = posts
+    keys = {post.pk: card_key(post.pk, variant) for post in posts}
+    cached = cache.get_many(keys.values())
+    # Копии картинок нужны только тем карточкам, которых нет в кеше.
+    load_variants([post for post in posts if keys[post.pk] not in cached])
+    rendered = {}
+    for post in posts:
+        html = cached.get(keys[post.pk])
+        if html is None:
+            html = render_card(post, variant)
+            rendered[keys[post.pk]] = html
+        post.card = mark_safe(html)
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return page_obj
+
+
+def invalidate_cards(post_ids):
+    cache.delete_many([
+        card_key(post_id, variant)
+        for post_id in post_ids
+        for variant in VARIANTS
+    ])
@@ -0,0 +1,124 @@
+"""Условные ответы (ETag/Last-Modified) для лент и страницы записи.
+
+Состояние страницы считается одним легким запросом по индексу —
+самая свежая pub_date ленты — и чтением поколений кеша страниц
+(pagecache), которые сигналы увеличивают при правке записи, группы,
+автора или подписки. Last-Modified — позднее из свежей pub_date и
+времени последнего увеличения поколений, поэтому правка и удаление его
+тоже двигают вперед. Пока состояние не изменилось, браузер и прокси
+получают 304 без выборки записей и рендера шаблона.
+
+Функции состояния принимают аргументы представления и возвращают
+(области, свежая pub_date, доп. метка).
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import pagecache
+from .models import Post
+from .timeline import follow_feed
+
+# Поднять при изменении разметки страниц, чтобы сбросить ETag у всех.
+ETAG_VERSION = 2
+
+
+def newest_date(queryset):
+    return queryset.order_by('-pub_date').values_list(
+        'pub_date', flat=True
+    ).first()
+
+
+def index_state(request):
+    return [pagecache.POSTS], newest_date(Post.objects.all()), ''
+
+
+def trending_state(request):
+    # Порядок меняет только пересчет рейтинга, а он сбрасывает область.
+    return [pagecache.TRENDING], None, ''
+
+
+def group_state(request, slug):
+    posts = Post.objects.filter(group__slug=slug)
+    return [f'group:{slug}'], newest_date(posts), ''
+
+
+def profile_state(request, username):
+    posts = Post.objects.filter(author__username=username)
+    return [f'author:{username}'], newest_date(posts), ''
+
+
+def follow_state(request):
+    if not request.user.is_authenticated:
+        return [], None, ''
+    # Записи авторов без fan-out тоже в ленте: свежую дату дает FollowFeed.
+    newest = follow_feed(request).newest()
+    return [f'follow:{request.user.pk}'], newest, ''
+
+
+def post_state(request, post_id):
+    post = Post.objects.filter(pk=post_id).order_by().annotate(
+        newest_comment=Max('comments__pub_date')
+    ).values_list(
+        'author__username', 'pub_date', 'comments_count', 'newest_comment'
+    ).first()
+    if post is None:
+        return [], None, ''
+    username, pub_date, comments_count, newest_comment = post
+    newest = max(filter(None, [pub_date, newest_comment]))
+    # Новые комментарии не меняют поколений, поэтому их число — в метке;
+    # сброс счетчиков реакций увеличивает поколение post:<id>.
+    return [f'author:{username}', f'post:{post_id}'], newest, comments_count
+
+
+def feed_condition(state, per_user=False):
+    """condition() по состоянию state, посчитанному раз на запрос.
+
+    per_user — страница зависит от читателя (шапка, кнопки подписки):
+    в ETag добавляются его id и область его подписок, как в cache_feed.
+    """
+    def get_state(request, **kwargs):
+        if hasattr(request, '_feed_state'):
+            return request._feed_state
+        scopes, newest, mark = state(request, **kwargs)
+        scopes = [pagecache.SITE] + scopes
+        reader = ''
+        if per_user:
+            reader = 'anon'
+            if request.user.is_authenticated:
+                reader = request.user.pk
+                scopes.append(f'follow:{request.user.pk}')
+        stamp, modified = pagecache.state(scopes)
+        raw = (
+            f'{ETAG_VERSION}|{request.get_full_path()}|{reader}|{stamp}|'
+            f'{newest}|{mark}'
+        )
+        request._feed_state = (
+            hashlib.md5(raw.encode()).hexdigest(),
+            max(filter(None, [newest, modified])),
+        )
+        return request._feed_state
+
+    def etag(request, **kwargs):
+        return get_state(request, **kwargs)[0]
+
+    def last_modified(request, **kwargs):
+        return get_state(request, **kwargs)[1]
+
+    def decorator(view):
+        conditional = condition(
+            etag_func=etag, last_modified_func=last_modified
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # Без no-cache браузер может по Last-Modified счесть страницу
+            # свежей и не спросить сервер вовсе.
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+"""Денормализованные счетчики записей, комментариев и подписок.
+
+Счетчики меняются атомарно через F()-выражения из сигналов, а
+reconcile() пересчитывает их пачкой, если они разошлись с данными.
+Счетчики реакций копит CounterBuffer и пишет пачками.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import pagecache
+from .models import (
+    Comment, CommentReaction, Follow, Post, PostReaction, User, UserCounter,
+)
+
+
+def _bump(queryset, field, delta):
+    # Разошедшийся счетчик не уводим ниже нуля: это сделает reconcile().
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def bump_user(user_id, field, delta):
+    """Сдвигает счетчик пользователя field на delta."""
+    _bump(UserCounter.objects.filter(user_id=user_id), field, delta)
+
+
+def bump_comments(post_id, delta):
+    _bump(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+class CounterBuffer:
+    """Копит сдвиги счетчиков в памяти процесса и пишет их пачкой.
+
+    Популярная запись с сотней реакций в секунду дала бы сотню UPDATE
+    одной строки, и на SQLite каждый ждал бы единственного писателя.
+    Буфер складывает сдвиги по (модель, поле, id) и сбрасывает их одной
+    транзакцией, по UPDATE на каждую группу с одинаковым сдвигом, когда
+    набралось REACTION_BUFFER_SIZE целей или прошло
+    REACTION_FLUSH_INTERVAL секунд с первого несброшенного сдвига.
+    Сдвиги, потерянные при падении процесса, вернет reconcile().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.scopes = set()
+        self.since = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, model, pk, field, delta, scope=None):
+        """Сдвигает счетчик; scope — область pagecache для сброса."""
+        with self.lock:
+            self.pending[model, field, pk] += delta
+            if scope:
+                self.scopes.add(scope)
+            if self.since is None:
+                self.since = time.monotonic()
+        self.flush_if_due()
+
+    def due(self):
+        if self.since is None:
+            return False
+        return (
+            len(self.pending) >= settings.REACTION_BUFFER_SIZE
+            or time.monotonic() - self.since
+            >= settings.REACTION_FLUSH_INTERVAL
+        )
+
+    def flush_if_due(self):
+        if self.due():
+            self.flush()
+
+    def merge(self, pending, scopes):
+        with self.lock:
+            for key, delta in pending.items():
+                self.pending[key] += delta
+            self.scopes |= scopes
+            if self.since is None:
+                self.since = time.monotonic()
+
+    def flush(self):
+        """Пишет накопленное; возвращает число сдвинутых счетчиков."""
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            scopes, self.scopes = self.scopes, set()
+            self.since = None
+        groups = defaultdict(list)
+        for (model, field, pk), delta in pending.items():
+            if delta:
+                groups[model, field, delta].append(pk)
+        try:
+            with transaction.atomic():
+                for (model, field, delta), ids in groups.items():
+                    _bump(model.objects.filter(pk__in=ids), field, delta)
+        except Exception:
+            # Сдвиги не записаны: возвращаем их к следующему сбросу.
+            self.merge(pending, scopes)
+            raise
+        if scopes:
+            pagecache.bump(*scopes)
+        return sum(len(ids) for ids in groups.values())
+
+
+buffer = CounterBuffer()
+
+
+def bump_reactions(model, pk, delta, scope=None):
+    """Сдвигает reactions_count записи или комментария через буфер."""
+    buffer.add(model, pk, 'reactions_count', delta, scope)
+
+
+def _count(queryset, field):
+    """Подзапрос с числом строк queryset для OuterRef('pk')."""
+    counted = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def reconcile():
+    """Пересчитывает все счетчики; возвращает число обновленных строк."""
+    # Иначе старые сдвиги из буфера лягут поверх точного пересчета.
+    buffer.flush()
+    missing = User.objects.filter(counters__isnull=True).values_list(
+        'pk', flat=True
+    )
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=user_id) for user_id in missing],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    users = UserCounter.objects.update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    posts = Post.objects.update(
+        comments_count=_count(Comment.objects.all(), 'post'),
+        reactions_count=_count(PostReaction.objects.all(), 'post'),
+    )
+    comments = Comment.objects.update(
+        reactions_count=_count(CommentReaction.objects.all(), 'comment'),
+    )
+    return users + posts + comments
@@ -0,0 +1,139 @@
+"""RSS и Atom для общей ленты, групп и авторов.
+
+В документ попадают только SYNDICATION_ITEMS последних записей,
+читаемых легкими строками PostRow. Готовый документ кешируется
+cache_feed по тем же поколениям, что и HTML-ленты, — сигналы
+сбрасывают его при сохранении или удалении записи, — а повторный
+опрос с If-None-Match/If-Modified-Since получает 304 от
+feed_condition, не доходя до кеша.
+"""
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from .conditional import (
+    feed_condition, group_state, index_state, profile_state,
+)
+from .models import Group, Post, User
+from .pagecache import POSTS, cache_feed
+
+TITLE_WORDS = 10
+
+
+class PostsFeed(Feed):
+    def get_posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        posts = self.get_posts(obj).as_rows()
+        return posts[:settings.SYNDICATION_ITEMS]
+
+    def item_title(self, item):
+        return Truncator(item.text).words(TITLE_WORDS)
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item.pk])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_updateddate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_author_link(self, item):
+        return reverse('posts:profile', args=[item.author.username])
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class IndexFeed(PostsFeed):
+    title = 'Yatube: последние записи'
+    description = 'Последние обновления на сайте'
+
+    def link(self):
+        return reverse('posts:index')
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def get_posts(self, group):
+        return group.posts.all()
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=[group.slug])
+
+
+class ProfileFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def get_posts(self, author):
+        return Post.objects.filter(author=author)
+
+    def title(self, author):
+        return f'Yatube: записи {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return self.title(author)
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+
+class IndexAtomFeed(IndexFeed):
+    feed_type = Atom1Feed
+    subtitle = IndexFeed.description
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return self.description(group)
+
+
+class ProfileAtomFeed(ProfileFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
+
+
+def syndication(feed_class, state, scope):
+    """Представление ленты: условный GET поверх кеша поколений."""
+    feed = feed_class()
+
+    def view(request, **kwargs):
+        return feed(request, **kwargs)
+
+    # По имени представления cache_feed различает ключи лент.
+    view.__name__ = feed_class.__name__
+    return feed_condition(state)(cache_feed(scope, per_user=False)(view))
+
+
+index_rss = syndication(IndexFeed, index_state, POSTS)
+index_atom = syndication(IndexAtomFeed, index_state, POSTS)
+group_rss = syndication(GroupFeed, group_state, 'group:{slug}')
+group_atom = syndication(GroupAtomFeed, group_state, 'group:{slug}')
+profile_rss = syndication(ProfileFeed, profile_state, 'author:{username}')
+profile_atom = syndication(
+    ProfileAtomFeed, profile_state, 'author:{username}'
+)
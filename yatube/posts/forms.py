@@ -12,3 +12,10 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class ReplyForm(CommentForm):
+    """Комментарий из формы ответа: со скрытым id родителя."""
+    class Meta(CommentForm.Meta):
+        fields = ('text', 'parent')
+        widgets = {'parent': forms.HiddenInput}
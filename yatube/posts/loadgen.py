@@ -0,0 +1,287 @@
+"""Синтетическая социальная сеть и нагрузочный прогон по ней.
+
+synthetic_records() описывает пользователей, группы, записи,
+комментарии и подписки строками формата posts.bulk, поэтому граф
+загружается тем же Importer, что и выгрузки. Популярность авторов
+подчиняется закону Ципфа (вес автора ранга r — 1 / r ** alpha): у
+немногих тысячи подписчиков, у большинства единицы, и они же пишут
+больше записей.
+
+LoadRun гоняет смесь запросов к представлениям через полный стек
+обработчика Django в этом же процессе (django.test.Client собирает
+WSGI-окружение без сети) из нескольких потоков и собирает задержки по
+адресам.
+"""
+import itertools
+import random
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models import Max
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.metrics import percentile
+
+from .models import Group, Post, User
+
+WORDS = (
+    'утро', 'город', 'река', 'дорога', 'книга', 'письмо', 'друг', 'поезд',
+    'снег', 'лес', 'море', 'окно', 'свет', 'песня', 'зима', 'лето', 'дом',
+    'вечер', 'память', 'ветер', 'новый', 'старый', 'тихий', 'долгий',
+    'читать', 'писать', 'ждать', 'помнить', 'видеть', 'идти',
+)
+SYNTHETIC_IMAGES = 5
+
+DEFAULT_MIX = {
+    'index': 30,
+    'profile': 15,
+    'group_posts': 15,
+    'post_detail': 20,
+    'follow_index': 10,
+    'post_create': 5,
+    'add_comment': 5,
+}
+# Адреса, которым нужен вошедший пользователь.
+AUTH_ROUTES = {'follow_index', 'post_create', 'add_comment'}
+# Сколько id записей и пользователей держать для выбора целей.
+TARGET_SAMPLE = 10000
+# Адрес клиента вне INTERNAL_IPS: иначе при DEBUG страницы обвешивает
+# debug_toolbar и замер получается не про сайт.
+REMOTE_ADDR = '192.0.2.1'
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def zipf_weights(count, alpha):
+    """Накопленные веса для random.choices по закону Ципфа."""
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, count + 1)
+    ))
+
+
+def synthetic_images(rng):
+    """Несколько картинок в хранилище, на которые ссылаются записи."""
+    paths = []
+    for number in range(SYNTHETIC_IMAGES):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+        name = f'posts/synthetic/{number}.jpg'
+        default_storage.delete(name)
+        content = ContentFile(buffer.getvalue())
+        paths.append(default_storage.save(name, content))
+    return paths
+
+
+def synthetic_records(users, groups, posts, comments, follows=10,
+                      alpha=1.1, images=0.0, days=365, prefix='load',
+                      seed=None):
+    """Строки posts.bulk для синтетического графа.
+
+    follows — среднее число подписок на пользователя, images — доля
+    записей с картинкой. Имена получают префикс prefix, чтобы граф
+    можно было досыпать в базу с живыми данными.
+    """
+    rng = random.Random(seed)
+    names = [f'{prefix}{number}' for number in range(users)]
+    weights = zipf_weights(users, alpha)
+    slugs = [f'{prefix}-group-{number}' for number in range(groups)]
+    paths = synthetic_images(rng) if images and posts else []
+    now = timezone.now()
+    first_post = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def moment():
+        return now - timedelta(seconds=rng.uniform(0, days * 86400))
+
+    authors = rng.choices(names, cum_weights=weights, k=posts)
+    for offset, author in enumerate(authors):
+        # Примерно треть записей — вне групп.
+        in_group = slugs and rng.random() < 0.7
+        yield {
+            'type': 'post',
+            'id': first_post + offset,
+            'author': author,
+            'group': rng.choice(slugs) if in_group else '',
+            'text': _text(rng, rng.randint(5, 40)),
+            'pub_date': moment().isoformat(),
+            'image': rng.choice(paths) if rng.random() < images else '',
+        }
+    for _ in range(comments if posts else 0):
+        yield {
+            'type': 'comment',
+            'post': first_post + rng.randrange(posts),
+            'author': rng.choice(names),
+            'text': _text(rng, rng.randint(2, 15)),
+            'pub_date': moment().isoformat(),
+        }
+    for user in names:
+        count = min(users - 1, int(rng.expovariate(1 / follows)))
+        targets = set(rng.choices(names, cum_weights=weights, k=count))
+        for author in targets - {user}:
+            yield {'type': 'follow', 'user': user, 'author': author}
+
+
+class Targets:
+    """Выборка существующих записей, авторов и групп для запросов."""
+
+    def __init__(self):
+        self.post_ids = list(
+            Post.objects.order_by('-pk').values_list('pk', flat=True)
+            [:TARGET_SAMPLE]
+        )
+        self.usernames = list(
+            User.objects.filter(posts__isnull=False).distinct()
+            .values_list('username', flat=True)[:TARGET_SAMPLE]
+        )
+        self.user_ids = list(
+            User.objects.values_list('pk', flat=True)[:TARGET_SAMPLE]
+        )
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        if not (self.post_ids and self.usernames and self.slugs):
+            raise ValueError(
+                'Нужны записи, авторы и группы: сначала запустите seed_graph.'
+            )
+
+
+def build_request(route, targets, rng):
+    """(метод, адрес, данные) для одного запроса к route."""
+    page = {'page': rng.choice((1, 1, 1, 2, 3))}
+    if route == 'index':
+        return 'get', reverse('posts:index'), page
+    if route == 'profile':
+        username = rng.choice(targets.usernames)
+        return 'get', reverse('posts:profile', args=[username]), page
+    if route == 'group_posts':
+        slug = rng.choice(targets.slugs)
+        return 'get', reverse('posts:group_list', args=[slug]), page
+    if route == 'post_detail':
+        post_id = rng.choice(targets.post_ids)
+        return 'get', reverse('posts:post_detail', args=[post_id]), {}
+    if route == 'follow_index':
+        return 'get', reverse('posts:follow_index'), page
+    if route == 'post_create':
+        return 'post', reverse('posts:post_create'), {
+            'text': _text(rng, rng.randint(5, 40)),
+            'group': '',
+        }
+    if route == 'add_comment':
+        post_id = rng.choice(targets.post_ids)
+        return 'post', reverse('posts:add_comment', args=[post_id]), {
+            'text': _text(rng, rng.randint(2, 15)),
+        }
+    raise ValueError(f'Неизвестный адрес в смеси: {route}')
+
+
+class LoadRun:
+    """Прогон смеси mix из concurrency потоков.
+
+    Останавливается после requests запросов или через duration секунд —
+    что наступит раньше.
+    """
+
+    def __init__(self, mix=None, requests=1000, duration=None,
+                 concurrency=4, seed=None):
+        self.mix = mix or DEFAULT_MIX
+        self.requests = requests
+        self.duration = duration
+        self.concurrency = concurrency
+        self.seed = seed
+        self.targets = Targets()
+        self.issued = itertools.count()
+        self.latencies = {route: [] for route in self.mix}
+        self.errors = dict.fromkeys(self.mix, 0)
+        self.lock = threading.Lock()
+        self.elapsed = 0
+
+    def more(self, deadline):
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        return self.requests is None or next(self.issued) < self.requests
+
+    def worker(self, number, deadline):
+        close_old_connections()
+        rng = random.Random(None if self.seed is None else self.seed + number)
+        routes = list(self.mix)
+        weights = [self.mix[route] for route in routes]
+        anonymous = Client(REMOTE_ADDR=REMOTE_ADDR)
+        reader = Client(REMOTE_ADDR=REMOTE_ADDR)
+        reader.force_login(User.objects.get(
+            pk=rng.choice(self.targets.user_ids)
+        ))
+        latencies = {route: [] for route in routes}
+        errors = dict.fromkeys(routes, 0)
+        try:
+            while self.more(deadline):
+                route = rng.choices(routes, weights)[0]
+                method, url, data = build_request(route, self.targets, rng)
+                client = reader if route in AUTH_ROUTES else anonymous
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latencies[route].append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors[route] += 1
+        finally:
+            close_old_connections()
+        with self.lock:
+            for route in routes:
+                self.latencies[route].extend(latencies[route])
+                self.errors[route] += errors[route]
+
+    def run(self):
+        started = time.monotonic()
+        deadline = started + self.duration if self.duration else None
+        if self.concurrency == 1:
+            self.worker(0, deadline)
+        else:
+            threads = [
+                threading.Thread(target=self.worker, args=(number, deadline))
+                for number in range(self.concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.elapsed = time.monotonic() - started
+        return self.report()
+
+    def report(self):
+        elapsed = max(self.elapsed, 1e-6)
+        routes = {}
+        for route, values in self.latencies.items():
+            routes[route] = {
+                'requests': len(values),
+                'errors': self.errors[route],
+                'rps': round(len(values) / elapsed, 1),
+                'p50_ms': _ms(percentile(values, 0.5)),
+                'p95_ms': _ms(percentile(values, 0.95)),
+                'p99_ms': _ms(percentile(values, 0.99)),
+            }
+        every = [value for values in self.latencies.values()
+                 for value in values]
+        return {
+            'concurrency': self.concurrency,
+            'seconds': round(elapsed, 2),
+            'requests': len(every),
+            'errors': sum(self.errors.values()),
+            'rps': round(len(every) / elapsed, 1),
+            'p50_ms': _ms(percentile(every, 0.5)),
+            'p95_ms': _ms(percentile(every, 0.95)),
+            'p99_ms': _ms(percentile(every, 0.99)),
+            'routes': routes,
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
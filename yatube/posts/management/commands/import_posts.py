@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает записи, комментарии и подписки из JSONL или CSV '
+        '(формат export_posts) пачками через bulk_create, сохраняя даты.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Файл выгрузки; «-» — стандартный ввод.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(bulk.READERS),
+            help='Формат; по умолчанию по расширению файла, иначе jsonl.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк вставлять одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        progress = bulk.Progress(report=self.stdout.write)
+        importer = bulk.Importer(options['batch_size'], progress)
+        try:
+            if path == '-':
+                importer.load(bulk.READERS[fmt](sys.stdin))
+            else:
+                with open(path, encoding='utf-8', newline='') as stream:
+                    importer.load(bulk.READERS[fmt](stream))
+        except (KeyError, ValueError) as error:
+            raise CommandError(
+                f'Ошибка в строке после {progress.total} загруженных: '
+                f'{error!r}'
+            )
+        skipped = sum(progress.skipped.values())
+        rejected = sum(progress.rejected.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {progress.summary()}; пропущено: {skipped}; '
+            f'отклонено (id занят): {rejected}'
+        ))
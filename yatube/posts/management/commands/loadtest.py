@@ -0,0 +1,96 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import loadgen
+
+
+def parse_mix(value):
+    """'index=30,post_detail=20' -> {'index': 30, 'post_detail': 20}."""
+    mix = {}
+    for part in value.split(','):
+        route, _, weight = part.partition('=')
+        if route.strip() not in loadgen.DEFAULT_MIX:
+            raise CommandError(f'Неизвестный адрес в смеси: {route}')
+        mix[route.strip()] = float(weight or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон: смесь запросов к лентам, записям и формам '
+        'через WSGI-обработчик в этом процессе; req/s и задержки по адресам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Сколько запросов сделать (0 — без ограничения).',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=None,
+            help='Остановиться через столько секунд.',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--mix',
+            type=parse_mix,
+            default=None,
+            help='Веса адресов, например «index=30,post_create=5». '
+                 f'По умолчанию: {loadgen.DEFAULT_MIX}.',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--json',
+            default=None,
+            help='Сохранить отчет в JSON.',
+        )
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING(
+                'DEBUG включен: Django пишет все SQL-запросы в память, '
+                'задержки будут выше, чем в бою.'
+            ))
+        try:
+            run = loadgen.LoadRun(
+                mix=options['mix'],
+                requests=options['requests'] or None,
+                duration=options['duration'],
+                concurrency=options['concurrency'],
+                seed=options['seed'],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        report = run.run()
+        self.print_report(report)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    def print_report(self, report):
+        header = (
+            f'{"адрес":<14}{"запросов":>9}{"ошибок":>8}{"req/s":>9}'
+            f'{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}'
+        )
+        self.stdout.write(header)
+        rows = list(report['routes'].items()) + [('всего', report)]
+        for route, stats in rows:
+            self.stdout.write(
+                f'{route:<14}{stats["requests"]:>9}{stats["errors"]:>8}'
+                f'{stats["rps"]:>9}{_cell(stats["p50_ms"])}'
+                f'{_cell(stats["p95_ms"])}{_cell(stats["p99_ms"])}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{report["requests"]} запросов за {report["seconds"]} с, '
+            f'{report["concurrency"]} потоков'
+        ))
+
+
+def _cell(value):
+    return f'{"-" if value is None else value:>9}'
@@ -0,0 +1,37 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.tasks import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Нарезает картинки записей из очереди задач. С --missing сначала '
+        'ставит в очередь уже загруженные картинки без копий.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Сначала поставить в очередь записи без нарезанных копий.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Число потоков нарезки.',
+        )
+
+    def handle(self, *args, **options):
+        if options['missing']:
+            queued = thumbnails.enqueue_missing()
+            self.stdout.write(f'Поставлено в очередь: {queued}')
+        call_command(
+            'run_tasks',
+            once=True,
+            workers=options['workers'],
+            only=[generate_thumbnails.name],
+            stdout=self.stdout,
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики записей и подписок.'
+
+    def handle(self, *args, **options):
+        updated = reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано строк: {updated}')
+        )
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk, loadgen
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическим графом: пользователи, группы, '
+        'подписки по закону Ципфа, записи (с картинками) и комментарии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows',
+            type=float,
+            default=10,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--alpha',
+            type=float,
+            default=1.1,
+            help='Показатель закона Ципфа: больше — популярность круче.',
+        )
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0.0,
+            help='Доля записей с картинкой (0..1).',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='load',
+            help='Префикс имен пользователей и групп.',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        records = loadgen.synthetic_records(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            alpha=options['alpha'],
+            images=options['images'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+        )
+        progress = bulk.Progress(report=self.stdout.write)
+        bulk.Importer(options['batch_size'], progress).load(records)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {progress.summary()}'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации авторов всем читателям по графу '
+        'подписок. После подписки и отписки рекомендации читателя '
+        'обновляет задача refresh_suggestions.'
+    )
+
+    def handle(self, *args, **options):
+        stats = suggestions.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Читателей: {stats["users"]}, '
+            f'рекомендаций: {stats["suggestions"]}, '
+            f'удалено устаревших: {stats["removed"]}'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+from posts.tasks import update_trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг ленты популярного по новым событиям. '
+        'С --schedule ставит в очередь задачу, которая повторяет '
+        'пересчет раз в TRENDING_INTERVAL секунд.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedule', action='store_true',
+            help='Запустить периодический пересчет через очередь задач.',
+        )
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            update_trending.delay()
+            self.stdout.write(self.style.SUCCESS(
+                'Пересчет рейтинга поставлен в очередь.'
+            ))
+            return
+        stats = trending.update()
+        self.stdout.write(self.style.SUCCESS(
+            f'Событий: {stats["events"]}, записей: {stats["posts"]}, '
+            f'убрано из рейтинга: {stats["pruned"]}'
+        ))
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_rows(queryset, field):
+    counted = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.bulk_create(
+        [UserCounter(user_id=pk) for pk in User.objects.values_list(
+            'pk', flat=True)],
+        batch_size=500,
+    )
+    UserCounter.objects.update(
+        posts_count=count_rows(Post.objects.all(), 'author'),
+        followers_count=count_rows(Follow.objects.all(), 'author'),
+        following_count=count_rows(Follow.objects.all(), 'user'),
+    )
+    Post.objects.update(
+        comments_count=count_rows(Comment.objects.all(), 'post')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0020_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(help_text='Пользователь', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, help_text='Записей', verbose_name='Записей')),
+                ('followers_count', models.PositiveIntegerField(default=0, help_text='Подписчиков', verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, help_text='Подписок', verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счетчики пользователя',
+                'verbose_name_plural': 'Счетчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Комментариев', verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
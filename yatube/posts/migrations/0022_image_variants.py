@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('post', models.ForeignKey(help_text='Запись', on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_jobs', to='posts.Post', verbose_name='Запись')),
+            ],
+            options={
+                'verbose_name': 'Нарезка картинок',
+                'verbose_name_plural': 'Нарезка картинок',
+                'ordering': ['created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Ключ размера из POST_THUMBNAILS', max_length=32, verbose_name='Размер')),
+                ('path', models.CharField(help_text='Путь в хранилище медиа', max_length=255, verbose_name='Файл')),
+                ('width', models.PositiveIntegerField(verbose_name='Ширина')),
+                ('height', models.PositiveIntegerField(verbose_name='Высота')),
+                ('post', models.ForeignKey(help_text='Запись', on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='posts.Post', verbose_name='Запись')),
+            ],
+            options={
+                'verbose_name': 'Копия картинки',
+                'verbose_name_plural': 'Копии картинок',
+                'unique_together': {('post', 'name')},
+            },
+        ),
+    ]
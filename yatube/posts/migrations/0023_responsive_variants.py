@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+def drop_card_variants(apps, schema_editor):
+    # Копии 'card' резал sorl-thumbnail; новые размеры нарежет
+    # `process_thumbnails --missing`.
+    ImageVariant = apps.get_model('posts', 'ImageVariant')
+    ImageVariant.objects.filter(name='card').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='imagevariant',
+            options={'ordering': ['width'], 'verbose_name': 'Копия картинки', 'verbose_name_plural': 'Копии картинок'},
+        ),
+        migrations.AddField(
+            model_name='imagevariant',
+            name='format',
+            field=models.CharField(default='jpeg', help_text='Формат из POST_IMAGE_FORMATS', max_length=10, verbose_name='Формат'),
+        ),
+        migrations.AlterField(
+            model_name='imagevariant',
+            name='name',
+            field=models.CharField(help_text='Ширина копии, например 960w', max_length=32, verbose_name='Размер'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='imagevariant',
+            unique_together={('post', 'name', 'format')},
+        ),
+        migrations.RunPython(drop_card_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from ._search_triggers import (
+    LEGACY_FILL, LEGACY_TABLES, LEGACY_TRIGGERS, create, drop,
+)
+
+# Одна строка индекса на запись: rowid = id записи, столбцы — текст
+# записи и склеенные тексты её комментариев. Триггеры держат индекс в
+# согласии с таблицами при любой записи, включая bulk_create и raw SQL.
+# Комментарии вынесены в свою таблицу в 0030_comment_search.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_responsive_variants'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            create(LEGACY_TABLES, LEGACY_TRIGGERS, LEGACY_FILL),
+            drop(LEGACY_TABLES, LEGACY_TRIGGERS),
+        ),
+    ]
@@ -0,0 +1,39 @@
+import json
+
+from django.db import migrations
+
+TASK_NAME = 'posts.tasks.generate_thumbnails'
+
+
+def move_jobs(apps, schema_editor):
+    """Незавершенные ThumbnailJob переезжают в общую очередь задач."""
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    Task = apps.get_model('core', 'Task')
+    post_ids = set(
+        ThumbnailJob.objects.filter(
+            status__in=['pending', 'running']
+        ).values_list('post_id', flat=True)
+    )
+    Task.objects.bulk_create([
+        Task(
+            name=TASK_NAME,
+            payload=json.dumps({'args': [post_id], 'kwargs': {}}),
+            key=f'post:{post_id}',
+        )
+        for post_id in post_ids
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0024_post_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_jobs, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='ThumbnailJob',
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from ._search_triggers import LEGACY_TRIGGERS, restore
+
+PATH_STEP = 10
+BEFORE_FIELDS, AFTER_FIELDS = restore(
+    'posts_comment', triggers=LEGACY_TRIGGERS,
+)
+
+
+def fill_paths(apps, schema_editor):
+    """Существующие комментарии становятся корнями своих веток."""
+    Comment = apps.get_model('posts', 'Comment')
+    batch = []
+    for pk in Comment.objects.values_list('pk', flat=True).iterator():
+        batch.append(Comment(pk=pk, path=str(pk).zfill(PATH_STEP)))
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_thumbnail_tasks'),
+    ]
+
+    operations = [
+        BEFORE_FIELDS,
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, help_text='Комментарий, на который это ответ', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, help_text='Путь в ветке', max_length=255, verbose_name='Путь в ветке'),
+        ),
+        AFTER_FIELDS,
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from ._search_triggers import LEGACY_TRIGGERS, restore
+
+BEFORE_FIELDS, AFTER_FIELDS = restore(
+    'posts_post', 'posts_comment', triggers=LEGACY_TRIGGERS,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0026_comment_threads'),
+    ]
+
+    operations = [
+        BEFORE_FIELDS,
+        migrations.AddField(
+            model_name='comment',
+            name='reactions_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Реакций', verbose_name='Реакций'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reactions_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Реакций', verbose_name='Реакций'),
+        ),
+        AFTER_FIELDS,
+        migrations.CreateModel(
+            name='PostReaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', '❤'), ('laugh', '😄'), ('wow', '😮'), ('sad', '😢')], default='like', help_text='Реакция', max_length=10, verbose_name='Реакция')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Поставлена', verbose_name='Поставлена')),
+                ('post', models.ForeignKey(help_text='Запись', on_delete=django.db.models.deletion.CASCADE, related_name='reactions', to='posts.Post', verbose_name='Запись')),
+                ('user', models.ForeignKey(help_text='Пользователь', on_delete=django.db.models.deletion.CASCADE, related_name='postreactions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Реакция на запись',
+                'verbose_name_plural': 'Реакции на записи',
+                'unique_together': {('user', 'post')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CommentReaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', '❤'), ('laugh', '😄'), ('wow', '😮'), ('sad', '😢')], default='like', help_text='Реакция', max_length=10, verbose_name='Реакция')),
+                ('created', models.DateTimeField(auto_now_add=True, help_text='Поставлена', verbose_name='Поставлена')),
+                ('comment', models.ForeignKey(help_text='Комментарий', on_delete=django.db.models.deletion.CASCADE, related_name='reactions', to='posts.Comment', verbose_name='Комментарий')),
+                ('user', models.ForeignKey(help_text='Пользователь', on_delete=django.db.models.deletion.CASCADE, related_name='commentreactions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Реакция на комментарий',
+                'verbose_name_plural': 'Реакции на комментарии',
+                'unique_together': {('user', 'comment')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_reactions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostScore',
+            fields=[
+                ('post', models.OneToOneField(help_text='Запись', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Post', verbose_name='Запись')),
+                ('score', models.FloatField(help_text='Логарифм суммы весов событий с поправкой на время', verbose_name='Рейтинг')),
+                ('updated', models.DateTimeField(auto_now=True, help_text='Пересчитан', verbose_name='Пересчитан')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг записи',
+                'verbose_name_plural': 'Рейтинги записей',
+                'ordering': ['-score', '-post'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingMark',
+            fields=[
+                ('source', models.CharField(help_text='Источник', max_length=32, primary_key=True, serialize=False, verbose_name='Источник')),
+                ('last_id', models.PositiveIntegerField(default=0, help_text='Последний id', verbose_name='Последний id')),
+                ('updated', models.DateTimeField(auto_now=True, help_text='Обновлен', verbose_name='Обновлен')),
+            ],
+            options={
+                'verbose_name': 'Отметка рейтинга',
+                'verbose_name_plural': 'Отметки рейтинга',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postscore',
+            index=models.Index(fields=['score', 'post'], name='postscore_score_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0028_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Suggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Общие подписки и похожесть читателей', verbose_name='Вес')),
+                ('mutual', models.PositiveIntegerField(default=0, help_text='Сколько авторов читателя подписаны на этого автора', verbose_name='Общих подписок')),
+                ('candidate', models.ForeignKey(help_text='Рекомендованный автор', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('user', models.ForeignKey(help_text='Читатель', on_delete=django.db.models.deletion.CASCADE, related_name='suggestions', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация',
+                'verbose_name_plural': 'Рекомендации',
+                'ordering': ['-score', 'candidate'],
+                'unique_together': {('user', 'candidate')},
+            },
+        ),
+    ]
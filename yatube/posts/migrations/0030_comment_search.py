@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from ._search_triggers import (
+    FILL, LEGACY_FILL, LEGACY_TABLES, LEGACY_TRIGGERS, TABLES, TRIGGERS,
+    create, drop,
+)
+
+# Индекс пересобирается целиком: у posts_search меняется набор столбцов,
+# а комментарии переезжают в posts_comment_search по строке на каждый.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0029_suggestions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            drop(LEGACY_TABLES, LEGACY_TRIGGERS)
+            + create(TABLES, TRIGGERS, FILL),
+            drop(TABLES, TRIGGERS)
+            + create(LEGACY_TABLES, LEGACY_TRIGGERS, LEGACY_FILL),
+        ),
+    ]
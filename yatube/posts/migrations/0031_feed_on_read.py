@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_heavy(apps, schema_editor):
+    # Записи нынешних тяжелых авторов уже не разложены по лентам.
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).update(feed_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0030_comment_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='feed_on_read',
+            field=models.BooleanField(default=False, help_text='Записи автора не раскладываются по лентам подписчиков', verbose_name='Лента при чтении'),
+        ),
+        migrations.RunPython(mark_heavy, migrations.RunPython.noop),
+    ]
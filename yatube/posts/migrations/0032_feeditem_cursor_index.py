@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0031_feed_on_read'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feeditem',
+            name='feeditem_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'pub_date', 'post'], name='feeditem_user_date_post_idx'),
+        ),
+    ]
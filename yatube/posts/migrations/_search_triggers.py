@@ -0,0 +1,164 @@
+"""SQL поискового индекса: таблицы FTS5 и триггеры, которые их ведут.
+
+Схем две. В 0024 у записи одна строка posts_search, а тексты её
+комментариев склеены в столбец comments: каждый комментарий заново
+склеивал все остальные. С 0030 у каждого комментария своя строка в
+posts_comment_search (rowid = id комментария, post_id для группировки
+при поиске), и триггер комментария трогает только её.
+
+Добавление поля в SQLite пересоздает таблицу, и ее триггеры пропадают
+вместе со старой таблицей: миграции с AddField ставят их заново через
+restore(). Модуль начинается с подчеркивания, поэтому загрузчик
+миграций его не считает миграцией.
+"""
+from django.db import migrations
+
+FTS_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+
+def _trigger(name, event, body):
+    return (
+        name,
+        f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END',
+    )
+
+
+# Схема 0024: комментарии склеены в строку записи.
+LEGACY_COMMENTS_OF = (
+    "coalesce((SELECT group_concat(c.text, ' ') FROM posts_comment c "
+    "WHERE c.post_id = {post_id}), '')"
+)
+LEGACY_TABLES = {
+    'posts_search': f'CREATE VIRTUAL TABLE posts_search USING fts5('
+                    f'text, comments, {FTS_OPTIONS})',
+}
+LEGACY_TRIGGERS = {
+    'posts_post': dict([
+        _trigger(
+            'posts_search_post_insert', 'AFTER INSERT ON posts_post',
+            "INSERT INTO posts_search(rowid, text, comments) "
+            "VALUES (new.id, new.text, '');",
+        ),
+        _trigger(
+            'posts_search_post_update', 'AFTER UPDATE OF text ON posts_post',
+            'UPDATE posts_search SET text = new.text WHERE rowid = new.id;',
+        ),
+        _trigger(
+            'posts_search_post_delete', 'AFTER DELETE ON posts_post',
+            'DELETE FROM posts_search WHERE rowid = old.id;',
+        ),
+    ]),
+    'posts_comment': dict([
+        _trigger(
+            'posts_search_comment_insert', 'AFTER INSERT ON posts_comment',
+            'UPDATE posts_search SET comments = '
+            + LEGACY_COMMENTS_OF.format(post_id='new.post_id')
+            + ' WHERE rowid = new.post_id;',
+        ),
+        _trigger(
+            'posts_search_comment_update',
+            'AFTER UPDATE OF text ON posts_comment',
+            'UPDATE posts_search SET comments = '
+            + LEGACY_COMMENTS_OF.format(post_id='new.post_id')
+            + ' WHERE rowid = new.post_id;',
+        ),
+        _trigger(
+            'posts_search_comment_delete', 'AFTER DELETE ON posts_comment',
+            'UPDATE posts_search SET comments = '
+            + LEGACY_COMMENTS_OF.format(post_id='old.post_id')
+            + ' WHERE rowid = old.post_id;',
+        ),
+    ]),
+}
+LEGACY_FILL = [
+    'INSERT INTO posts_search(rowid, text, comments) '
+    'SELECT p.id, p.text, ' + LEGACY_COMMENTS_OF.format(post_id='p.id')
+    + ' FROM posts_post p',
+]
+
+# Схема 0030: строка на запись и отдельная строка на комментарий.
+TABLES = {
+    'posts_search': f'CREATE VIRTUAL TABLE posts_search USING fts5('
+                    f'text, {FTS_OPTIONS})',
+    'posts_comment_search': f'CREATE VIRTUAL TABLE posts_comment_search '
+                            f'USING fts5(text, post_id UNINDEXED, '
+                            f'{FTS_OPTIONS})',
+}
+TRIGGERS = {
+    'posts_post': dict([
+        _trigger(
+            'posts_search_post_insert', 'AFTER INSERT ON posts_post',
+            'INSERT INTO posts_search(rowid, text) '
+            'VALUES (new.id, new.text);',
+        ),
+        _trigger(
+            'posts_search_post_update', 'AFTER UPDATE OF text ON posts_post',
+            'UPDATE posts_search SET text = new.text WHERE rowid = new.id;',
+        ),
+        _trigger(
+            'posts_search_post_delete', 'AFTER DELETE ON posts_post',
+            'DELETE FROM posts_search WHERE rowid = old.id;',
+        ),
+    ]),
+    'posts_comment': dict([
+        _trigger(
+            'posts_search_comment_insert', 'AFTER INSERT ON posts_comment',
+            'INSERT INTO posts_comment_search(rowid, text, post_id) '
+            'VALUES (new.id, new.text, new.post_id);',
+        ),
+        _trigger(
+            'posts_search_comment_update',
+            'AFTER UPDATE OF text, post_id ON posts_comment',
+            'UPDATE posts_comment_search '
+            'SET text = new.text, post_id = new.post_id '
+            'WHERE rowid = new.id;',
+        ),
+        _trigger(
+            'posts_search_comment_delete', 'AFTER DELETE ON posts_comment',
+            'DELETE FROM posts_comment_search WHERE rowid = old.id;',
+        ),
+    ]),
+}
+FILL = [
+    'INSERT INTO posts_search(rowid, text) SELECT id, text FROM posts_post',
+    'INSERT INTO posts_comment_search(rowid, text, post_id) '
+    'SELECT id, text, post_id FROM posts_comment',
+]
+
+
+def _create_triggers(triggers, tables):
+    return [
+        statement for table in tables
+        for statement in triggers[table].values()
+    ]
+
+
+def create(tables, triggers, fill):
+    """SQL, создающий индекс схемы с нуля и заполняющий его."""
+    return (
+        list(tables.values())
+        + _create_triggers(triggers, triggers)
+        + fill
+    )
+
+
+def drop(tables, triggers):
+    """SQL, удаляющий триггеры и таблицы индекса схемы."""
+    return [
+        f'DROP TRIGGER IF EXISTS {name}'
+        for table in triggers for name in triggers[table]
+    ] + [f'DROP TABLE IF EXISTS {table}' for table in tables]
+
+
+def restore(*tables, triggers=TRIGGERS):
+    """Пара операций, ставящих триггеры tables заново.
+
+    Первую ставят перед AddField, вторую — после: при откате таблицу
+    пересоздает RemoveField, и триггеры нужны уже после него. Миграции
+    до 0030 передают triggers=LEGACY_TRIGGERS.
+    """
+    sql = _create_triggers(triggers, tables)
+    return (
+        migrations.RunSQL(migrations.RunSQL.noop, sql),
+        migrations.RunSQL(sql, migrations.RunSQL.noop),
+    )
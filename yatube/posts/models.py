@@ -1,9 +1,38 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from core.models import CreatedModel
 
+from .rows import ROW_FIELDS, PostRowIterable
+
 User = get_user_model()
 
+# Столбцы, которые читают карточка записи и страница записи.
+FEED_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'comments_count',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__title',
+    'group__slug',
+)
+COMMENT_FIELDS = (
+    'post', 'parent', 'path', 'text', 'pub_date', 'reactions_count',
+    'author__username',
+)
+# Ширина сегмента пути комментария: его id, дополненный нулями.
+PATH_STEP = 10
+# Символ больше любой цифры: верхняя граница поддерева в range-запросе.
+PATH_END = '~'
+
+
+def path_segment(pk):
+    return str(pk).zfill(PATH_STEP)
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -26,6 +55,18 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def with_feed_relations(self):
+        """Автор и группа одним JOIN и только нужные ленте столбцы."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+    def as_rows(self):
+        """Записи как PostRow: только столбцы карточки, без моделей."""
+        clone = self.values_list(*ROW_FIELDS)
+        clone._iterable_class = PostRowIterable
+        return clone
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='Текст',
@@ -54,6 +95,20 @@ class Post(CreatedModel):
         verbose_name='Картинка',
         help_text='Картинка'
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+        help_text='Комментариев',
+    )
+    reactions_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Реакций',
+        help_text='Реакций',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
@@ -62,6 +117,33 @@ class Post(CreatedModel):
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
         ordering = ['-pub_date']
+        # SQLite дописывает rowid в конец индекса и читает его в обратном
+        # порядке, поэтому индексы по возрастанию обслуживают и
+        # ORDER BY pub_date DESC, и курсорный (pub_date, id) DESC.
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_date_idx',
+            ),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_date_idx',
+            ),
+        ]
+
+
+class CommentQuerySet(models.QuerySet):
+    def subtree(self, path, last=None):
+        """Комментарий с путем path и все ответы на него по порядку.
+
+        Пути поддерева начинаются с path и лежат подряд в индексе,
+        поэтому читаются одним range-запросом без рекурсии. С last —
+        все ветки от path до поддерева last включительно.
+        """
+        return self.filter(
+            path__gte=path, path__lt=(last or path) + PATH_END
+        ).order_by('path')
 
 
 class Comment(CreatedModel):
@@ -83,15 +165,86 @@ class Comment(CreatedModel):
         verbose_name='Текст комментария',
         help_text='Tекст комментария'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='replies',
+        verbose_name='Ответ на',
+        help_text='Комментарий, на который это ответ'
+    )
+    # Материализованный путь: id предков и самого комментария сегментами
+    # по PATH_STEP цифр. Сортировка по нему дает ветку в порядке обхода.
+    path = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name='Путь в ветке',
+        help_text='Путь в ветке'
+    )
+    reactions_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Реакций',
+        help_text='Реакций',
+    )
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['post', 'pub_date'],
+                name='comment_post_date_idx',
+            ),
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text
 
+    @property
+    def depth(self):
+        return max(len(self.path) // PATH_STEP - 1, 0)
+
+    def parent_path(self):
+        """Путь родителя, даже если он еще не записан.
+
+        Комментарии из bulk-импорта получают путь только в
+        fill_comment_paths: до этого путь собирается по цепочке предков.
+        """
+        chain = []
+        node = self.parent
+        while node is not None and not node.path:
+            chain.append(path_segment(node.pk))
+            node = node.parent
+        return (node.path if node else '') + ''.join(reversed(chain))
+
+    def save(self, *args, **kwargs):
+        prefix = ''
+        if self.parent_id and not self.path:
+            # Ответ глубже COMMENTS_MAX_DEPTH встает рядом с родителем.
+            prefix = self.parent_path()[
+                :settings.COMMENTS_MAX_DEPTH * PATH_STEP
+            ]
+            ancestor = int(prefix[-PATH_STEP:])
+            if ancestor != self.parent_id:
+                self.parent = Comment.objects.get(pk=ancestor)
+        # Сегмент пути — собственный id, он известен только после
+        # вставки, поэтому путь дописывается вторым UPDATE.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not self.path:
+                self.path = prefix + path_segment(self.pk)
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -114,5 +267,320 @@ class Follow(models.Model):
             'user',
             'author',
         )
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+
+
+class UserCounter(models.Model):
+    """Денормализованные счетчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+        help_text='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Записей',
+        help_text='Записей',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+        help_text='Подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок',
+        help_text='Подписок',
+    )
+    feed_on_read = models.BooleanField(
+        default=False,
+        verbose_name='Лента при чтении',
+        help_text='Записи автора не раскладываются по лентам подписчиков',
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Читатель',
+        help_text='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Запись',
+        help_text='Запись',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+        help_text='Автор',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Дата публикации',
+    )
+
+    class Meta:
+        unique_together = (
+            'user',
+            'post',
+        )
+        indexes = [
+            # post — второй ключ курсора ленты: сортировка целиком по
+            # индексу, без временного B-tree для строк с одной датой.
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='feeditem_user_date_post_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feeditem_user_author_idx',
+            ),
+        ]
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class ImageVariant(models.Model):
+    """Заранее нарезанная копия картинки записи."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='variants',
+        verbose_name='Запись',
+        help_text='Запись',
+    )
+    name = models.CharField(
+        max_length=32,
+        verbose_name='Размер',
+        help_text='Ширина копии, например 960w',
+    )
+    format = models.CharField(
+        max_length=10,
+        default='jpeg',
+        verbose_name='Формат',
+        help_text='Формат из POST_IMAGE_FORMATS',
+    )
+    path = models.CharField(
+        max_length=255,
+        verbose_name='Файл',
+        help_text='Путь в хранилище медиа',
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+
+    class Meta:
+        unique_together = (
+            'post',
+            'name',
+            'format',
+        )
+        ordering = ['width']
+        verbose_name = 'Копия картинки'
+        verbose_name_plural = 'Копии картинок'
+
+    def __str__(self):
+        return f'{self.post_id}:{self.name}.{self.format}'
+
+    @property
+    def url(self):
+        return default_storage.url(self.path)
+
+    @property
+    def mime_type(self):
+        return f'image/{self.format}'
+
+
+class Reaction(models.Model):
+    """Абстрактная реакция пользователя: одна на цель, вид можно сменить."""
+    LIKE = 'like'
+    KINDS = (
+        (LIKE, '❤'),
+        ('laugh', '😄'),
+        ('wow', '😮'),
+        ('sad', '😢'),
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='%(class)ss',
+        verbose_name='Пользователь',
+        help_text='Пользователь',
+    )
+    kind = models.CharField(
+        max_length=10,
+        choices=KINDS,
+        default=LIKE,
+        verbose_name='Реакция',
+        help_text='Реакция',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Поставлена',
+        help_text='Поставлена',
+    )
+
+    class Meta:
+        abstract = True
+
+
+class PostReaction(Reaction):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='reactions',
+        verbose_name='Запись',
+        help_text='Запись',
+    )
+
+    class Meta:
+        unique_together = (
+            'user',
+            'post',
+        )
+        verbose_name = 'Реакция на запись'
+        verbose_name_plural = 'Реакции на записи'
+
+
+class CommentReaction(Reaction):
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='reactions',
+        verbose_name='Комментарий',
+        help_text='Комментарий',
+    )
+
+    class Meta:
+        unique_together = (
+            'user',
+            'comment',
+        )
+        verbose_name = 'Реакция на комментарий'
+        verbose_name_plural = 'Реакции на комментарии'
+
+
+class PostScore(models.Model):
+    """Рейтинг записи в ленте популярного (см. posts.trending)."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Запись',
+        help_text='Запись',
+    )
+    score = models.FloatField(
+        verbose_name='Рейтинг',
+        help_text='Логарифм суммы весов событий с поправкой на время',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Пересчитан',
+        help_text='Пересчитан',
+    )
+
+    class Meta:
+        ordering = ['-score', '-post']
+        indexes = [
+            models.Index(
+                fields=['score', 'post'],
+                name='postscore_score_idx',
+            ),
+        ]
+        verbose_name = 'Рейтинг записи'
+        verbose_name_plural = 'Рейтинги записей'
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.3f}'
+
+
+class TrendingMark(models.Model):
+    """Последний учтенный рейтингом id в таблице событий source."""
+    source = models.CharField(
+        max_length=32,
+        primary_key=True,
+        verbose_name='Источник',
+        help_text='Источник',
+    )
+    last_id = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Последний id',
+        help_text='Последний id',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлен',
+        help_text='Обновлен',
+    )
+
+    class Meta:
+        verbose_name = 'Отметка рейтинга'
+        verbose_name_plural = 'Отметки рейтинга'
+
+    def __str__(self):
+        return f'{self.source}: {self.last_id}'
+
+
+class Suggestion(models.Model):
+    """Рекомендованный читателю автор (см. posts.suggestions)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Читатель',
+        help_text='Читатель',
+    )
+    candidate = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+        help_text='Рекомендованный автор',
+    )
+    score = models.FloatField(
+        verbose_name='Вес',
+        help_text='Общие подписки и похожесть читателей',
+    )
+    mutual = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Общих подписок',
+        help_text='Сколько авторов читателя подписаны на этого автора',
+    )
+
+    class Meta:
+        unique_together = (
+            'user',
+            'candidate',
+        )
+        ordering = ['-score', 'candidate']
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.candidate_id}: {self.score:.3f}'
@@ -0,0 +1,135 @@
+"""Кеш страниц лент на счетчиках поколений.
+
+Ключ страницы включает поколения областей, от которых она зависит
+(вся лента, группа, автор, подписки читателя), а также пользователя.
+Сигналы увеличивают поколение при изменении записи или подписки,
+поэтому страница живет в кеше, пока не устарела, и обновляется сразу
+после изменения. Анонимные и авторизованные страницы хранятся
+раздельно: шапка, переключатель лент и кнопки зависят от читателя.
+
+Рядом с поколением хранится время его последнего увеличения: по нему
+posts.conditional отдает Last-Modified, который растет при любой правке
+или удалении, а не только при появлении новой записи.
+"""
+import hashlib
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+SITE = 'site'
+POSTS = 'posts'
+# Лента популярного: сбрасывает пересчет рейтинга (posts.trending).
+TRENDING = 'trending'
+
+
+def _generation_key(scope):
+    return f'posts:gen:{scope}'
+
+
+def _modified_key(scope):
+    return f'posts:mod:{scope}'
+
+
+def _new_generation():
+    # Случайное начало: после потери ключа старые страницы не совпадут.
+    return random.randint(1, 2 ** 31)
+
+
+def bump(*scopes):
+    """Делает устаревшими страницы, зависящие от областей scopes."""
+    now = time.time()
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def post_scopes(post):
+    """Области, на страницах которых видна запись."""
+    scopes = [POSTS, TRENDING, f'author:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def generations(scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def state(scopes):
+    """Поколения областей и время последнего изменения любой из них."""
+    generation_keys = [_generation_key(scope) for scope in scopes]
+    modified_keys = [_modified_key(scope) for scope in scopes]
+    found = cache.get_many(generation_keys + modified_keys)
+    # Потерянная отметка считается изменением сейчас: лишний 200 лучше
+    # устаревшего 304.
+    now = time.time()
+    missing = {key: _new_generation() for key in generation_keys
+               if key not in found}
+    missing.update(
+        {key: now for key in modified_keys if key not in found}
+    )
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    modified = max(found[key] for key in modified_keys)
+    return (
+        [found[key] for key in generation_keys],
+        datetime.fromtimestamp(modified, timezone.utc),
+    )
+
+
+def page_key(request, name, scopes, per_user=True):
+    user = 'anon'
+    if per_user and request.user.is_authenticated:
+        user = request.user.pk
+    stamp = '.'.join(str(value) for value in generations(scopes))
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:{name}:{user}:{stamp}:{path}'
+
+
+def cache_feed(*scopes, per_user=True):
+    """Кеширует GET-страницу ленты до изменения её областей.
+
+    Области — шаблоны с аргументами представления, например
+    'group:{slug}'. Для авторизованного читателя добавляется область его
+    подписок, а общая область SITE — ко всем страницам. per_user=False —
+    ответ не зависит от читателя (RSS/Atom) и хранится в одном экземпляре.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            names = [SITE] + [scope.format(**kwargs) for scope in scopes]
+            if per_user and request.user.is_authenticated:
+                names.append(f'follow:{request.user.pk}')
+            key = page_key(request, view.__name__, names, per_user)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type']),
+                    settings.FEED_CACHE_TIMEOUT,
+                )
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,147 @@
+import base64
+import binascii
+import math
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class CursorPage:
+    """Страница ленты, открытая по курсору."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Пагинация по ключу (pub_date, pk) без COUNT(*) и OFFSET.
+
+    Каждая страница читается одним запросом с условием «строго после
+    курсора», поэтому время ответа не зависит от глубины ленты.
+    Курсор — непрозрачный токен с направлением и ключом крайней записи.
+    """
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, queryset, per_page, date_field='pub_date'):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.date_field = date_field
+
+    def format_value(self, value):
+        return value.isoformat()
+
+    def parse_value(self, raw):
+        return parse_datetime(raw)
+
+    def encode_cursor(self, direction, obj):
+        value = self.format_value(getattr(obj, self.date_field))
+        raw = f'{direction}|{value}|{obj.pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, дата, pk) или None для битого курсора."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            direction, value, pk = raw.split('|')
+            date = self.parse_value(value)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        if direction not in (self.NEXT, self.PREVIOUS) or date is None:
+            return None
+        return direction, date, pk
+
+    def filter_queryset(self, position):
+        """Упорядочивает выборку и отсекает записи до курсора."""
+        field = self.date_field
+        if position is None:
+            return self.queryset.order_by(f'-{field}', '-pk')
+        direction, date, pk = position
+        if direction == self.NEXT:
+            return self.queryset.filter(
+                Q(**{f'{field}__lt': date})
+                | Q(**{field: date, 'pk__lt': pk})
+            ).order_by(f'-{field}', '-pk')
+        return self.queryset.filter(
+            Q(**{f'{field}__gt': date})
+            | Q(**{field: date, 'pk__gt': pk})
+        ).order_by(field, 'pk')
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу после курсора; битый курсор — первая."""
+        position = self.decode_cursor(cursor)
+        direction = position[0] if position else self.NEXT
+        queryset = self.filter_queryset(position)
+        # Лишняя запись показывает, есть ли что-то за краем страницы.
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == self.PREVIOUS:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = self.encode_cursor(self.NEXT, object_list[-1])
+        if object_list and has_previous:
+            previous_cursor = self.encode_cursor(
+                self.PREVIOUS, object_list[0]
+            )
+        return CursorPage(object_list, self, next_cursor, previous_cursor)
+
+
+class ScoreCursorPaginator(CursorPaginator):
+    """Курсор по (рейтинг, pk) для лент, упорядоченных числом."""
+
+    def __init__(self, queryset, per_page, date_field='score'):
+        super().__init__(queryset, per_page, date_field)
+
+    def format_value(self, value):
+        # repr() float восстанавливается float() без потери точности.
+        return repr(value)
+
+    def parse_value(self, raw):
+        value = float(raw)
+        return value if math.isfinite(value) else None
+
+
+class FeedCursorPaginator(CursorPaginator):
+    """Курсор по ленте, которая сама отсекает записи до курсора.
+
+    Для источников, которые не сводятся к одному queryset, например
+    posts.timeline.FollowFeed: у них есть after(position) и срезы.
+    """
+
+    def filter_queryset(self, position):
+        return self.queryset.after(position)
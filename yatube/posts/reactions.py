@@ -0,0 +1,53 @@
+"""Реакции на записи и комментарии.
+
+У пользователя одна реакция на цель (уникальная пара в таблице):
+та же реакция снимает ее, другая — меняет вид. Счетчики сдвигают
+сигналы через counters.buffer, а состояние кнопок для целой страницы
+читается одним запросом kinds().
+"""
+from django.db import IntegrityError, transaction
+
+from .models import CommentReaction, PostReaction
+
+MODELS = {'post': PostReaction, 'comment': CommentReaction}
+
+
+def toggle(target, user, kind):
+    """Ставит, меняет или снимает реакцию; возвращает вид или None."""
+    model = MODELS[target._meta.model_name]
+    field = target._meta.model_name
+    reaction = model.objects.filter(user=user, **{field: target}).first()
+    if reaction is None:
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, kind=kind, **{field: target})
+        except IntegrityError:
+            # Повторный клик успел раньше: реакция уже стоит.
+            pass
+        return kind
+    # Цель уже загружена: сигналам не нужен запрос за ней.
+    setattr(reaction, field, target)
+    if reaction.kind == kind:
+        reaction.delete()
+        return None
+    reaction.kind = kind
+    reaction.save(update_fields=['kind'])
+    return kind
+
+
+def kinds(user, targets, field='post'):
+    """{id цели: вид реакции user} для targets одним запросом."""
+    ids = [target.pk for target in targets]
+    if not ids or not user.is_authenticated:
+        return {}
+    return dict(MODELS[field].objects.filter(
+        user=user, **{f'{field}_id__in': ids}
+    ).values_list(f'{field}_id', 'kind'))
+
+
+def attach(targets, user, field='post'):
+    """Кладет в target.reaction вид реакции user или None."""
+    found = kinds(user, targets, field)
+    for target in targets:
+        target.reaction = found.get(target.pk)
+    return targets
@@ -0,0 +1,106 @@
+"""Легкие строки записей для лент и выгрузок.
+
+PostQuerySet.as_rows() читает values_list только с теми столбцами,
+которые показывает карточка, и собирает из них объекты со __slots__
+вместо моделей: без хеша пароля и прочих полей пользователя, без
+состояния модели и дескрипторов. Выборка остается QuerySet, поэтому
+ее можно фильтровать, срезать пагинатором и читать через iterator().
+"""
+from django.db.models.query import ValuesListIterable
+
+ROW_FIELDS = (
+    'pk',
+    'text',
+    'pub_date',
+    'image',
+    'comments_count',
+    'author_id',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group_id',
+    'group__title',
+    'group__slug',
+)
+
+
+class AuthorRow:
+    __slots__ = ('pk', 'username', 'first_name', 'last_name')
+
+    def __init__(self, pk, username, first_name, last_name):
+        self.pk = pk
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+
+    def __str__(self):
+        return self.username
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+
+class GroupRow:
+    __slots__ = ('pk', 'title', 'slug')
+
+    def __init__(self, pk, title, slug):
+        self.pk = pk
+        self.title = title
+        self.slug = slug
+
+    def __str__(self):
+        return self.title
+
+
+class PostRow:
+    """Запись для карточки: поля Post, нужные includes/article.html."""
+    __slots__ = (
+        'pk', 'text', 'pub_date', 'image', 'comments_count',
+        'author', 'group', 'variants', 'card', 'reaction',
+    )
+
+    def __init__(self, pk, text, pub_date, image, comments_count,
+                 author, group):
+        self.pk = pk
+        self.text = text
+        self.pub_date = pub_date
+        self.image = image
+        self.comments_count = comments_count
+        self.author = author
+        self.group = group
+        # Копии картинки подставляет attach_cards, если они нужны.
+        self.variants = []
+        self.card = ''
+        # Реакцию читателя подставляет reactions.attach.
+        self.reaction = None
+
+    def __repr__(self):
+        return f'<PostRow: {self.pk}>'
+
+    @property
+    def id(self):
+        return self.pk
+
+    @property
+    def author_id(self):
+        return self.author.pk
+
+    @property
+    def group_id(self):
+        return self.group.pk if self.group else None
+
+    @classmethod
+    def from_values(cls, values):
+        (pk, text, pub_date, image, comments_count, author_id, username,
+         first_name, last_name, group_id, title, slug) = values
+        group = GroupRow(group_id, title, slug) if group_id else None
+        return cls(
+            pk, text, pub_date, image, comments_count,
+            AuthorRow(author_id, username, first_name, last_name), group,
+        )
+
+
+class PostRowIterable(ValuesListIterable):
+    def __iter__(self):
+        for values in super().__iter__():
+            yield PostRow.from_values(values)
@@ -0,0 +1,193 @@
+"""Полнотекстовый поиск по записям и комментариям (SQLite FTS5).
+
+Индекс — таблицы posts_search (строка на запись) и posts_comment_search
+(строка на комментарий, с id записи); их ведут триггеры базы
+(posts/migrations/_search_triggers.py), поэтому Python-код только
+читает их. Запрос пользователя разбирается на слова, каждое берется в
+кавычки (синтаксис FTS5 из ввода не исполняется), «слово*» ищет по
+префиксу. Релевантность записи — лучший bm25 из её текста и её
+комментариев, где совпадение в тексте записи весит вдвое больше;
+страницы листаются курсором по (релевантность, id) без OFFSET.
+"""
+import base64
+import binascii
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginators import CursorPage
+
+MAX_TERMS = 10
+SNIPPET_TOKENS = 12
+TEXT_WEIGHT = 2.0
+COMMENTS_WEIGHT = 1.0
+# Маркеры совпадений в snippet(): управляющие символы не встретятся
+# в тексте, поэтому после экранирования их можно заменить на <mark>.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+TERM_RE = re.compile(r'(\w+)(\*?)')
+POSTS_MATCH = 'SELECT rowid FROM posts_search WHERE posts_search MATCH %s'
+COMMENTS_MATCH = (
+    'SELECT CAST(post_id AS INTEGER) FROM posts_comment_search '
+    'WHERE posts_comment_search MATCH %s'
+)
+# Совпадения группируются по записи при запросе: (id записи, bm25).
+RANKS = (
+    'SELECT post_id, MIN(score) AS score FROM ('
+    f'SELECT rowid AS post_id, bm25(posts_search) * {TEXT_WEIGHT} AS score '
+    'FROM posts_search WHERE posts_search MATCH %s '
+    'UNION ALL '
+    'SELECT CAST(post_id AS INTEGER), '
+    f'bm25(posts_comment_search) * {COMMENTS_WEIGHT} '
+    'FROM posts_comment_search WHERE posts_comment_search MATCH %s'
+    ') GROUP BY post_id'
+)
+
+
+def build_query(text, column=None):
+    """Переводит строку поиска в выражение MATCH или пустую строку."""
+    terms = [
+        f'"{word}"{star}' for word, star in TERM_RE.findall(text)
+    ][:MAX_TERMS]
+    if not terms:
+        return ''
+    expression = ' '.join(terms)
+    if column:
+        return f'{column} : ({expression})'
+    return expression
+
+
+def matching(queryset, text):
+    """Записи queryset, чей текст (без комментариев) совпал с text.
+
+    Подзапрос идет в WHERE как есть: pk__in=RawSQL(...) Django берет
+    в двойные скобки, и SQLite читает их как скалярный подзапрос —
+    остается только первый найденный id.
+    """
+    table = connection.ops.quote_name(Post._meta.db_table)
+    return queryset.extra(
+        where=[f'{table}.id IN ({POSTS_MATCH})'], params=[build_query(text)]
+    )
+
+
+def highlight(fragment):
+    return mark_safe(
+        escape(fragment)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class SearchPaginator:
+    """Курсорная пагинация результатов поиска по (bm25, id)."""
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, text, per_page):
+        self.match = build_query(text)
+        self.per_page = int(per_page)
+
+    def encode_cursor(self, direction, post):
+        raw = f'{direction}|{post.score!r}|{post.pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            direction, score, pk = raw.split('|')
+            score = float(score)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        if direction not in (self.NEXT, self.PREVIOUS):
+            return None
+        return direction, score, pk
+
+    def fetch_ranks(self, position):
+        """Возвращает [(id, bm25)] следующей порции после курсора."""
+        sql = f'SELECT post_id, score FROM ({RANKS})'
+        params = [self.match, self.match]
+        # Лучшие совпадения — с меньшим bm25; при равенстве новее выше.
+        order = 'score, post_id DESC'
+        if position is not None:
+            direction, score, pk = position
+            if direction == self.NEXT:
+                sql += ' WHERE score > %s OR (score = %s AND post_id < %s)'
+            else:
+                sql += ' WHERE score < %s OR (score = %s AND post_id > %s)'
+                order = 'score DESC, post_id'
+            params += [score, score, pk]
+        sql += f' ORDER BY {order} LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def fetch_snippets(self, ids):
+        """Сниппет из текста записи, а без совпадения там — из комментария."""
+        params = [MARK_START, MARK_END, '…', SNIPPET_TOKENS, self.match]
+        placeholders = ', '.join(['%s'] * len(ids))
+        sql = (
+            'SELECT rowid, snippet(posts_search, 0, %s, %s, %s, %s) '
+            'FROM posts_search WHERE posts_search MATCH %s '
+            f'AND rowid IN ({placeholders})'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + list(ids))
+            snippets = dict(cursor.fetchall())
+            rest = [pk for pk in ids if pk not in snippets]
+            if not rest:
+                return snippets
+            placeholders = ', '.join(['%s'] * len(rest))
+            cursor.execute(
+                'SELECT CAST(post_id AS INTEGER), '
+                'snippet(posts_comment_search, 0, %s, %s, %s, %s) '
+                'FROM posts_comment_search '
+                'WHERE posts_comment_search MATCH %s '
+                f'AND post_id IN ({placeholders}) ORDER BY rank',
+                params + rest,
+            )
+            for pk, snippet in cursor.fetchall():
+                snippets.setdefault(pk, snippet)
+        return snippets
+
+    def get_page(self, cursor=None):
+        """Страница результатов после курсора; битый курсор — первая."""
+        if not self.match:
+            return CursorPage([], self)
+        position = self.decode_cursor(cursor)
+        direction = position[0] if position else self.NEXT
+        ranks = self.fetch_ranks(position)
+        has_more = len(ranks) > self.per_page
+        ranks = ranks[:self.per_page]
+        if direction == self.PREVIOUS:
+            ranks.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        ids = [pk for pk, _ in ranks]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        snippets = self.fetch_snippets(ids) if ids else {}
+        object_list = []
+        for pk, score in ranks:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.score = score
+            post.snippet = highlight(snippets.get(pk, ''))
+            object_list.append(post)
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = self.encode_cursor(self.NEXT, object_list[-1])
+        if object_list and has_previous:
+            previous_cursor = self.encode_cursor(
+                self.PREVIOUS, object_list[0]
+            )
+        return CursorPage(object_list, self, next_cursor, previous_cursor)
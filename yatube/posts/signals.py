@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, pagecache, tasks, timeline
+from .cards import invalidate_cards
+from .models import (
+    Comment, CommentReaction, Follow, Group, Post, PostReaction, Suggestion,
+    User, UserCounter,
+)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created:
+        UserCounter.objects.get_or_create(user=instance)
+        return
+    # Вход пользователя обновляет только last_login — карточки не меняются.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_cards(instance.posts.values_list('pk', flat=True))
+    pagecache.bump(pagecache.SITE)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_cards(instance.posts.values_list('pk', flat=True))
+        pagecache.bump(pagecache.SITE)
+
+
+@receiver(pre_save, sender=Post)
+def post_moving(sender, instance, **kwargs):
+    # Запись могли перенести в другую группу: сбросим и старую.
+    if instance.pk:
+        old_slug = Post.objects.filter(pk=instance.pk).values_list(
+            'group__slug', flat=True
+        ).first()
+        if old_slug:
+            pagecache.bump(f'group:{old_slug}')
+
+
+def spread_post(post):
+    """Раскладывает запись по лентам сразу или задачей очереди."""
+    followers = timeline.author_counter(post.author_id, 'followers_count')
+    if followers <= settings.FEED_INLINE_LIMIT:
+        timeline.fan_out_post(post)
+    elif followers <= settings.FEED_FANOUT_LIMIT:
+        tasks.fan_out_post.delay(post.pk)
+    else:
+        timeline.mark_heavy([post.author_id])
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        spread_post(instance)
+    else:
+        invalidate_cards([instance.pk])
+    pagecache.bump(*pagecache.post_scopes(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    invalidate_cards([instance.pk])
+    pagecache.bump(*pagecache.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    # Самый свежий комментарий мог уйти: Last-Modified не должен отстать.
+    pagecache.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=PostReaction)
+def post_reaction_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_reactions(
+            Post, instance.post_id, 1, f'post:{instance.post_id}'
+        )
+    # Кнопки реакций читателя есть на его страницах лент.
+    pagecache.bump(f'follow:{instance.user_id}')
+
+
+@receiver(post_delete, sender=PostReaction)
+def post_reaction_deleted(sender, instance, **kwargs):
+    counters.bump_reactions(
+        Post, instance.post_id, -1, f'post:{instance.post_id}'
+    )
+    pagecache.bump(f'follow:{instance.user_id}')
+
+
+def comment_scope(reaction):
+    """Область кеша записи комментария без запроса за комментарием.
+
+    reactions.toggle() кладет комментарий в реакцию. Без него (каскадное
+    удаление вместе с комментарием) страницу записи сбросит уже
+    comment_deleted, и запрос на каждую реакцию не нужен.
+    """
+    if CommentReaction.comment.is_cached(reaction):
+        return f'post:{reaction.comment.post_id}'
+    return None
+
+
+@receiver(post_save, sender=CommentReaction)
+def comment_reaction_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_reactions(
+            Comment, instance.comment_id, 1, comment_scope(instance)
+        )
+    pagecache.bump(f'follow:{instance.user_id}')
+
+
+@receiver(post_delete, sender=CommentReaction)
+def comment_reaction_deleted(sender, instance, **kwargs):
+    counters.bump_reactions(
+        Comment, instance.comment_id, -1, comment_scope(instance)
+    )
+    pagecache.bump(f'follow:{instance.user_id}')
+
+
+@receiver(request_finished)
+def flush_counters(sender, **kwargs):
+    # Ответ уже отдан: сброс буфера не задерживает читателя.
+    counters.buffer.flush_if_due()
+
+
+def follow_scopes(follow):
+    """Лента подписок читателя и профили обоих (счетчики, кнопка)."""
+    return [
+        f'follow:{follow.user_id}',
+        f'author:{follow.author.username}',
+        f'author:{follow.user.username}',
+    ]
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+        counters.bump_user(instance.user_id, 'following_count', 1)
+        posts = timeline.author_counter(instance.author_id, 'posts_count')
+        if posts <= settings.FEED_INLINE_LIMIT:
+            timeline.backfill(instance.user_id, instance.author_id)
+        else:
+            tasks.backfill_feed.delay(instance.user_id, instance.author_id)
+        # Автор пропадает из рекомендаций сразу, остальное — в фоне.
+        Suggestion.objects.filter(
+            user_id=instance.user_id, candidate_id=instance.author_id
+        ).delete()
+        tasks.refresh_suggestions.delay(instance.user_id)
+        pagecache.bump(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+    counters.bump_user(instance.user_id, 'following_count', -1)
+    timeline.remove_author(instance.user_id, instance.author_id)
+    tasks.refresh_suggestions.delay(instance.user_id)
+    pagecache.bump(*follow_scopes(instance))
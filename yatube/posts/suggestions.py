@@ -0,0 +1,189 @@
+"""Рекомендации авторов («кого читать») по графу подписок.
+
+Кандидат получает вес из двух частей:
+
+* общие подписки — сколько авторов, на которых подписан читатель,
+  сами подписаны на кандидата (друзья друзей);
+* совместные подписки — читатели, чьи подписки пересекаются с
+  подписками читателя (косинусная мера по множествам авторов), голосуют
+  за своих авторов с весом этой похожести. Учитываются только
+  SUGGESTIONS_NEIGHBOURS самых похожих читателей, а у каждого автора —
+  не больше SUGGESTIONS_FANOUT последних подписчиков: у популярных
+  авторов их слишком много, чтобы перебирать всех.
+
+rebuild() считает рекомендации всем по графу из таблицы Follow,
+прочитанному целиком в множества смежности (команда
+update_suggestions). refresh() пересчитывает одного читателя по его
+окрестности запросами — после подписки или отписки (задача
+refresh_suggestions). В таблице Suggestion хранится SUGGESTIONS_LIMIT
+лучших кандидатов на читателя, поэтому блок на странице — один запрос.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import pagecache
+from .models import Follow, Suggestion, UserCounter
+
+# Столько читателей за раз пересчитывает и пишет rebuild().
+BATCH_SIZE = 500
+
+
+def _top(scores, count):
+    # При равном весе выше кандидат с меньшим id: порядок не скачет.
+    return heapq.nlargest(
+        count, scores.items(), key=lambda item: (item[1], -item[0])
+    )
+
+
+class Graph:
+    """Граф подписок целиком в памяти: для пакетного пересчета."""
+
+    def __init__(self, edges):
+        self._following = defaultdict(set)
+        self._readers = defaultdict(list)
+        # Ребра в порядке id: в конце списка — последние подписчики.
+        for user_id, author_id in edges:
+            self._following[user_id].add(author_id)
+            self._readers[author_id].append(user_id)
+
+    def users(self):
+        return sorted(self._following)
+
+    def following(self, user_id):
+        return self._following.get(user_id, set())
+
+    def many_following(self, user_ids):
+        return {user_id: self.following(user_id) for user_id in user_ids}
+
+    def readers(self, author_id):
+        return self._readers.get(author_id, [])[-settings.SUGGESTIONS_FANOUT:]
+
+    def following_counts(self, user_ids):
+        return {user_id: len(self.following(user_id)) for user_id in user_ids}
+
+
+class LocalGraph:
+    """Окрестность одного читателя, прочитанная запросами по Follow."""
+
+    def following(self, user_id):
+        return set(Follow.objects.filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        ))
+
+    def many_following(self, user_ids):
+        following = {user_id: set() for user_id in user_ids}
+        edges = Follow.objects.filter(
+            user_id__in=list(following)
+        ).values_list('user_id', 'author_id')
+        for user_id, author_id in edges.iterator():
+            following[user_id].add(author_id)
+        return following
+
+    def readers(self, author_id):
+        return list(
+            Follow.objects.filter(author_id=author_id).order_by('-pk')
+            .values_list('user_id', flat=True)[:settings.SUGGESTIONS_FANOUT]
+        )
+
+    def following_counts(self, user_ids):
+        return dict(UserCounter.objects.filter(
+            user_id__in=list(user_ids)
+        ).values_list('user_id', 'following_count'))
+
+
+def suggest(user_id, graph):
+    """Лучшие кандидаты читателя: [(автор, вес, общих подписок)]."""
+    followed = graph.following(user_id)
+    if not followed:
+        return []
+    excluded = followed | {user_id}
+    mutual = Counter()
+    for targets in graph.many_following(followed).values():
+        mutual.update(targets - excluded)
+
+    common = Counter()
+    for author_id in followed:
+        common.update(graph.readers(author_id))
+    common.pop(user_id, None)
+    sizes = graph.following_counts(common)
+    similarity = {
+        reader: shared / math.sqrt(
+            len(followed) * max(sizes.get(reader, 0), shared)
+        )
+        for reader, shared in common.items()
+    }
+    neighbours = dict(_top(similarity, settings.SUGGESTIONS_NEIGHBOURS))
+    cofollow = Counter()
+    for reader, targets in graph.many_following(neighbours).items():
+        for author_id in targets - excluded:
+            cofollow[author_id] += neighbours[reader]
+
+    weights = settings.SUGGESTIONS_WEIGHTS
+    scores = {
+        author_id: (
+            weights['mutual'] * mutual[author_id]
+            + weights['cofollow'] * cofollow[author_id]
+        )
+        for author_id in mutual.keys() | cofollow.keys()
+    }
+    return [
+        (author_id, score, mutual[author_id])
+        for author_id, score in _top(scores, settings.SUGGESTIONS_LIMIT)
+    ]
+
+
+def _rows(user_id, suggested):
+    return [
+        Suggestion(
+            user_id=user_id, candidate_id=author_id, score=score,
+            mutual=mutual,
+        )
+        for author_id, score, mutual in suggested
+    ]
+
+
+@transaction.atomic
+def refresh(user_id):
+    """Пересчитывает рекомендации одного читателя."""
+    rows = _rows(user_id, suggest(user_id, LocalGraph()))
+    Suggestion.objects.filter(user_id=user_id).delete()
+    Suggestion.objects.bulk_create(rows)
+    pagecache.bump(f'follow:{user_id}')
+    return len(rows)
+
+
+def rebuild():
+    """Пересчитывает рекомендации всем; возвращает счетчики."""
+    edges = Follow.objects.order_by('pk').values_list('user_id', 'author_id')
+    graph = Graph(edges.iterator())
+    users = graph.users()
+    total = 0
+    for start in range(0, len(users), BATCH_SIZE):
+        batch = users[start:start + BATCH_SIZE]
+        rows = []
+        for user_id in batch:
+            rows.extend(_rows(user_id, suggest(user_id, graph)))
+        with transaction.atomic():
+            Suggestion.objects.filter(user_id__in=batch).delete()
+            Suggestion.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        pagecache.bump(*(f'follow:{user_id}' for user_id in batch))
+        total += len(rows)
+    # Кто отписался от всех, пока шел пересчет или до него.
+    stale, _ = Suggestion.objects.filter(user__follower__isnull=True).delete()
+    return {'users': len(users), 'suggestions': total, 'removed': stale}
+
+
+def for_reader(user, exclude=None):
+    """Рекомендации для блока на странице — одним запросом."""
+    if not user.is_authenticated:
+        return []
+    suggestions = Suggestion.objects.filter(user=user).select_related(
+        'candidate'
+    )
+    if exclude is not None:
+        suggestions = suggestions.exclude(candidate=exclude)
+    return list(suggestions[:settings.SUGGESTIONS_SHOWN])
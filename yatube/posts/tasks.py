@@ -0,0 +1,51 @@
+"""Фоновые задачи записей.
+
+Нарезка картинок, большие ленты подписок, пересчет рейтинга популярного
+и рекомендаций авторов.
+"""
+from django.conf import settings
+
+from core.queue import task
+
+from . import pagecache, suggestions, thumbnails, timeline, trending
+from .models import Follow, Post
+
+
+# Кодирование идет вне транзакции: на SQLite она держала бы блокировку
+# записи, пока Pillow режет все копии. Строки копий пишет одна короткая
+# транзакция в thumbnails.replace_variants.
+@task(key=lambda post_id: f'post:{post_id}', atomic=False)
+def generate_thumbnails(post_id):
+    thumbnails.process(post_id)
+
+
+@task(priority=5, key=lambda post_id: f'post:{post_id}')
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return
+    timeline.fan_out_post(post)
+    # Кеш и ETag лент подписок зависят от общей области записей.
+    pagecache.bump(pagecache.POSTS)
+
+
+@task(priority=5, key=lambda user_id, author_id: f'{user_id}:{author_id}')
+def backfill_feed(user_id, author_id):
+    # Читатель мог отписаться, пока задача ждала очереди.
+    following = Follow.objects.filter(user_id=user_id, author_id=author_id)
+    if not following.exists():
+        return
+    timeline.backfill(user_id, author_id)
+    pagecache.bump(f'follow:{user_id}')
+
+
+@task(key=lambda: 'trending')
+def update_trending():
+    trending.update()
+    # Следующий проход; по ключу в очереди всегда не больше одного.
+    update_trending.apply_async(countdown=settings.TRENDING_INTERVAL)
+
+
+@task(key=lambda user_id: f'user:{user_id}')
+def refresh_suggestions(user_id):
+    suggestions.refresh(user_id)
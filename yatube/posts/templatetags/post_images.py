@@ -0,0 +1,59 @@
+from django import template
+from django.conf import settings
+
+register = template.Library()
+
+# Ширина копии для <img> по умолчанию: ширина карточки в ленте.
+DEFAULT_WIDTH = 960
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post):
+    """<picture> со srcset по нарезанным копиям картинки записи.
+
+    Копии читаются из post.variants, поэтому в лентах их стоит
+    подгружать через prefetch_related('variants') (у PostRow это уже
+    список). Пока копий нет, выводится заглушка, а не нарезка на лету.
+    """
+    if not post.image:
+        return {'has_image': False}
+    variants = post.variants
+    if hasattr(variants, 'all'):
+        variants = variants.all()
+    by_format = {}
+    for variant in variants:
+        by_format.setdefault(variant.format, []).append(variant)
+    if not by_format:
+        return {'has_image': True, 'fallback': None}
+    # Браузер берет первый подходящий <source>, поэтому порядок — как в
+    # POST_IMAGE_FORMATS; последний нарезанный формат уходит в <img>.
+    formats = [
+        fmt for fmt in settings.POST_IMAGE_FORMATS if fmt in by_format
+    ] or list(by_format)
+    fallback_format = formats[-1]
+    fallback_variants = sorted(
+        by_format[fallback_format], key=lambda variant: variant.width
+    )
+    fallback = fallback_variants[0]
+    for variant in fallback_variants:
+        if variant.width <= DEFAULT_WIDTH:
+            fallback = variant
+    return {
+        'has_image': True,
+        'fallback': fallback,
+        'srcset': _srcset(fallback_variants),
+        'sources': [
+            {
+                'type': by_format[fmt][0].mime_type,
+                'srcset': _srcset(by_format[fmt]),
+            }
+            for fmt in formats[:-1]
+        ],
+    }
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{variant.url} {variant.width}w'
+        for variant in sorted(variants, key=lambda variant: variant.width)
+    )
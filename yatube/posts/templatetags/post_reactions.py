@@ -0,0 +1,37 @@
+from django import template
+from django.urls import reverse
+
+from posts.models import Comment, Reaction
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/reactions.html', takes_context=True)
+def reaction_buttons(context, target, count=None, next_url=None):
+    """Кнопки реакций на запись или комментарий.
+
+    Реакцию читателя берет из target.reaction, которую для всей
+    страницы одним запросом кладет reactions.attach. В формах есть
+    CSRF-токен, поэтому в кешируемых лентах их нет: там reaction_state.
+    """
+    request = context['request']
+    if isinstance(target, Comment):
+        url = reverse('posts:comment_react', args=[target.pk])
+    else:
+        url = reverse('posts:post_react', args=[target.pk])
+    return {
+        'url': url,
+        'kinds': Reaction.KINDS,
+        'current': getattr(target, 'reaction', None),
+        'count': count,
+        'next': next_url or request.get_full_path(),
+        'user': request.user,
+        'csrf_token': context.get('csrf_token'),
+    }
+
+
+@register.inclusion_tag('posts/includes/reaction_state.html')
+def reaction_state(target):
+    """Реакция читателя на запись в ленте, без формы и счетчика."""
+    current = getattr(target, 'reaction', None)
+    return {'label': dict(Reaction.KINDS).get(current)}
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import bulk
+from posts.models import Comment, FeedItem, Follow, Group, Post, UserCounter
+from posts.search import matching
+
+User = get_user_model()
+OLD_DATE = datetime(2015, 3, 1, 12, 30, tzinfo=timezone.utc)
+
+
+class BulkImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test group', slug='test_slug', description='описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Старая запись'
+        )
+        Post.objects.filter(pk=cls.post.pk).update(pub_date=OLD_DATE)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def export(self, name):
+        path = os.path.join(self.workdir, name)
+        call_command('export_posts', path, stderr=StringIO())
+        return path
+
+    def wipe(self):
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.exclude(username='author').delete()
+        Group.objects.all().delete()
+
+    def load(self, path):
+        call_command('import_posts', path, stdout=StringIO())
+
+    def assert_restored(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, OLD_DATE)
+        self.assertEqual(post.group.slug, 'test_slug')
+        self.assertEqual(post.comments_count, 1)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertEqual(
+            Comment.objects.get(post=post).author, reader
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertTrue(
+            FeedItem.objects.filter(user=reader, post=post).exists()
+        )
+        self.assertIn(
+            post,
+            matching(Post.objects.all(), 'Старая'),
+        )
+
+    def test_jsonl_round_trip(self):
+        """Выгрузка и загрузка JSONL восстанавливают данные и даты"""
+        path = self.export('dump.jsonl')
+        with open(path, encoding='utf-8') as dump:
+            types = [json.loads(line)['type'] for line in dump]
+        self.assertEqual(types, ['post', 'comment', 'follow'])
+        self.wipe()
+        self.load(path)
+        self.assert_restored()
+
+    def test_csv_round_trip(self):
+        """CSV загружается так же, как JSONL"""
+        path = self.export('dump.csv')
+        self.wipe()
+        self.load(path)
+        self.assert_restored()
+
+    def test_import_is_idempotent(self):
+        """Повторная загрузка того же файла не дублирует строки"""
+        path = self.export('dump.jsonl')
+        self.load(path)
+        self.load(path)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_replies_keep_threads(self):
+        """Ответы загружаются с родителем и путем в ветке"""
+        root = Comment.objects.get(post=self.post)
+        reply = Comment.objects.create(
+            post=self.post, author=self.author, parent=root, text='Ответ'
+        )
+        path = self.export('dump.csv')
+        self.wipe()
+        self.load(path)
+        restored = Comment.objects.get(pk=reply.pk)
+        self.assertEqual(restored.parent_id, root.pk)
+        self.assertEqual(restored.path, reply.path)
+        self.assertEqual(
+            list(Comment.objects.subtree(root.path)),
+            [Comment.objects.get(pk=root.pk), restored],
+        )
+
+    def test_comment_to_missing_post_is_skipped(self):
+        """Комментарий к несуществующей записи пропускается"""
+        path = os.path.join(self.workdir, 'broken.jsonl')
+        with open(path, 'w', encoding='utf-8') as dump:
+            dump.write(json.dumps({
+                'type': 'comment', 'post': 999, 'author': 'reader',
+                'text': 'В пустоту',
+            }) + '\n')
+        out = StringIO()
+        call_command('import_posts', path, stdout=out)
+        self.assertFalse(Comment.objects.filter(text='В пустоту').exists())
+        self.assertIn('пропущено: 1', out.getvalue())
+
+    def test_taken_id_is_rejected_with_comments(self):
+        """Запись с чужим id отклоняется, её комментарии не прилипают"""
+        path = self.export('dump.jsonl')
+        self.wipe()
+        self.load(path)
+        post = Post.objects.get(pk=self.post.pk)
+        Post.objects.filter(pk=post.pk).update(pub_date=datetime(
+            2020, 1, 1, tzinfo=timezone.utc
+        ))
+        Comment.objects.all().delete()
+        out = StringIO()
+        call_command('import_posts', path, stdout=out)
+        self.assertFalse(Comment.objects.exists())
+        self.assertIn('post: 0, comment: 0, follow: 0', out.getvalue())
+        self.assertIn('отклонено (id занят): 1', out.getvalue())
+
+    def test_counts_only_inserted_rows(self):
+        """Повторная загрузка не считает уже загруженные строки"""
+        path = self.export('dump.jsonl')
+        with open(path, encoding='utf-8') as dump:
+            progress = bulk.Importer().load(bulk.read_jsonl(dump))
+        self.assertEqual(progress.total, 0)
+        self.assertEqual(sum(progress.skipped.values()), 3)
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class SyndicationFeedsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test_slug',
+            description='test description',
+        )
+        for number in range(3):
+            Post.objects.create(
+                author=cls.author, text=f'Запись номер {number}',
+                group=cls.group,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.feeds = {
+            reverse('posts:index_rss'): 'application/rss+xml',
+            reverse('posts:index_atom'): 'application/atom+xml',
+            reverse('posts:group_rss', args=[self.group.slug]):
+                'application/rss+xml',
+            reverse('posts:group_atom', args=[self.group.slug]):
+                'application/atom+xml',
+            reverse('posts:profile_rss', args=[self.author.username]):
+                'application/rss+xml',
+            reverse('posts:profile_atom', args=[self.author.username]):
+                'application/atom+xml',
+        }
+
+    def test_feeds_render(self):
+        """Ленты RSS и Atom отдают записи с автором и группой"""
+        for url, content_type in self.feeds.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(
+                    response['Content-Type'].startswith(content_type)
+                )
+                self.assertContains(response, 'Запись номер 2')
+                self.assertContains(response, 'Лев Толстой')
+                self.assertContains(response, 'test group')
+
+    @override_settings(SYNDICATION_ITEMS=2)
+    def test_window_is_bounded(self):
+        """В ленту попадают только последние записи"""
+        response = self.client.get(reverse('posts:index_rss'))
+        self.assertEqual(response.content.count(b'<item>'), 2)
+        self.assertNotContains(response, 'Запись номер 0')
+
+    def test_missing_group_and_author(self):
+        """Лента несуществующей группы или автора — 404"""
+        for name, arg in (('posts:group_rss', 'missing'),
+                          ('posts:profile_atom', 'missing')):
+            response = self.client.get(reverse(name, args=[arg]))
+            self.assertEqual(response.status_code, 404)
+
+    def test_polling_is_cached_and_conditional(self):
+        """Повторный опрос берется из кеша или получает 304"""
+        for url in self.feeds:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(1):
+                    self.client.get(url)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_new_post_invalidates_feeds(self):
+        """Новая запись сразу появляется во всех лентах"""
+        etags = {url: self.client.get(url)['ETag'] for url in self.feeds}
+        Post.objects.create(
+            author=self.author, text='Свежая запись', group=self.group
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Свежая запись')
+
+    def test_pages_link_feeds(self):
+        """Страницы лент ссылаются на свои RSS и Atom"""
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        self.assertContains(
+            response, reverse('posts:group_atom', args=[self.group.slug])
+        )
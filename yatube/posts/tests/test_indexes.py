@@ -0,0 +1,142 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import CursorPaginator
+from posts.timeline import FollowFeed
+from posts.views import COMMENT_FIELDS
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedQueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test_slug',
+            description='test description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, table):
+        plan = self.explain(queryset)
+        self.assertFalse(
+            [step for step in plan if 'TEMP B-TREE' in step],
+            f'Сортировка без индекса: {plan}'
+        )
+        self.assertTrue(
+            [step for step in plan if table in step and 'INDEX' in step],
+            f'{table} читается без индекса: {plan}'
+        )
+
+    def cursor_querysets(self, name, queryset):
+        paginator = CursorPaginator(queryset, 10)
+        return {
+            f'{name}_{direction}': paginator.filter_queryset(
+                (direction, self.post.pub_date, self.post.pk)
+            )
+            for direction in (CursorPaginator.NEXT, CursorPaginator.PREVIOUS)
+        }
+
+    def feed_querysets(self):
+        querysets = {
+            'index': Post.objects.select_related('group', 'author'),
+            'group_posts': self.group.posts.select_related('author'),
+            'profile': Post.objects.filter(
+                author=self.user).select_related('group', 'author'),
+            'comments': self.post.comments.all(),
+        }
+        for name in ('index', 'group_posts', 'profile'):
+            querysets.update(self.cursor_querysets(name, querysets[name]))
+        return querysets
+
+    def test_feed_queries_use_indexes(self):
+        """Ленты читаются по индексу без сортировки во временном B-tree"""
+        for name, queryset in self.feed_querysets().items():
+            with self.subTest(query=name):
+                self.assertUsesIndex(
+                    queryset[:10], queryset.model._meta.db_table
+                )
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_follow_feed_uses_indexes(self):
+        """Оба источника ленты подписок идут по индексу без JOIN"""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        feed = FollowFeed(reader)
+        self.assertEqual(len(feed.sources()), 2)
+        for position in (
+            None,
+            (CursorPaginator.NEXT, self.post.pub_date, self.post.pk),
+            (CursorPaginator.PREVIOUS, self.post.pub_date, self.post.pk),
+        ):
+            page = feed.after(position) if position else feed
+            for queryset, key in page.sources():
+                bounded = page._bounded(queryset, key)[:10]
+                table = queryset.model._meta.db_table
+                with self.subTest(table=table, position=position):
+                    self.assertUsesIndex(bounded, table)
+                    if table == 'posts_feeditem':
+                        self.assertNotIn('posts_post', str(bounded.query))
+
+    def test_follow_lookup_uses_index(self):
+        """Проверка подписки на автора идет по индексу"""
+        queryset = Follow.objects.filter(author=self.user, user=self.user)
+        self.assertUsesIndex(queryset, 'posts_follow')
+
+    def test_comment_count_uses_index(self):
+        """Комментарии поста выбираются по составному индексу"""
+        queryset = Comment.objects.filter(post=self.post)
+        self.assertUsesIndex(queryset, 'posts_comment')
+
+    def test_comment_threads_use_indexes(self):
+        """Корни веток по курсору и поддерево по пути идут по индексам"""
+        root = Comment.objects.create(
+            post=self.post, author=self.user, text='Корень'
+        )
+        # Те же запросы, что строит views.comments_page.
+        comments = Comment.objects.filter(post_id=self.post.pk).select_related(
+            'author'
+        ).only(*COMMENT_FIELDS)
+        paginator = CursorPaginator(comments.filter(parent=None), 10)
+        querysets = {
+            'roots': (
+                paginator.filter_queryset(None), 'comment_post_date_idx'
+            ),
+            'subtree': (
+                comments.subtree(root.path).filter(parent__isnull=False),
+                'comment_post_path_idx',
+            ),
+        }
+        for direction in (CursorPaginator.NEXT, CursorPaginator.PREVIOUS):
+            querysets[f'roots_{direction}'] = (
+                paginator.filter_queryset(
+                    (direction, root.pub_date, root.pk)
+                ),
+                'comment_post_date_idx',
+            )
+        for name, (queryset, index) in querysets.items():
+            with self.subTest(query=name):
+                self.assertUsesIndex(queryset[:10], 'posts_comment')
+                plan = self.explain(queryset[:10])
+                self.assertTrue(
+                    [step for step in plan if index in step],
+                    f'Запрос идет не по {index}: {plan}'
+                )
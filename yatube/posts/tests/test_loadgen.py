@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post, UserCounter
+
+User = get_user_model()
+
+
+class SyntheticLoadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_graph', users=60, groups=3, posts=200, comments=300,
+            follows=8, seed=7, stdout=StringIO(),
+        )
+
+    def test_graph_is_seeded(self):
+        """seed_graph создает граф заданного размера"""
+        self.assertEqual(User.objects.filter(
+            username__startswith='load').count(), 60)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+
+    def test_followers_follow_power_law(self):
+        """Самый популярный автор собирает заметную долю подписок"""
+        counts = sorted(
+            UserCounter.objects.values_list('followers_count', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(counts[0], 5 * max(counts[len(counts) // 2], 1))
+        self.assertEqual(
+            UserCounter.objects.get(user__username='load0').followers_count,
+            counts[0],
+        )
+
+    def test_loadtest_reports_routes(self):
+        """loadtest проходит смесь адресов без ошибок и пишет отчет"""
+        fd, path = tempfile.mkstemp(suffix='.json', dir=settings.BASE_DIR)
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        call_command(
+            'loadtest', requests=40, concurrency=1, seed=3, json=path,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        with open(path, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report['requests'], 40)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(set(report['routes']), {
+            'index', 'profile', 'group_posts', 'post_detail',
+            'follow_index', 'post_create', 'add_comment',
+        })
+        self.assertIsNotNone(report['p95_ms'])
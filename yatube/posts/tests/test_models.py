@@ -1,6 +1,12 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
-from ..models import Group, Post
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ..models import Comment, Follow, Group, Post, UserCounter
 
 User = get_user_model()
 
@@ -35,3 +41,50 @@ class PostModelTest(TestCase):
         expected_object_name_post = post.text[:15]
         self.assertEqual(expected_object_name_post, str(post))
         self.assertEqual(expected_object_name_group, str(group))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def test_counters_follow_changes(self):
+        """Счетчики меняются вместе с записями, комментариями, подписками"""
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.post.refresh_from_db()
+        author = UserCounter.objects.get(user=self.author)
+        reader = UserCounter.objects.get(user=self.reader)
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(reader.following_count, 1)
+        follow.delete()
+        self.post.comments.all().delete()
+        self.post.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(author.followers_count, 0)
+
+    def test_recount_fixes_drift(self):
+        """Команда recount исправляет разошедшиеся счетчики"""
+        UserCounter.objects.filter(user=self.author).update(posts_count=42)
+        UserCounter.objects.filter(user=self.reader).delete()
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(
+            UserCounter.objects.get(user=self.author).posts_count, 1
+        )
+        self.assertTrue(UserCounter.objects.filter(user=self.reader).exists())
+
+    def test_post_detail_skips_count_queries(self):
+        """Страница поста не считает записи автора запросом COUNT"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            )
+        self.assertFalse(
+            [q for q in queries.captured_queries if 'COUNT(' in q['sql']]
+        )
@@ -0,0 +1,168 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import counters, reactions
+from posts.models import Comment, CommentReaction, Post, PostReaction
+
+User = get_user_model()
+
+
+@override_settings(REACTION_BUFFER_SIZE=1000, REACTION_FLUSH_INTERVAL=3600)
+class ReactionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other = Post.objects.create(author=cls.author, text='Другой')
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Сброс до отката транзакции теста: сдвиги не переживут тест.
+        self.addCleanup(counters.buffer.flush)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def count(self, target):
+        target.refresh_from_db(fields=['reactions_count'])
+        return target.reactions_count
+
+    def test_toggle_sets_changes_and_removes(self):
+        """Та же реакция снимается, другая меняет вид без сдвига счетчика"""
+        self.assertEqual(reactions.toggle(self.post, self.reader, 'like'),
+                         'like')
+        self.assertEqual(reactions.toggle(self.post, self.reader, 'sad'),
+                         'sad')
+        counters.buffer.flush()
+        self.assertEqual(self.count(self.post), 1)
+        self.assertEqual(
+            PostReaction.objects.get(post=self.post).kind, 'sad'
+        )
+        self.assertIsNone(reactions.toggle(self.post, self.reader, 'sad'))
+        counters.buffer.flush()
+        self.assertEqual(self.count(self.post), 0)
+
+    def test_counters_are_written_in_one_batch(self):
+        """Сдвиги копятся в буфере и пишутся одним UPDATE на группу"""
+        for number in range(5):
+            user = User.objects.create_user(username=f'fan{number}')
+            reactions.toggle(self.post, user, 'like')
+            reactions.toggle(self.other, user, 'like')
+        self.assertEqual(self.count(self.post), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counters.buffer.flush(), 2)
+        updates = [
+            query for query in queries
+            if query['sql'].startswith('UPDATE')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.count(self.post), 5)
+        self.assertEqual(self.count(self.other), 5)
+
+    @override_settings(REACTION_BUFFER_SIZE=2)
+    def test_full_buffer_is_flushed(self):
+        """Буфер сбрасывается сам, когда набралось REACTION_BUFFER_SIZE"""
+        reactions.toggle(self.post, self.reader, 'like')
+        self.assertEqual(len(counters.buffer), 1)
+        reactions.toggle(self.comment, self.reader, 'like')
+        self.assertEqual(len(counters.buffer), 0)
+        self.assertEqual(self.count(self.post), 1)
+        self.assertEqual(self.count(self.comment), 1)
+
+    def test_comment_reaction_does_not_load_comment(self):
+        """Сигналы реакции на комментарий не читают комментарий заново"""
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as queries:
+                reactions.toggle(self.comment, self.reader, 'like')
+            self.assertFalse([
+                query for query in queries
+                if 'FROM "posts_comment"' in query['sql']
+            ])
+
+    def test_failed_flush_keeps_deltas(self):
+        """Сдвиги, которые не удалось записать, ждут следующего сброса"""
+        reactions.toggle(self.post, self.reader, 'like')
+        with mock.patch('posts.counters._bump', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                counters.buffer.flush()
+        self.assertEqual(len(counters.buffer), 1)
+        counters.buffer.flush()
+        self.assertEqual(self.count(self.post), 1)
+
+    def test_reconcile_restores_lost_deltas(self):
+        """reconcile() пересчитывает счетчики по таблицам реакций"""
+        PostReaction.objects.bulk_create(
+            [PostReaction(post=self.post, user=self.author)]
+        )
+        CommentReaction.objects.bulk_create(
+            [CommentReaction(comment=self.comment, user=self.author)]
+        )
+        counters.reconcile()
+        self.assertEqual(self.count(self.post), 1)
+        self.assertEqual(self.count(self.comment), 1)
+
+    def test_react_views(self):
+        """Кнопки ставят реакцию и возвращают на страницу из next"""
+        index = reverse('posts:index')
+        response = self.client.post(
+            reverse('posts:post_react', args=[self.post.pk]),
+            {'kind': 'like', 'next': index},
+        )
+        self.assertRedirects(response, index)
+        response = self.client.post(
+            reverse('posts:comment_react', args=[self.comment.pk]),
+            {'kind': 'wow', 'next': 'https://example.com/'},
+        )
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertTrue(PostReaction.objects.filter(
+            post=self.post, user=self.reader, kind='like').exists())
+        self.assertTrue(CommentReaction.objects.filter(
+            comment=self.comment, user=self.reader, kind='wow').exists())
+
+    def test_anonymous_cannot_react(self):
+        """Аноним уходит на страницу входа"""
+        url = reverse('posts:post_react', args=[self.post.pk])
+        response = Client().post(url, {'kind': 'like'})
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={url}'
+        )
+        self.assertFalse(PostReaction.objects.exists())
+
+    def test_feed_resolves_reactions_in_one_query(self):
+        """Лента узнает реакции читателя на всю страницу одним запросом"""
+        for post in (self.post, self.other):
+            reactions.toggle(post, self.reader, 'like')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        lookups = [
+            query for query in queries
+            if 'posts_postreaction' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(
+            [post.reaction for post in response.context['page_obj']],
+            ['like', 'like'],
+        )
+        self.assertContains(response, 'Ваша реакция', count=2)
+
+    def test_flush_changes_post_etag(self):
+        """Сброс счетчиков меняет ETag страницы записи"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = Client().get(url)['ETag']
+        reactions.toggle(self.post, self.reader, 'like')
+        self.assertEqual(Client().get(url)['ETag'], etag)
+        counters.buffer.flush()
+        response = Client().get(url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Реакций: 1')
@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.search import SearchPaginator, build_query
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.in_text = Post.objects.create(
+            author=cls.user, text='Сегодня варили малиновое варенье'
+        )
+        cls.in_comment = Post.objects.create(
+            author=cls.user, text='Про дачу'
+        )
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.user, text='А варенье было?'
+        )
+        Post.objects.create(author=cls.user, text='Совсем о другом')
+
+    def search(self, text, per_page=10, cursor=None):
+        return SearchPaginator(text, per_page).get_page(cursor)
+
+    def test_build_query_quotes_terms(self):
+        """Синтаксис FTS5 из ввода не исполняется, * оставляет префикс"""
+        self.assertEqual(build_query('OR "мал* -x'), '"OR" "мал"* "x"')
+        self.assertEqual(build_query('!!!'), '')
+        self.assertEqual(build_query('мир', 'text'), 'text : ("мир")')
+
+    def test_text_match_ranks_above_comment(self):
+        """Совпадение в тексте записи выше, чем в комментарии"""
+        page = self.search('варенье')
+        self.assertEqual(list(page), [self.in_text, self.in_comment])
+
+    def test_prefix_query(self):
+        """«слово*» ищет по началу слова"""
+        self.assertEqual(list(self.search('малин*')), [self.in_text])
+        self.assertEqual(list(self.search('малин')), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Триггеры обновляют индекс при правке и удалении"""
+        post = Post.objects.get(pk=self.in_text.pk)
+        post.text = 'Сегодня варили джем'
+        post.save()
+        self.assertEqual(list(self.search('варенье')), [self.in_comment])
+        Comment.objects.filter(post=self.in_comment).delete()
+        self.assertEqual(list(self.search('варенье')), [])
+        post.delete()
+        self.assertEqual(list(self.search('джем')), [])
+
+    def test_comments_are_indexed_one_row_each(self):
+        """У каждого комментария своя строка индекса, правка трогает ее"""
+        comments = [
+            Comment.objects.create(
+                post=self.in_text, author=self.user, text=f'Ответ {number}'
+            )
+            for number in range(3)
+        ]
+        comments[1].text = 'Ответ про крыжовник'
+        comments[1].save()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid, post_id FROM posts_comment_search '
+                'WHERE posts_comment_search MATCH %s', ['"крыжовник"']
+            )
+            self.assertEqual(
+                cursor.fetchall(), [(comments[1].pk, self.in_text.pk)]
+            )
+            cursor.execute('SELECT count(*) FROM posts_comment_search')
+            self.assertEqual(cursor.fetchone()[0], Comment.objects.count())
+        self.assertEqual(list(self.search('крыжовник')), [self.in_text])
+
+    def test_comment_snippet_for_comment_match(self):
+        """Запись, найденная по комментарию, показывает его фрагмент"""
+        post = self.search('было')[0]
+        self.assertEqual(post, self.in_comment)
+        self.assertIn('<mark>было</mark>', post.snippet)
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        """В сниппете экранирован текст и выделено совпадение"""
+        Post.objects.create(author=self.user, text='<b>клубника</b> и сливки')
+        post = self.search('клубника')[0]
+        self.assertIn('<mark>клубника</mark>', post.snippet)
+        self.assertIn('&lt;b&gt;', post.snippet)
+
+    def test_cursor_pages(self):
+        """Курсор листает результаты вперед и назад без повторов"""
+        for number in range(5):
+            Post.objects.create(author=self.user, text=f'варенье {number}')
+        first = self.search('варенье', per_page=3)
+        second = self.search('варенье', 3, first.next_cursor)
+        third = self.search('варенье', 3, second.next_cursor)
+        found = list(first) + list(second) + list(third)
+        self.assertEqual(len(found), 7)
+        self.assertEqual(len(set(found)), 7)
+        self.assertFalse(third.has_next())
+        back = self.search('варенье', 3, second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_search_page(self):
+        """Страница поиска показывает выделенные совпадения"""
+        response = Client().get(reverse('posts:search'), {'q': 'варенье'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<mark>варенье</mark>')
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке ищет по индексу текста записей, все совпадения"""
+        more = [
+            Post.objects.create(author=self.user, text=f'Варенье {number}')
+            for number in range(3)
+        ]
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'варен*'}
+        )
+        cl = response.context['cl']
+        self.assertEqual(cl.result_count, 4)
+        self.assertEqual(
+            set(cl.result_list), {self.in_text, *more}
+        )
@@ -0,0 +1,143 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.queue import run_pending
+from posts import suggestions
+from posts.models import Follow, Suggestion
+
+User = get_user_model()
+
+
+class SuggestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = ['reader', 'anna', 'boris', 'clara', 'denis', 'eva', 'fan']
+        for name in names:
+            setattr(cls, name, User.objects.create_user(username=name))
+        # reader читает Анну и Бориса; оба читают Клару, Анна — Дениса.
+        # fan читает тех же Анну и Бориса, а еще Еву.
+        for user, author in [
+            (cls.reader, cls.anna), (cls.reader, cls.boris),
+            (cls.anna, cls.clara), (cls.boris, cls.clara),
+            (cls.anna, cls.denis),
+            (cls.fan, cls.anna), (cls.fan, cls.boris), (cls.fan, cls.eva),
+        ]:
+            Follow.objects.create(user=user, author=author)
+        # Пересчеты после подписок фикстуры не должны висеть в очереди.
+        run_pending()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def suggested(self, user):
+        return list(Suggestion.objects.filter(user=user).values_list(
+            'candidate__username', 'mutual'
+        ))
+
+    def test_mutual_and_similar_readers(self):
+        """Общие подписки и подписки похожих читателей дают кандидатов"""
+        suggestions.rebuild()
+        self.assertEqual(
+            self.suggested(self.reader),
+            [('clara', 2), ('eva', 0), ('denis', 1)],
+        )
+
+    def test_refresh_matches_rebuild(self):
+        """Пересчет одного читателя совпадает с пакетным"""
+        suggestions.rebuild()
+        batch = {
+            user.pk: list(Suggestion.objects.filter(user=user).values_list(
+                'candidate', 'score', 'mutual'
+            ))
+            for user in User.objects.all()
+        }
+        Suggestion.objects.all().delete()
+        for user in User.objects.all():
+            suggestions.refresh(user.pk)
+            rows = list(Suggestion.objects.filter(user=user).values_list(
+                'candidate', 'score', 'mutual'
+            ))
+            self.assertEqual(len(rows), len(batch[user.pk]))
+            for row, expected in zip(rows, batch[user.pk]):
+                self.assertEqual(row[0], expected[0])
+                self.assertAlmostEqual(row[1], expected[1])
+                self.assertEqual(row[2], expected[2])
+
+    def test_follow_and_unfollow_refresh_reader(self):
+        """Подписка убирает автора сразу, пересчет идет задачей"""
+        suggestions.rebuild()
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.clara.username])
+        )
+        self.assertNotIn('clara', dict(self.suggested(self.reader)))
+        run_pending()
+        # Анна теперь тоже похожий читатель: она читает Клару и Дениса.
+        self.assertEqual(
+            [name for name, _ in self.suggested(self.reader)],
+            ['denis', 'eva'],
+        )
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.clara.username])
+        )
+        run_pending()
+        self.assertEqual(self.suggested(self.reader)[0], ('clara', 2))
+
+    def test_rebuild_drops_readers_without_follows(self):
+        """Кто ни на кого не подписан, остается без рекомендаций"""
+        suggestions.rebuild()
+        Follow.objects.filter(user=self.fan).delete()
+        run_pending()
+        Suggestion.objects.create(
+            user=self.fan, candidate=self.clara, score=1
+        )
+        stats = suggestions.rebuild()
+        self.assertEqual(stats['removed'], 1)
+        self.assertFalse(Suggestion.objects.filter(user=self.fan).exists())
+
+    def test_block_on_feeds_is_one_query(self):
+        """Блок рекомендаций на страницах читается одним запросом"""
+        suggestions.rebuild()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:follow_index'))
+        lookups = [
+            query for query in queries
+            if 'posts_suggestion' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertContains(response, 'Кого почитать')
+        self.assertContains(response, 'общих подписок: 2')
+        response = self.client.get(
+            reverse('posts:profile', args=[self.clara.username])
+        )
+        self.assertNotIn(
+            self.clara,
+            [item.candidate for item in response.context['suggestions']],
+        )
+        response = Client().get(
+            reverse('posts:profile', args=[self.clara.username])
+        )
+        self.assertNotContains(response, 'Кого почитать')
+
+    def test_refresh_resets_cached_pages(self):
+        """Пересчет сбрасывает кеш страниц читателя"""
+        Suggestion.objects.all().delete()
+        url = reverse('posts:follow_index')
+        self.assertNotContains(self.client.get(url), 'Кого почитать')
+        suggestions.refresh(self.reader.pk)
+        self.assertContains(self.client.get(url), 'Кого почитать')
+
+    def test_command(self):
+        """Команда пересчитывает рекомендации всем"""
+        out = StringIO()
+        call_command('update_suggestions', stdout=out)
+        self.assertIn('Читателей: 4', out.getvalue())
+        self.assertTrue(Suggestion.objects.filter(user=self.fan).exists())
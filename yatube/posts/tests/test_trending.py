@@ -0,0 +1,147 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Task
+from core.queue import run_pending
+from posts import counters, trending
+from posts.models import (
+    Comment, Follow, Post, PostReaction, PostScore, TrendingMark,
+)
+from posts.tasks import update_trending
+
+User = get_user_model()
+
+
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.now = timezone.now()
+
+    def setUp(self):
+        cache.clear()
+        # Сдвиги счетчиков реакций не должны пережить тест.
+        self.addCleanup(counters.buffer.flush)
+
+    def post(self, text, hours_ago=0):
+        post = Post.objects.create(author=self.author, text=text)
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=self.now - timedelta(hours=hours_ago)
+        )
+        return post
+
+    def comment(self, post, count=1):
+        for number in range(count):
+            Comment.objects.create(
+                post=post, author=self.reader, text=f'Комментарий {number}'
+            )
+
+    def ranking(self):
+        return list(PostScore.objects.values_list('post__text', flat=True))
+
+    def test_engagement_outweighs_recency(self):
+        """Обсуждаемая запись выше свежей, свежая — выше такой же старой"""
+        self.post('Старая', hours_ago=30)
+        discussed = self.post('Обсуждаемая', hours_ago=3)
+        self.post('Свежая')
+        self.comment(discussed, 3)
+        PostReaction.objects.create(post=discussed, user=self.reader)
+        trending.update(self.now)
+        self.assertEqual(self.ranking(), ['Обсуждаемая', 'Свежая', 'Старая'])
+
+    def test_update_is_incremental(self):
+        """Проход учитывает только новые события и равен полному пересчету"""
+        first = self.post('Первая', hours_ago=2)
+        second = self.post('Вторая', hours_ago=1)
+        self.comment(first)
+        stats = trending.update(self.now)
+        self.assertEqual(stats, {'events': 3, 'posts': 2, 'pruned': 0})
+        self.assertEqual(trending.update(self.now)['events'], 0)
+        self.comment(second, 2)
+        stats = trending.update(self.now)
+        self.assertEqual(stats['posts'], 1)
+        incremental = dict(PostScore.objects.values_list('post', 'score'))
+
+        PostScore.objects.all().delete()
+        TrendingMark.objects.all().delete()
+        trending.update(self.now)
+        full = dict(PostScore.objects.values_list('post', 'score'))
+        self.assertEqual(incremental.keys(), full.keys())
+        for post_id, score in full.items():
+            self.assertAlmostEqual(incremental[post_id], score)
+
+    def test_follow_boosts_newest_post(self):
+        """Новый подписчик поднимает самую свежую запись автора"""
+        self.post('Раньше', hours_ago=2)
+        newest = self.post('Позже', hours_ago=1)
+        trending.update(self.now)
+        before = PostScore.objects.get(post=newest).score
+        Follow.objects.create(user=self.reader, author=self.author)
+        trending.update(self.now)
+        self.assertGreater(PostScore.objects.get(post=newest).score, before)
+
+    def test_old_posts_leave_ranking(self):
+        """Записи старше окна в рейтинг не попадают и из него удаляются"""
+        old = self.post('Давняя', hours_ago=24 * 8)
+        self.comment(old)
+        fresh = self.post('Недавняя', hours_ago=24 * 6)
+        trending.update(self.now)
+        self.assertEqual(self.ranking(), ['Недавняя'])
+        stats = trending.update(self.now + timedelta(days=2))
+        self.assertEqual(stats['pruned'], 1)
+        self.assertFalse(PostScore.objects.filter(post=fresh).exists())
+
+    def test_popular_page_pages_by_cursor(self):
+        """Страница популярного идет по рейтингу и листается курсором"""
+        for number in range(12):
+            self.post(f'Запись {number}', hours_ago=12 - number)
+        trending.update(self.now)
+        url = reverse('posts:popular')
+        response = Client().get(url)
+        page = response.context['page_obj']
+        texts = [post.text for post in page]
+        self.assertEqual(texts[0], 'Запись 11')
+        response = Client().get(url, {'cursor': page.next_cursor})
+        texts += [post.text for post in response.context['page_obj']]
+        self.assertEqual(
+            texts, [f'Запись {number}' for number in range(11, -1, -1)]
+        )
+
+    def test_popular_page_is_cached_until_update(self):
+        """Порядок на странице меняется только после пересчета"""
+        self.post('Первая')
+        second = self.post('Вторая', hours_ago=1)
+        trending.update(self.now)
+        url = reverse('posts:popular')
+
+        def order():
+            # Из кеша страница приходит без контекста: смотрим на разметку.
+            content = Client().get(url).content.decode()
+            return sorted(
+                ['Первая', 'Вторая'], key=lambda text: content.index(text)
+            )
+
+        self.assertEqual(order(), ['Первая', 'Вторая'])
+        self.comment(second, 3)
+        self.assertEqual(order(), ['Первая', 'Вторая'])
+        trending.update(self.now)
+        self.assertEqual(order(), ['Вторая', 'Первая'])
+
+    def test_task_reschedules_itself(self):
+        """Задача пересчета ставит в очередь следующий проход"""
+        self.post('Запись')
+        call_command('update_trending', schedule=True, stdout=StringIO())
+        run_pending()
+        self.assertTrue(PostScore.objects.exists())
+        following = Task.objects.get(
+            name=update_trending.name, status=Task.PENDING
+        )
+        self.assertGreater(following.run_after, timezone.now())
@@ -1,15 +1,31 @@
 import shutil
 import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 from django.test import Client, TestCase, override_settings
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django import forms
+from PIL import Image
 
-from posts.models import Post, Group, Comment, Follow
+from core.models import Task
+from core.queue import run_pending
+from posts import thumbnails
+from posts.cards import card_key, load_variants
+from posts.models import (
+    Post, Group, Comment, Follow, FeedItem, ImageVariant, path_segment
+)
+from posts.rows import PostRow
+from posts.tasks import fan_out_post, generate_thumbnails
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -137,6 +153,70 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context['page_obj']), 5)
 
 
+@override_settings(POSTS_PAGINATION='cursor')
+class CursorPaginatorViewsTest(TestCase):
+
+    POST_COUNT = 15
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_p = User.objects.create_user(username='auth2')
+        cls.group_p = Group.objects.create(
+            title='test group2',
+            slug='test_slug2',
+            description='test description',
+        )
+        Post.objects.bulk_create(
+            Post(
+                text=f'Тестовый пост {post}',
+                group=cls.group_p,
+                author=cls.user_p,
+            )
+            for post in range(cls.POST_COUNT)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user_p)
+
+    def test_cursor_pages_cover_feed(self):
+        """Курсорные страницы отдают ленту целиком и без повторов"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group_p.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.user_p.username}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.authorized_client.get(url).context['page_obj']
+                self.assertEqual(len(first), 10)
+                self.assertFalse(first.has_previous())
+                second = self.authorized_client.get(
+                    url, {'cursor': first.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second), 5)
+                self.assertFalse(second.has_next())
+                seen = [post.pk for post in first] + [
+                    post.pk for post in second]
+                self.assertEqual(len(set(seen)), self.POST_COUNT)
+                back = self.authorized_client.get(
+                    url, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    [post.pk for post in back], [post.pk for post in first]
+                )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор открывает первую страницу"""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostViewContextTests(TestCase):
     @classmethod
@@ -342,6 +422,175 @@ class PostViewContextTests(TestCase):
         self.assertEqual(first_context, second_context)
 
 
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test_slug',
+            description='test description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:group_list', kwargs={'slug': 'test_slug'})
+
+    def test_card_is_cached(self):
+        """Карточка записи кладется в кеш и берется из него"""
+        self.client.get(self.url)
+        key = card_key(self.post.pk, 'group')
+        self.assertIn('Тестовый пост', cache.get(key))
+        cache.set(key, 'из кеша')
+        # Другой адрес, чтобы не попасть в кеш целой страницы.
+        response = self.client.get(self.url, {'page': 1})
+        self.assertContains(response, 'из кеша')
+
+    def test_card_invalidated_on_post_edit(self):
+        """Правка записи сбрасывает её карточку"""
+        self.client.get(self.url)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        self.assertContains(self.client.get(self.url), 'Исправленный пост')
+
+    def test_card_invalidated_on_author_change(self):
+        """Смена имени автора сбрасывает его карточки"""
+        self.client.get(self.url)
+        self.user.first_name = 'Лев'
+        self.user.save()
+        self.assertIsNone(cache.get(card_key(self.post.pk, 'group')))
+
+
+class FeedPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test_slug',
+            description='test description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+
+    def test_page_served_from_cache(self):
+        """Повторный запрос ленты делает только запрос состояния ETag"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(1):
+                    response = self.client.get(url)
+                self.assertContains(response, 'Тестовый пост')
+
+    def test_unchanged_page_is_not_modified(self):
+        """Неизменившаяся лента отвечает 304 по ETag и Last-Modified"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                etag = response['ETag']
+                last_modified = response['Last-Modified']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=last_modified
+                )
+                self.assertEqual(response.status_code, 304)
+                other = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(other.status_code, 200)
+
+    def test_edit_and_comment_change_etag(self):
+        """Правка записи и новый комментарий меняют ETag"""
+        post = Post.objects.get(text='Тестовый пост')
+        detail = reverse('posts:post_detail', args=[post.pk])
+        urls = self.urls + [detail]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        post.text = 'Тестовый пост после правки'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertEqual(response.status_code, 200)
+        etag = self.client.get(detail)['ETag']
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_edit_and_delete_move_last_modified(self):
+        """Правка и удаление записи не дают 304 по If-Modified-Since"""
+        post = Post.objects.get(text='Тестовый пост')
+        detail = reverse('posts:post_detail', args=[post.pk])
+        urls = self.urls + [detail]
+        dates = {url: self.client.get(url)['Last-Modified'] for url in urls}
+        # Даты в HTTP с точностью до секунды: правка — секундами позже.
+        later = time.time() + 5
+        with mock.patch('posts.pagecache.time.time', return_value=later):
+            post.text = 'Тестовый пост после правки'
+            post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=dates[url]
+                )
+                self.assertEqual(response.status_code, 200)
+        profile = self.urls[2]
+        newest = Post.objects.create(author=self.user, text='Последний')
+        date = self.client.get(profile)['Last-Modified']
+        with mock.patch('posts.pagecache.time.time', return_value=later + 5):
+            newest.delete()
+        response = self.client.get(profile, HTTP_IF_MODIFIED_SINCE=date)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_post_appears_immediately(self):
+        """Новая запись сразу видна во всех лентах"""
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(author=self.user, text='Свежий', group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий')
+
+    def test_moved_post_leaves_old_group(self):
+        """Перенос записи в другую группу сбрасывает старую группу"""
+        url = self.urls[1]
+        self.client.get(url)
+        self.post.group = None
+        self.post.save()
+        self.assertNotContains(self.client.get(url), 'Тестовый пост')
+
+    def test_anonymous_and_authorized_pages_differ(self):
+        """Анонимная и авторизованная страницы кешируются раздельно"""
+        self.client.get(self.urls[0])
+        response = self.authorized_client.get(self.urls[0])
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(self.client.get(self.urls[0]),
+                               'Избранные авторы')
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostViewFollowTests(TestCase):
     @classmethod
@@ -417,3 +666,613 @@ class PostViewFollowTests(TestCase):
         )
         all_follows = response.context.get('page_obj').paginator.count
         self.assertEqual(all_follows, 0)
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленту подписчика, но не чужую"""
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertFalse(FeedItem.objects.filter(user=self.user2).exists())
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_unfollow_keeps_other_followers(self):
+        """Отписка убирает записи только из ленты отписавшегося"""
+        Follow.objects.create(user=self.user2, author=self.author)
+        self.authorized_user2.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertFalse(FeedItem.objects.filter(user=self.user2).exists())
+        self.assertTrue(Follow.objects.filter(user=self.user).exists())
+        self.assertTrue(FeedItem.objects.filter(user=self.user).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_heavy_author_is_pulled_on_read(self):
+        """Записи популярного автора сливаются с лентой при чтении"""
+        post = Post.objects.create(author=self.author, text='Без fan-out')
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+        # Чтение ленты ничего не пишет: записи сливаются на лету.
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1, POSTS_PAGINATION='cursor')
+    def test_heavy_and_light_authors_merge_by_cursor(self):
+        """Курсор листает слитую ленту без пропусков и повторов"""
+        heavy = User.objects.create_user(username='heavy')
+        Follow.objects.create(user=self.user, author=heavy)
+        Follow.objects.create(user=self.user2, author=heavy)
+        for number in range(12):
+            author = heavy if number % 2 else self.author
+            Post.objects.create(author=author, text=f'Слитый {number}')
+        url = reverse('posts:follow_index')
+        texts = []
+        cursor = None
+        while True:
+            data = {'cursor': cursor} if cursor else {}
+            page = self.authorized_user.get(url, data).context['page_obj']
+            texts.extend(post.text for post in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        expected = [f'Слитый {number}' for number in range(11, -1, -1)]
+        self.assertEqual(texts, expected + ['Тестовый пост'])
+        self.assertFalse(FeedItem.objects.filter(author=heavy).exists())
+        previous = self.authorized_user.get(
+            url, {'cursor': page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.text for post in previous], expected[:10]
+        )
+
+    def test_author_dropping_below_limit_keeps_posts(self):
+        """Записи, не разложенные при большом числе подписчиков, не теряются"""
+        Follow.objects.create(user=self.user2, author=self.author)
+        with override_settings(FEED_FANOUT_LIMIT=1):
+            post = Post.objects.create(author=self.author, text='Тяжелый')
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        Follow.objects.filter(user=self.user2).delete()
+        with override_settings(FEED_FANOUT_LIMIT=1):
+            response = self.authorized_user.get(
+                reverse('posts:follow_index')
+            )
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_equal_dates_page_by_post_id(self):
+        """Записи с одной датой листаются по id без пропусков и повторов"""
+        for number in range(12):
+            Post.objects.create(author=self.author, text=f'Ровно {number}')
+        same = Post.objects.get(text='Ровно 0').pub_date
+        Post.objects.filter(author=self.author).update(pub_date=same)
+        FeedItem.objects.filter(author=self.author).update(pub_date=same)
+        url = reverse('posts:follow_index')
+        texts = []
+        cursor = None
+        while True:
+            data = {'cursor': cursor} if cursor else {}
+            page = self.authorized_user.get(url, data).context['page_obj']
+            texts.extend(post.text for post in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(len(texts), 13)
+        self.assertEqual(len(set(texts)), 13)
+
+    @override_settings(FEED_INLINE_LIMIT=0)
+    def test_large_fan_out_goes_to_queue(self):
+        """Большая раскладка выполняется задачей, а не в запросе"""
+        post = Post.objects.create(author=self.author, text='В очередь')
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        # Подписка в setUp поставила еще и пересчет рекомендаций.
+        self.assertEqual(run_pending([fan_out_post.name]), (1, 0))
+        response = self.authorized_user.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    @override_settings(FEED_INLINE_LIMIT=0)
+    def test_queued_backfill_skips_unfollowed(self):
+        """Задача заполнения ленты не оживляет отмененную подписку"""
+        follow = Follow.objects.create(user=self.user2, author=self.author)
+        self.assertFalse(FeedItem.objects.filter(user=self.user2).exists())
+        run_pending()
+        self.assertTrue(FeedItem.objects.filter(user=self.user2).exists())
+        follow.delete()
+        Follow.objects.create(user=self.user2, author=self.author)
+        Follow.objects.filter(user=self.user2).delete()
+        run_pending()
+        self.assertFalse(FeedItem.objects.filter(user=self.user2).exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self):
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif', content=small_gif, content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': uploaded},
+        )
+        return Post.objects.get(text='С картинкой')
+
+    def test_create_queues_job_and_shows_placeholder(self):
+        """Новая картинка ставится в очередь, а лента не режет её сама"""
+        post = self.create_post()
+        task = Task.objects.get(
+            name=generate_thumbnails.name, key=f'post:{post.pk}'
+        )
+        self.assertEqual(task.status, Task.PENDING)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Картинка готовится')
+
+    def test_processed_job_renders_variant(self):
+        """После нарезки лента показывает готовую копию"""
+        post = self.create_post()
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(run_pending(), (1, 0))
+        # Исходник уже самой узкой ширины: увеличивать его не нужно,
+        # поэтому остается одна ширина в каждом доступном формате.
+        variants = ImageVariant.objects.filter(post=post)
+        self.assertEqual(
+            {(v.name, v.width, v.height) for v in variants},
+            {('480w', 480, 170)},
+        )
+        self.assertEqual(
+            {v.format for v in variants}, set(thumbnails.available_formats())
+        )
+        variant = variants.get(format='jpeg')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, variant.url)
+        self.assertEqual(run_pending(), (0, 0))
+
+    def test_removed_image_variants_are_deleted_by_task(self):
+        """Правка не удаляет копии сама: это делает задача нарезки"""
+        post = self.create_post()
+        run_pending()
+        paths = list(post.variants.values_list('path', flat=True))
+        self.assertTrue(paths)
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            data={'text': post.text, 'image-clear': 'on'},
+        )
+        self.assertEqual(post.variants.count(), len(paths))
+        self.assertTrue(all(default_storage.exists(p) for p in paths))
+        self.assertEqual(run_pending(), (1, 0))
+        self.assertFalse(post.variants.exists())
+        self.assertFalse(any(default_storage.exists(p) for p in paths))
+
+    def test_new_image_gets_new_variant_urls(self):
+        """Новая картинка получает новые URL копий, старые файлы удаляются"""
+        post = self.create_post()
+        run_pending()
+        old = set(post.variants.values_list('path', flat=True))
+        buffer = BytesIO()
+        Image.new('RGB', (4, 2), 'red').save(buffer, 'PNG')
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=[post.pk]),
+            data={'text': post.text, 'image': SimpleUploadedFile(
+                'red.png', buffer.getvalue(), content_type='image/png'
+            )},
+        )
+        # До нарезки карточка ссылается на прежние, еще целые файлы.
+        self.assertTrue(all(default_storage.exists(path) for path in old))
+        run_pending()
+        new = set(post.variants.values_list('path', flat=True))
+        self.assertFalse(old & new)
+        self.assertTrue(all(default_storage.exists(path) for path in new))
+        self.assertFalse(any(default_storage.exists(path) for path in old))
+        # Повторная нарезка той же картинки оставляет те же файлы.
+        thumbnails.enqueue(post)
+        run_pending()
+        self.assertEqual(
+            set(post.variants.values_list('path', flat=True)), new
+        )
+
+    def test_encoding_runs_outside_transaction(self):
+        """Нарезка не держит транзакцию (и блокировку записи SQLite)"""
+        post = self.create_post()
+        depth = len(connection.savepoint_ids)
+        seen = []
+        generate = thumbnails.generate
+
+        def record(*args):
+            seen.append(len(connection.savepoint_ids))
+            return generate(*args)
+
+        with mock.patch('posts.thumbnails.generate', side_effect=record):
+            self.assertEqual(run_pending(), (1, 0))
+        self.assertEqual(seen, [depth])
+        self.assertTrue(post.variants.exists())
+
+    def test_target_widths_do_not_upscale(self):
+        """Нарезка не увеличивает картинку, но самая узкая есть всегда"""
+        self.assertEqual(thumbnails.target_widths(100), [480])
+        self.assertEqual(thumbnails.target_widths(1000), [480, 960])
+        self.assertEqual(thumbnails.target_widths(4000), [480, 960, 1440])
+
+    @override_settings(TASK_RETRY_DELAY=0)
+    def test_broken_image_is_retried_then_failed(self):
+        """Битая картинка повторяется и помечается ошибкой"""
+        post = Post.objects.create(
+            author=self.user, text='Битая', image='posts/missing.jpg'
+        )
+        task = thumbnails.enqueue(post)
+        self.assertEqual(run_pending(), (0, task.max_attempts))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, task.max_attempts)
+
+    def test_missing_variants_are_queued_once(self):
+        """--missing не дублирует задачи, которые уже ждут очереди"""
+        post = Post.objects.create(
+            author=self.user, text='Старая', image='posts/old.jpg'
+        )
+        self.assertEqual(thumbnails.enqueue_missing(), 1)
+        self.assertEqual(thumbnails.enqueue_missing(), 0)
+        self.assertEqual(
+            Task.objects.filter(key=f'post:{post.pk}').count(), 1
+        )
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test_slug',
+            description='test description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def add_comments(self, count):
+        start = Comment.objects.count()
+        for number in range(start, start + count):
+            commenter = User.objects.create_user(username=f'c{number}')
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f'Комментарий {number}'
+            )
+
+    def add_posts(self, count):
+        for number in range(count):
+            Post.objects.create(
+                author=self.author, text=f'Пост {number}', group=self.group
+            )
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Число запросов post_detail не зависит от числа комментариев"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.add_comments(1)
+        expected = self.count_queries(url)
+        self.add_comments(5)
+        self.assertEqual(self.count_queries(url), expected)
+
+    def test_feeds_queries_do_not_grow_with_page_size(self):
+        """Число запросов лент не зависит от числа записей на странице"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        ]
+        expected = [self.count_queries(url) for url in urls]
+        self.add_posts(8)
+        self.assertEqual([self.count_queries(url) for url in urls], expected)
+
+    def test_text_posts_skip_variants_query(self):
+        """Копии картинок не запрашиваются для записей без картинки"""
+        self.add_posts(3)
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(0):
+            load_variants(posts)
+        posts[0].image = 'posts/image.png'
+        with self.assertNumQueries(1):
+            load_variants(posts)
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {number}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_shows_first_page(self):
+        """Страница записи показывает первые комментарии и общее число"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 4', 'Комментарий 3'],
+        )
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'Комментарии: 5')
+        self.assertContains(
+            response, reverse('posts:post_comments', args=[self.post.pk])
+        )
+
+    def test_fragment_pages_cover_all_comments(self):
+        """Фрагменты по курсору догружают остальные комментарии"""
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        texts = [comment.text for comment in response.context['comments']]
+        cursor = response.context['comments'].next_cursor
+        while cursor:
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateUsed(
+                response, 'posts/includes/comment_list.html'
+            )
+            self.assertTemplateNotUsed(response, 'base.html')
+            texts += [comment.text for comment in response.context['comments']]
+            cursor = response.context['comments'].next_cursor
+        self.assertEqual(
+            texts, [f'Комментарий {number}' for number in range(4, -1, -1)]
+        )
+
+    def test_fragment_reads_threads_in_two_queries(self):
+        """Корни и все ответы страницы читаются двумя запросами с авторами"""
+        parent = Comment.objects.filter(post=self.post).latest('pk')
+        for number in range(3):
+            parent = Comment.objects.create(
+                post=self.post, author=self.author, parent=parent,
+                text=f'Ответ {number}',
+            )
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        comment_queries = [
+            query for query in queries
+            if 'posts_comment' in query['sql']
+            and 'posts_post' not in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 2)
+        for query in comment_queries:
+            self.assertIn('auth_user', query['sql'])
+
+    def test_fragment_for_missing_post_is_404(self):
+        """Фрагмент комментариев несуществующей записи — 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COMMENTS_PER_PAGE=2, COMMENTS_MAX_DEPTH=2)
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other = Post.objects.create(author=cls.author, text='Другой')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def comment(self, text, parent=None):
+        return Comment.objects.create(
+            post=self.post, author=self.author, text=text, parent=parent
+        )
+
+    def detail(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        return [
+            (comment.text, comment.depth)
+            for comment in response.context['comments']
+        ]
+
+    def test_replies_follow_their_thread(self):
+        """Ответы идут сразу за своим корнем в порядке обхода ветки"""
+        first = self.comment('Первый')
+        answer = self.comment('Ответ первому', first)
+        second = self.comment('Второй')
+        self.comment('Ответ на ответ', answer)
+        self.comment('Ответ второму', second)
+        self.comment('Еще ответ первому', first)
+        self.assertEqual(self.detail(), [
+            ('Второй', 0),
+            ('Ответ второму', 1),
+            ('Первый', 0),
+            ('Ответ первому', 1),
+            ('Ответ на ответ', 2),
+            ('Еще ответ первому', 1),
+        ])
+
+    def test_replies_do_not_count_towards_page(self):
+        """На страницу помещается COMMENTS_PER_PAGE веток целиком"""
+        oldest = self.comment('Старый')
+        for number in range(3):
+            self.comment(f'Ответ {number}', oldest)
+        self.comment('Средний')
+        self.comment('Новый')
+        texts = [text for text, _ in self.detail()]
+        self.assertEqual(texts, ['Новый', 'Средний'])
+
+    def test_depth_is_limited(self):
+        """Ответ глубже предела встает рядом с родителем"""
+        parent = self.comment('Корень')
+        chain = [parent]
+        for number in range(4):
+            parent = self.comment(f'Уровень {number + 1}', parent)
+            chain.append(parent)
+        self.assertEqual(
+            [comment.depth for comment in chain], [0, 1, 2, 2, 2]
+        )
+        self.assertEqual(chain[4].parent, chain[1])
+
+    def test_reply_to_comment_without_path(self):
+        """Ответ на комментарий без пути (bulk-импорт) собирает путь сам"""
+        root = self.comment('Корень')
+        middle = self.comment('Ответ', root)
+        Comment.objects.filter(pk__in=[root.pk, middle.pk]).update(path='')
+        middle = Comment.objects.get(pk=middle.pk)
+        reply = self.comment('Ответ на ответ', middle)
+        self.assertEqual(reply.depth, 2)
+        self.assertTrue(reply.path.startswith(
+            path_segment(root.pk) + path_segment(middle.pk)
+        ))
+
+    def test_subtree_is_one_range(self):
+        """subtree() отдает комментарий и только его потомков"""
+        first = self.comment('Первый')
+        answer = self.comment('Ответ', first)
+        deep = self.comment('Глубже', answer)
+        self.comment('Ответ рядом', first)
+        self.comment('Второй')
+        self.assertEqual(
+            list(Comment.objects.subtree(answer.path)), [answer, deep]
+        )
+
+    def test_reply_through_form(self):
+        """Ответ отправляется формой со скрытым полем parent"""
+        root = self.comment('Корень')
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Ответ', 'parent': root.pk},
+        )
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.depth, 1)
+
+    def test_reply_to_other_post_is_rejected(self):
+        """Ответ на комментарий чужой записи не сохраняется"""
+        foreign = Comment.objects.create(
+            post=self.other, author=self.author, text='Чужой'
+        )
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Ответ', 'parent': foreign.pk},
+        )
+        self.assertFalse(Comment.objects.filter(text='Ответ').exists())
+
+
+@override_settings(POSTS_PROJECTION='rows')
+class PostRowProjectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test group',
+            slug='test_slug',
+            description='test description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Легкая запись',
+            group=cls.group,
+            image='posts/light.jpg',
+        )
+        ImageVariant.objects.create(
+            post=cls.post,
+            name='480w',
+            path='posts/variants/light/480w.jpeg',
+            width=480,
+            height=170,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_as_rows_skips_user_columns(self):
+        """Строки читают только столбцы карточки"""
+        sql = str(Post.objects.as_rows().query)
+        self.assertNotIn('password', sql)
+        self.assertNotIn('last_login', sql)
+        row = Post.objects.as_rows().get(pk=self.post.pk)
+        self.assertEqual(row.author.get_full_name(), 'Лев Толстой')
+        self.assertEqual(row.group.slug, self.group.slug)
+        with self.assertRaises(AttributeError):
+            row.extra = 1
+
+    def test_feeds_render_rows(self):
+        """Ленты собирают карточки из PostRow"""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                row = response.context['page_obj'][0]
+                self.assertIsInstance(row, PostRow)
+                self.assertEqual(row.pk, self.post.pk)
+                self.assertContains(response, 'Легкая запись')
+                self.assertContains(
+                    response, 'posts/variants/light/480w.jpeg'
+                )
+
+    @override_settings(POSTS_PAGINATION='cursor')
+    def test_rows_with_cursor_pagination(self):
+        """Строки работают и с курсорной пагинацией"""
+        for number in range(12):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertIsInstance(page_obj[0], PostRow)
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': page_obj.next_cursor}
+        )
+        self.assertEqual(
+            response.context['page_obj'][-1].pk, self.post.pk
+        )
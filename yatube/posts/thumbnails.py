@@ -0,0 +1,147 @@
+"""Фоновая нарезка картинок записей.
+
+post_create и post_edit только ставят задачу generate_thumbnails в
+очередь core.queue; её выполняет воркер, а ошибки повторяет сама
+очередь. Картинка нарезается под пропорции карточки в нескольких
+ширинах и во всех форматах, которые умеет кодировать установленный
+Pillow; копии с размерами сохраняются в ImageVariant, и шаблоны
+собирают из них <picture> со srcset, не трогая Pillow.
+
+В имени файла копии — хеш её содержимого, поэтому у новой картинки
+новый URL и кеши браузеров и CDN не отдадут прежнюю. Задача сначала
+пишет все файлы, затем одной транзакцией заменяет строки ImageVariant
+и только потом удаляет прежние файлы: страница, отрисованная в любой
+момент, ссылается на существующий файл. Копии убранной картинки тоже
+удаляет задача, а не запрос правки; до этого карточка показывает
+прежние копии.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from . import pagecache
+from .cards import invalidate_cards
+from .models import ImageVariant, Post
+
+QUALITY = {'jpeg': 82, 'webp': 80, 'avif': 60}
+
+
+def replace_variants(post, variants):
+    """Ставит копии вместо прежних; возвращает число удаленных.
+
+    Строки меняются одной короткой транзакцией, файлы прежних копий
+    удаляются после нее.
+    """
+    with transaction.atomic():
+        old = list(post.variants.values_list('path', flat=True))
+        post.variants.all().delete()
+        ImageVariant.objects.bulk_create(variants)
+    keep = {variant.path for variant in variants}
+    for path in old:
+        if path not in keep:
+            default_storage.delete(path)
+    return len(old)
+
+
+def enqueue(post):
+    """Ставит запись в очередь нарезки; старые копии уберет задача."""
+    from .tasks import generate_thumbnails
+
+    return generate_thumbnails.delay(post.pk)
+
+
+def available_formats():
+    """Форматы из POST_IMAGE_FORMATS, для которых у Pillow есть кодек."""
+    Image.init()
+    return [
+        fmt for fmt in settings.POST_IMAGE_FORMATS
+        if fmt.upper() in Image.SAVE
+    ]
+
+
+def target_widths(source_width):
+    """Ширины без увеличения исходника; самая узкая есть всегда."""
+    widths = sorted(settings.POST_IMAGE_WIDTHS)
+    return [widths[0]] + [
+        width for width in widths[1:] if width <= source_width
+    ]
+
+
+def encode(image, fmt):
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, fmt.upper(), quality=QUALITY.get(fmt, 80))
+    return buffer.getvalue()
+
+
+def generate(post):
+    """Нарезает картинку записи во всех ширинах и форматах.
+
+    Пишет только файлы; возвращает несохраненные ImageVariant.
+    """
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    variants = []
+    with post.image.open('rb') as source_file:
+        source = Image.open(source_file)
+        source.load()
+    for width in target_widths(source.width):
+        height = round(width * aspect_height / aspect_width)
+        resized = ImageOps.fit(source, (width, height), Image.LANCZOS)
+        for fmt in available_formats():
+            data = encode(resized, fmt)
+            digest = hashlib.sha1(data).hexdigest()[:12]
+            path = f'posts/variants/{post.pk}/{width}w.{digest}.{fmt}'
+            # Повторная нарезка той же картинки дает тот же файл.
+            if not default_storage.exists(path):
+                path = default_storage.save(path, ContentFile(data))
+            variants.append(ImageVariant(
+                post=post, name=f'{width}w', format=fmt, path=path,
+                width=width, height=height,
+            ))
+    return variants
+
+
+def process(post_id):
+    """Нарезает картинку записи; исключение повторит очередь задач."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is None:
+        # Запись удалили, пока задача ждала очереди.
+        return False
+    if not post.image:
+        # Картинку убрали: остались только копии прежней.
+        if replace_variants(post, []):
+            invalidate_cards([post_id])
+            pagecache.bump(*pagecache.post_scopes(post))
+        return False
+    try:
+        replace_variants(post, generate(post))
+    except Exception:
+        if not Post.objects.filter(pk=post_id).exists():
+            # Запись удалили во время нарезки — делать больше нечего.
+            return False
+        raise
+    invalidate_cards([post_id])
+    pagecache.bump(*pagecache.post_scopes(post))
+    return True
+
+
+def enqueue_missing():
+    """Ставит в очередь записи с картинкой, но без нарезанных копий."""
+    from .tasks import generate_thumbnails
+
+    post_ids = (
+        Post.objects.exclude(image='').exclude(image__isnull=True)
+        .filter(variants__isnull=True)
+        .values_list('pk', flat=True)
+    )
+    return len(generate_thumbnails.delay_many(
+        (post_id,) for post_id in post_ids
+    ))
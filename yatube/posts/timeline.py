@@ -0,0 +1,221 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новая запись раскладывается в ленты всех подписчиков автора, поэтому
+страница /follow/ читается одним диапазоном по индексу
+(user, pub_date, post).
+Авторов, у которых подписчиков больше FEED_FANOUT_LIMIT, при записи
+не раскладываем: FollowFeed при чтении сливает страницу FeedItem со
+страницей их записей по индексу (author, pub_date), ничего не записывая
+(fan-out on read). Такой автор помечается UserCounter.feed_on_read и
+остается в слиянии, даже когда подписчиков снова станет меньше: его
+записей за это время в лентах нет. Раскладки больше FEED_INLINE_LIMIT
+строк сигналы отдают задачам очереди (posts.tasks), чтобы запрос их не
+ждал.
+"""
+import heapq
+from collections import namedtuple
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import FeedItem, Follow, Post, UserCounter
+from .paginators import CursorPaginator
+
+BATCH_SIZE = 500
+
+
+def _bulk_add(items):
+    FeedItem.objects.bulk_create(
+        items, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def author_counter(author_id, field):
+    """Значение счетчика автора (подписчики, записи) без блокировки."""
+    return UserCounter.objects.filter(user_id=author_id).values_list(
+        field, flat=True
+    ).first() or 0
+
+
+def heavy_authors():
+    """Условие на UserCounter: авторы без fan-out."""
+    return (
+        Q(feed_on_read=True)
+        | Q(followers_count__gt=settings.FEED_FANOUT_LIMIT)
+    )
+
+
+def mark_heavy(author_ids):
+    """Переводит авторов в fan-out on read навсегда."""
+    UserCounter.objects.filter(
+        user_id__in=list(author_ids), feed_on_read=False
+    ).update(feed_on_read=True)
+
+
+def is_heavy(author_id):
+    """Автор без fan-out: его записи сливаются с лентой при чтении."""
+    counter = UserCounter.objects.filter(user_id=author_id).values_list(
+        'followers_count', 'feed_on_read'
+    ).first()
+    if counter is None:
+        return False
+    followers, on_read = counter
+    if not on_read and followers > settings.FEED_FANOUT_LIMIT:
+        mark_heavy([author_id])
+        on_read = True
+    return on_read
+
+
+def fan_out_post(post):
+    """Раскладывает запись по лентам подписчиков автора."""
+    if is_heavy(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_add(
+        FeedItem(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in follower_ids
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя все записи нового автора."""
+    if is_heavy(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .values_list('pk', 'pub_date')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    _bulk_add(
+        FeedItem(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, pub_date in posts
+    )
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты читателя записи автора после отписки."""
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class FeedEntry(namedtuple('FeedEntry', 'pub_date post_id')):
+    """Строка ленты подписок; pk — id записи, он же ключ курсора."""
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.post_id
+
+
+class FollowFeed:
+    """Лента подписок читателя для Paginator и FeedCursorPaginator.
+
+    Материализованные FeedItem и записи авторов без fan-out — два
+    источника, упорядоченных по (pub_date, id записи). Срез берет из
+    каждого не больше нужного числа строк после курсора и сливает их.
+    FeedItem тяжелых авторов, оставшиеся с тех пор, как у них было
+    меньше подписчиков, пропускаются: их записи придут вторым источником.
+    Оба источника упорядочены по столбцам своей таблицы (post_id, а не
+    post), поэтому идут по индексу без JOIN и временной сортировки.
+    """
+
+    def __init__(self, user, position=None, heavy=None):
+        self.user = user
+        self.position = position
+        self._heavy = heavy
+
+    def heavy(self):
+        if self._heavy is None:
+            self._heavy = list(
+                UserCounter.objects.filter(
+                    heavy_authors(), user__following__user=self.user
+                ).values_list('user_id', flat=True)
+            )
+        return self._heavy
+
+    def sources(self):
+        """[(выборка, поле id записи)] без учета курсора."""
+        items = FeedItem.objects.filter(user=self.user)
+        heavy = self.heavy()
+        if not heavy:
+            return [(items, 'post_id')]
+        return [
+            (items.exclude(author_id__in=heavy), 'post_id'),
+            (Post.objects.filter(author_id__in=heavy), 'pk'),
+        ]
+
+    def after(self, position):
+        """Та же лента, начиная за курсором (направление, дата, id)."""
+        return FollowFeed(self.user, position, self.heavy())
+
+    def _descending(self):
+        return (
+            self.position is None
+            or self.position[0] == CursorPaginator.NEXT
+        )
+
+    def _bounded(self, queryset, key):
+        descending = self._descending()
+        if self.position is not None:
+            _, date, pk = self.position
+            side = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'pub_date__{side}': date})
+                | Q(**{'pub_date': date, f'{key}__{side}': pk})
+            )
+        order = ['-pub_date', f'-{key}'] if descending else ['pub_date', key]
+        return queryset.order_by(*order).values_list('pub_date', key)
+
+    def count(self):
+        return sum(queryset.count() for queryset, _ in self.sources())
+
+    def newest(self):
+        """Самая свежая pub_date ленты (для Last-Modified и ETag)."""
+        dates = [
+            queryset.order_by('-pub_date').values_list(
+                'pub_date', flat=True
+            ).first()
+            for queryset, _ in self.sources()
+        ]
+        return max(filter(None, dates), default=None)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.stop is None:
+            raise TypeError('FollowFeed поддерживает только срезы с концом.')
+        start = index.start or 0
+        pages = [
+            list(self._bounded(queryset, key)[:index.stop])
+            for queryset, key in self.sources()
+        ]
+        merged = heapq.merge(*pages, reverse=self._descending())
+        return [
+            FeedEntry(*row) for row in islice(merged, start, index.stop)
+        ]
+
+
+def follow_feed(request):
+    """FollowFeed читателя, общий для расчета ETag и представления."""
+    if not hasattr(request, '_follow_feed'):
+        request._follow_feed = FollowFeed(request.user)
+    return request._follow_feed
+
+
+def page_posts(items, rows=False):
+    """Записи страницы ленты одним запросом в порядке FeedItem."""
+    ids = [item.post_id for item in items]
+    posts = Post.objects.filter(pk__in=ids)
+    posts = posts.as_rows() if rows else posts.with_feed_relations()
+    by_pk = {post.pk: post for post in posts}
+    return [by_pk[pk] for pk in ids if pk in by_pk]
@@ -0,0 +1,144 @@
+"""Лента популярного: рейтинг записей по вовлеченности с затуханием.
+
+Событие весом w в момент t (публикация, комментарий, реакция на запись
+или на ее комментарий, новый подписчик автора) прибавляет к рейтингу
+записи w * 2 ** ((t - EPOCH) / TRENDING_HALF_LIFE). Затухание общее для
+всех записей, поэтому порядок ленты со временем сам не меняется и
+старые слагаемые не нужно пересчитывать: новое событие просто
+прибавляется. Чтобы числа не переполнялись, в PostScore хранится
+натуральный логарифм суммы, а складываются они через logaddexp.
+
+update() запускается периодически (задача update_trending или команда
+update_trending): читает события с id больше отметок TrendingMark,
+прибавляет их к PostScore и удаляет рейтинги записей старше
+TRENDING_WINDOW. Снятые реакции и удаленные комментарии рейтинг не
+уменьшают: лента показывает, что обсуждали, а не итоговый счет.
+"""
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import pagecache
+from .models import (
+    Comment, CommentReaction, Follow, Post, PostReaction, PostScore,
+    TrendingMark,
+)
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+# Источник: (модель, поле записи, поле времени, путь к дате записи).
+# У подписки нет времени: она считается событием момента прохода и
+# достается самой свежей записи автора в окне.
+SOURCES = {
+    'post': (Post, 'pk', 'pub_date', 'pub_date'),
+    'comment': (Comment, 'post_id', 'pub_date', 'post__pub_date'),
+    'reaction': (PostReaction, 'post_id', 'created', 'post__pub_date'),
+    'comment_reaction': (
+        CommentReaction, 'comment__post_id', 'created',
+        'comment__post__pub_date',
+    ),
+    'follow': (Follow, 'author_id', None, None),
+}
+# Столько id за раз ищем в PostScore: предел переменных SQLite.
+LOOKUP_CHUNK = 500
+
+
+def logaddexp(first, second):
+    """log(exp(first) + exp(second)) без переполнения; None — ноль."""
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def contribution(kind, moment):
+    """Логарифм вклада события kind, случившегося в moment."""
+    rate = math.log(2) / settings.TRENDING_HALF_LIFE
+    age = (moment - EPOCH).total_seconds()
+    return math.log(settings.TRENDING_WEIGHTS[kind]) + rate * age
+
+
+def newest_posts(author_ids, since):
+    """{автор: id его самой свежей записи в окне}."""
+    return dict(
+        Post.objects.filter(author_id__in=author_ids, pub_date__gte=since)
+        .order_by().values('author_id').annotate(newest=Max('pk'))
+        .values_list('author_id', 'newest')
+    )
+
+
+def collect(kind, mark, upper, since, now):
+    """События источника kind с id в (mark, upper]: [(запись, момент)]."""
+    model, post_field, time_field, post_date = SOURCES[kind]
+    events = model.objects.filter(pk__gt=mark, pk__lte=upper).order_by()
+    if kind == 'follow':
+        authors = list(events.values_list(post_field, flat=True))
+        newest = newest_posts(set(authors), since)
+        return [
+            (newest[author], now) for author in authors if author in newest
+        ]
+    events = events.filter(**{f'{post_date}__gte': since})
+    return list(events.values_list(post_field, time_field).iterator())
+
+
+def save_scores(added, now):
+    """Прибавляет вклады added {запись: логарифм} к PostScore."""
+    ids = list(added)
+    existing = {}
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        existing.update(PostScore.objects.filter(
+            post_id__in=ids[start:start + LOOKUP_CHUNK]
+        ).values_list('post_id', 'score'))
+    changed = [
+        PostScore(
+            post_id=post_id,
+            score=logaddexp(existing[post_id], score),
+            updated=now,
+        )
+        for post_id, score in added.items() if post_id in existing
+    ]
+    PostScore.objects.bulk_update(
+        changed, ['score', 'updated'], batch_size=LOOKUP_CHUNK
+    )
+    PostScore.objects.bulk_create([
+        PostScore(post_id=post_id, score=score, updated=now)
+        for post_id, score in added.items() if post_id not in existing
+    ], batch_size=LOOKUP_CHUNK, ignore_conflicts=True)
+
+
+@transaction.atomic
+def update(now=None):
+    """Учитывает новые события; возвращает счетчики прохода."""
+    now = now or timezone.now()
+    since = now - timedelta(seconds=settings.TRENDING_WINDOW)
+    marks = {
+        mark.source: mark
+        for mark in TrendingMark.objects.select_for_update()
+    }
+    added = {}
+    events = 0
+    for kind, (model, *_) in SOURCES.items():
+        if settings.TRENDING_WEIGHTS.get(kind, 0) <= 0:
+            continue
+        mark = marks.get(kind) or TrendingMark(source=kind)
+        upper = model.objects.filter(pk__gt=mark.last_id).aggregate(
+            upper=Max('pk')
+        )['upper']
+        if upper is None:
+            continue
+        for post_id, moment in collect(
+                kind, mark.last_id, upper, since, now):
+            added[post_id] = logaddexp(
+                added.get(post_id), contribution(kind, moment)
+            )
+            events += 1
+        mark.last_id = upper
+        mark.save()
+    save_scores(added, now)
+    pruned, _ = PostScore.objects.filter(post__pub_date__lt=since).delete()
+    if added or pruned:
+        pagecache.bump(pagecache.TRENDING)
+    return {'events': events, 'posts': len(added), 'pruned': pruned}
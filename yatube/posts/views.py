@@ -1,25 +1,100 @@
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
+from django.utils.http import is_safe_url
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
-from .models import Post, Group, User, Follow
-from .forms import PostForm, CommentForm
+from .models import (
+    COMMENT_FIELDS, FEED_FIELDS, PATH_STEP, Comment, Follow, Group,
+    Post, PostScore, Reaction, User,
+)
+from .forms import CommentForm, PostForm, ReplyForm
+from . import reactions, suggestions
+from .cards import attach_cards
+from .conditional import (
+    feed_condition, follow_state, group_state, index_state, post_state,
+    profile_state, trending_state,
+)
+from .pagecache import POSTS, TRENDING, cache_feed
+from .paginators import (
+    CursorPaginator, FeedCursorPaginator, ScoreCursorPaginator,
+)
+from .search import SearchPaginator
+from .thumbnails import enqueue
+from .timeline import follow_feed, page_posts
 
 
 POSTS_PER_PAGE = 10
 
 
-def get_paginate(queryset, request):
+def get_paginate(queryset, request, cursor_class=CursorPaginator):
+    if settings.POSTS_PAGINATION == 'cursor':
+        paginator = cursor_class(queryset, POSTS_PER_PAGE)
+        return paginator.get_page(request.GET.get('cursor'))
     paginator = Paginator(queryset, POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
-@cache_page(20)
+def use_rows():
+    return settings.POSTS_PROJECTION == 'rows'
+
+
+def comments_page(post_id, cursor=None):
+    """Страница веток комментариев: корни по курсору и ответы к ним.
+
+    Корни с авторами читаются одним запросом, ответы всех веток
+    страницы — вторым, range-запросом по пути. Общее число не
+    считается: оно хранится в Post.comments_count.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only(*COMMENT_FIELDS)
+    paginator = CursorPaginator(
+        comments.filter(parent=None), settings.COMMENTS_PER_PAGE
+    )
+    page = paginator.get_page(cursor)
+    page.object_list = with_replies(comments, page.object_list)
+    return page
+
+
+def with_replies(comments, roots):
+    """Корни, за каждым — его ветка в порядке обхода."""
+    if not roots:
+        return roots
+    paths = sorted(root.path for root in roots)
+    replies = {}
+    for reply in comments.subtree(paths[0], paths[-1]).filter(
+            parent__isnull=False):
+        replies.setdefault(reply.path[:PATH_STEP], []).append(reply)
+    threaded = []
+    for root in roots:
+        threaded.append(root)
+        threaded.extend(replies.get(root.path, []))
+    return threaded
+
+
+def feed_posts(queryset):
+    """Записи для карточек: модели или легкие строки PostRow."""
+    if use_rows():
+        return queryset.as_rows()
+    return queryset.with_feed_relations()
+
+
+def feed_page(page_obj, request, variant='feed'):
+    """Карточки записей страницы и реакции читателя на них."""
+    attach_cards(page_obj, variant)
+    reactions.attach(page_obj.object_list, request.user)
+    return page_obj
+
+
+@feed_condition(index_state, per_user=True)
+@cache_feed(POSTS)
 def index(request):
     text = 'Последние обновления на сайте'
-    posts = Post.objects.select_related("group", "author")
-    page_obj = get_paginate(posts, request)
+    posts = feed_posts(Post.objects.all())
+    page_obj = feed_page(get_paginate(posts, request), request)
     context = {
         'posts': posts,
         'text': text,
@@ -28,10 +103,28 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@feed_condition(trending_state, per_user=True)
+@cache_feed(TRENDING)
+def popular(request):
+    text = 'Популярные записи'
+    # Рейтинг заранее посчитан в PostScore: страница — срез по индексу.
+    paginator = ScoreCursorPaginator(PostScore.objects.all(), POSTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    page_obj.object_list = page_posts(page_obj, use_rows())
+    feed_page(page_obj, request)
+    context = {
+        'text': text,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/index.html', context)
+
+
+@feed_condition(group_state, per_user=True)
+@cache_feed('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related("author")
-    page_obj = get_paginate(posts, request)
+    posts = feed_posts(group.posts.all())
+    page_obj = feed_page(get_paginate(posts, request), request, 'group')
     context = {
         'group': group,
         'posts': posts,
@@ -40,36 +133,62 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@feed_condition(profile_state, per_user=True)
+@cache_feed('author:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(
-        author=author).select_related("group", "author")
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    posts = feed_posts(Post.objects.filter(author=author))
     following = request.user.is_authenticated and Follow.objects.filter(
         author=author,
         user=request.user,).exists()
-    page_obj = get_paginate(posts, request)
+    page_obj = feed_page(
+        get_paginate(posts, request), request, 'profile'
+    )
     context = {
         'author': author,
         'following': following,
         'page_obj': page_obj,
+        'suggestions': suggestions.for_reader(request.user, exclude=author),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@feed_condition(post_state, per_user=True)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts_count = Post.objects.filter(author=post.author).count()
+    post = get_object_or_404(
+        Post.objects.with_feed_relations()
+        .only(*FEED_FIELDS, 'reactions_count')
+        .select_related('author__counters').prefetch_related('variants'),
+        pk=post_id,
+    )
     comment = CommentForm()
-    comments = post.comments.all()
+    comments = comments_page(post.pk)
+    reactions.attach([post], request.user)
+    reactions.attach(comments.object_list, request.user, 'comment')
     context = {
         'post': post,
-        'posts_count': posts_count,
         'comment': comment,
         'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@feed_condition(post_state, per_user=True)
+def post_comments(request, post_id):
+    """Следующая страница комментариев фрагментом для «Показать еще»."""
+    comments = comments_page(post_id, request.GET.get('cursor'))
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    reactions.attach(comments.object_list, request.user, 'comment')
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -80,6 +199,8 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        if post.image:
+            enqueue(post)
         return redirect('posts:profile', request.user)
     context = {
         'form': form
@@ -99,6 +220,8 @@ def post_edit(request, post_id):
     )
     if request.method == "POST" and form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            enqueue(post)
         return redirect('posts:post_detail', post_id=post.pk)
     context = {
         'form': form,
@@ -111,27 +234,79 @@ def post_edit(request, post_id):
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
-    form = CommentForm(request.POST or None)
+    form = ReplyForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        parent = comment.parent
+        if parent is None or parent.post_id == post.pk:
+            comment.author = request.user
+            comment.post = post
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def react(request, target, fallback):
+    """Переключает реакцию и возвращает туда, где нажали кнопку."""
+    kind = request.POST.get('kind', Reaction.LIKE)
+    if request.method == 'POST' and kind in dict(Reaction.KINDS):
+        reactions.toggle(target, request.user, kind)
+    next_url = request.POST.get('next')
+    if next_url and is_safe_url(
+            next_url, allowed_hosts={request.get_host()},
+            require_https=request.is_secure()):
+        return redirect(next_url)
+    return redirect(fallback)
+
+
+@login_required
+def post_react(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return react(
+        request, post, reverse('posts:post_detail', args=[post_id])
+    )
+
+
+@login_required
+def comment_react(request, comment_id):
+    comment = get_object_or_404(
+        Comment.objects.only('pk', 'post_id'), pk=comment_id
+    )
+    return react(
+        request, comment,
+        reverse('posts:post_detail', args=[comment.post_id]),
+    )
+
+
 @login_required
+@feed_condition(follow_state, per_user=True)
+@cache_feed(POSTS)
 def follow_index(request):
     text = 'Избранные авторы'
-    posts_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_paginate(posts_list, request)
+    feed = follow_feed(request)
+    page_obj = get_paginate(feed, request, FeedCursorPaginator)
+    page_obj.object_list = page_posts(page_obj, use_rows())
+    feed_page(page_obj, request)
     context = {
         'text': text,
         'page_obj': page_obj,
+        'suggestions': suggestions.for_reader(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        paginator = SearchPaginator(query, POSTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def profile_follow(request, username):
     if request.user.username == username:
@@ -149,5 +324,5 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(author=author).delete()
+    Follow.objects.filter(author=author, user=request.user).delete()
     return redirect('posts:profile', username=username)
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import OutboxMessage
+from core.queue import run_pending
+
+User = get_user_model()
+
+
+class SignUpViewTests(TestCase):
+    def signup(self, email):
+        return self.client.post(reverse('users:signup'), data={
+            'username': 'newbie',
+            'email': email,
+            'password1': 'Sup3r-secret!',
+            'password2': 'Sup3r-secret!',
+        })
+
+    def test_signup_sends_welcome_mail(self):
+        """После регистрации отправляется приветственное письмо"""
+        response = self.signup('newbie@yatube.ru')
+        self.assertRedirects(response, reverse('posts:index'))
+        self.assertTrue(User.objects.filter(username='newbie').exists())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['newbie@yatube.ru'])
+        self.assertIn('newbie', mail.outbox[0].body)
+
+    def test_signup_without_email_sends_nothing(self):
+        """Без адреса письмо не отправляется"""
+        self.signup('')
+        self.assertEqual(mail.outbox, [])
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.OutboxEmailBackend',
+    OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class PasswordResetMailTests(TestCase):
+    def test_reset_mail_goes_through_outbox(self):
+        """Сброс пароля не отправляет письмо сам, а кладет его в очередь"""
+        User.objects.create_user(
+            username='forgetful', email='f@yatube.ru', password='Old-pass-1'
+        )
+        response = self.client.post(
+            reverse('users:password_reset'), data={'email': 'f@yatube.ru'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxMessage.objects.get().recipients, 'f@yatube.ru')
+        run_pending()
+        self.assertEqual(mail.outbox[0].to, ['f@yatube.ru'])
@@ -1,5 +1,8 @@
-from django.views.generic import CreateView
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
+from django.views.generic import CreateView
+
 from .forms import CreationForm
 
 
@@ -7,3 +10,22 @@ class SignUp(CreateView):
     form_class = CreationForm
     success_url = reverse_lazy('posts:index')
     template_name = 'users/signup.html'
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if self.object.email:
+            self.send_welcome(self.object)
+        return response
+
+    def send_welcome(self, user):
+        # Письмо уходит через исходящую очередь: запрос его не ждет.
+        context = {
+            'user': user,
+            'domain': self.request.get_host(),
+            'protocol': 'https' if self.request.is_secure() else 'http',
+        }
+        subject = render_to_string(
+            'users/emails/signup_subject.txt', context
+        ).strip()
+        body = render_to_string('users/emails/signup.txt', context)
+        send_mail(subject, body, None, [user.email])
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
@@ -140,7 +141,18 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма сохраняются в исходящую очередь (core.outbox), и запрос не
+# ждет почтовый сервер. Задача flush_outbox отправляет их пачками по
+# OUTBOX_BATCH_SIZE через одно соединение OUTBOX_EMAIL_BACKEND; письмо с
+# ошибкой повторяется через OUTBOX_RETRY_DELAY * 2 ** (попытка - 1)
+# секунд. Отправленные хранятся OUTBOX_KEEP_DAYS дней для метрик.
+EMAIL_BACKEND = 'core.mail.OutboxEmailBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_LOCK_TIMEOUT = 5 * 60
+OUTBOX_KEEP_DAYS = 7
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -149,11 +161,135 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Кеш выбирается переменной окружения YATUBE_CACHE:
+# 'locmem' — свой в каждом процессе (разработка и тесты);
+# 'file', 'db', 'redis' — общий для всех воркеров gunicorn, поверх него
+# core.cache.TwoTierCache держит горячие ключи в памяти процесса.
+# Для 'db' нужен `manage.py createcachetable`, для 'redis' — django-redis.
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE', 'locmem')
+
+SHARED_CACHES = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'yatube_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get('YATUBE_REDIS_URL',
+                                   'redis://127.0.0.1:6379/1'),
+    },
+}
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': 1000,
+                'L1_TIMEOUT': 5,
+            },
+        },
+        'shared': SHARED_CACHES[CACHE_BACKEND],
     }
+
+# Пагинация лент: 'page' — номера страниц, 'cursor' — курсор по
+# (pub_date, id) без COUNT(*) и OFFSET для глубоких лент.
+POSTS_PAGINATION = 'page'
+
+# Записи в лентах: 'model' — экземпляры Post, 'rows' — легкие PostRow
+# из values_list без моделей (меньше памяти и столбцов на страницу).
+POSTS_PROJECTION = 'model'
+
+# Комментарии на странице записи: первые COMMENTS_PER_PAGE веток
+# приходят с ней, следующие догружаются по курсору с posts:post_comments.
+COMMENTS_PER_PAGE = 20
+# Ветки комментариев: ответ на комментарий этой глубины (корень — 0)
+# становится ответом на его родителя, и ветка не уходит вправо.
+COMMENTS_MAX_DEPTH = 5
+
+# Счетчики реакций копятся в памяти процесса (posts.counters.buffer)
+# и пишутся пачкой, когда набралось столько целей или прошло столько
+# секунд с первого несброшенного сдвига.
+REACTION_BUFFER_SIZE = 100
+REACTION_FLUSH_INTERVAL = 2
+
+# Лента популярного (posts.trending): вес событий, период полураспада
+# и окно рейтинга в секундах. Рейтинг пересчитывает задача
+# update_trending раз в TRENDING_INTERVAL секунд; запустить цикл —
+# manage.py update_trending --schedule.
+TRENDING_WEIGHTS = {
+    'post': 1,
+    'comment': 3,
+    'reaction': 1,
+    'comment_reaction': 0.5,
+    'follow': 5,
+}
+TRENDING_HALF_LIFE = 12 * 60 * 60
+TRENDING_WINDOW = 7 * 24 * 60 * 60
+TRENDING_INTERVAL = 5 * 60
+
+# Рекомендации авторов (posts.suggestions): вес общих подписок и
+# совместных подписок похожих читателей. Хранится SUGGESTIONS_LIMIT
+# кандидатов на читателя, показывается SUGGESTIONS_SHOWN. Похожих
+# читателей ищем среди SUGGESTIONS_FANOUT последних подписчиков каждого
+# автора и берем SUGGESTIONS_NEIGHBOURS лучших. Всем рекомендации
+# пересчитывает manage.py update_suggestions, одному читателю — задача
+# после подписки или отписки.
+SUGGESTIONS_WEIGHTS = {
+    'mutual': 1,
+    'cofollow': 2,
 }
+SUGGESTIONS_LIMIT = 10
+SUGGESTIONS_SHOWN = 5
+SUGGESTIONS_FANOUT = 200
+SUGGESTIONS_NEIGHBOURS = 50
+
+# Сколько последних записей попадает в RSS/Atom.
+SYNDICATION_ITEMS = 20
+
+# Авторы с большим числом подписчиков не раскладываются по лентам
+# при публикации: их записи сливаются с лентой при чтении /follow/.
+FEED_FANOUT_LIMIT = 1000
+# Раскладка записи и заполнение ленты после подписки больше этого
+# числа строк уходят в очередь задач, меньшие делаются сразу.
+FEED_INLINE_LIMIT = 100
+
+# Время жизни кеша отрендеренных карточек записей (сбрасывается сигналами).
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Страницы лент сбрасываются по поколениям; таймаут — страховка.
+FEED_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Картинка записи нарезается в фоне под пропорции карточки в нескольких
+# ширинах и форматах; браузер выбирает копию через <picture>/srcset.
+# Форматы без кодека в Pillow пропускаются; последний — запасной для <img>.
+POST_IMAGE_ASPECT = (960, 339)
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+
+# Фоновые задачи (core.queue) хранятся в таблице core.Task. После
+# коммита их подхватывают TASK_WORKERS потоков веб-процесса; при 0 —
+# только команда run_tasks. Отложенные задачи и повторы веб-процесс
+# проверяет раз в TASK_POLL_INTERVAL секунд. Воркер держит задачу TASK_VISIBILITY_TIMEOUT
+# секунд, затем её может забрать другой. Упавшая задача повторяется
+# через TASK_RETRY_DELAY * 2 ** (попытка - 1) секунд.
+TASK_WORKERS = 2
+TASK_VISIBILITY_TIMEOUT = 5 * 60
+TASK_RETRY_DELAY = 30
+TASK_POLL_INTERVAL = 5
 
 INTERNAL_IPS = [
     '127.0.0.1',
@@ -18,12 +18,16 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import queue_metrics
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
+    path('api/', include('api.urls', namespace='api')),
+    path('metrics/queues/', queue_metrics, name='queue_metrics'),
 ]
 
 handler404 = 'core.views.page_not_found'